@@ -1,5 +1,5 @@
 import operators as op
-from symmetry import Symmetry
+from diabatic_operator.symmetry import Symmetry
 
 def hamiltonian(n, alpha, p, name = "H"):
     """
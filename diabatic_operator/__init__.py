@@ -0,0 +1,6 @@
+"""
+Symmetry adapted diabatic operator expansions for C_nv point groups
+
+the modules are imported explicitly (e.g. diabatic_operator.operator_representation), nothing is imported here
+so that the command line and the planner don't import numpy
+"""
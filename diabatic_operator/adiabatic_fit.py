@@ -0,0 +1,198 @@
+from dataclasses import dataclass
+import numpy as np
+from .evaluation import OperatorTable, Evaluator
+from .model_selection import design_matrix
+
+@dataclass
+class AdiabaticFit:
+    """
+    Parameters of an operator (one per group of its table) fitted to adiabatic energies, and the convergence of the fit
+    """
+    table: OperatorTable
+    parameters: np.ndarray
+    costs: list[float]      # weighted sum of the squared residuals after each accepted step (the first one is the initial guess)
+    iterations: int
+    converged: bool
+    stalled: bool           # no damped step lowered the cost before convergence
+    rms: float              # rms of the (unweighted) energy residuals
+    max_error: float
+
+    def evaluator(self) -> Evaluator:
+        return self.table.evaluator(self.parameters)
+
+    def __str__(self) -> str:
+        status = "converged" if self.converged else "stalled" if self.stalled else "not converged"
+
+        return f"{status} after {self.iterations} iterations, cost {self.costs[0]:.6g} -> {self.costs[-1]:.6g}, rms {self.rms:.6g} (max {self.max_error:.6g})"
+
+def check_symmetric(design: np.ndarray, n: int):
+    design = design.reshape(design.shape[0], n, n, -1)
+
+    if not np.allclose(design, design.transpose(0, 2, 1, 3)):
+        raise ValueError("the operator matrix isn't symmetric, its eigenvalues aren't adiabatic energies")
+
+def adiabatic_energies(op: OperatorTable | Evaluator, coords: np.ndarray, parameters: np.ndarray = None) -> np.ndarray:
+    """
+    Eigenvalues (in increasing order) of the operator matrix on a batch of geometries, shape (N, n)
+    """
+    evaluator = op if isinstance(op, Evaluator) else op.evaluator(parameters)
+
+    return np.linalg.eigvalsh(evaluator.evaluate(coords))
+
+def energy_jacobian(design: np.ndarray, parameters: np.ndarray, n: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Adiabatic energies (N, n) and their derivatives with respect to the parameters (N, n, nparameters)
+    from the design matrix (N, n * n, nparameters) of a batch of geometries
+
+    Hellmann-Feynman : the matrix is linear in the parameters, dE_k/dp_g = v_k^T D_g v_k (v_k eigenvector of E_k)
+    """
+    npoints = design.shape[0]
+    energies, vectors = np.linalg.eigh((design @ parameters).reshape(npoints, n, n))
+    # projectors[N, k, i * n + j] = v_k[i] v_k[j]
+    projectors = (vectors[:, :, None, :] * vectors[:, None, :, :]).reshape(npoints, n * n, n).transpose(0, 2, 1)
+
+    return (energies, projectors @ design)
+
+def chunk_designs(table: OperatorTable, coords: np.ndarray, chunk_size: int, max_bytes: int) -> list[np.ndarray]:
+    """
+    Design matrices of the chunks of geometries, computed once if they fit in max_bytes (None otherwise,
+    each pass over the geometries rebuilds them)
+    """
+    if len(coords) * table.shape[0] * table.shape[1] * table.ngroups() * 8 > max_bytes:
+        return None
+
+    return [design_matrix(table, coords[start:start + chunk_size]) for start in range(0, len(coords), chunk_size)]
+
+def chunk_design(table: OperatorTable, coords: np.ndarray, designs: list[np.ndarray], start: int, chunk_size: int) -> np.ndarray:
+    if designs is not None:
+        return designs[start // chunk_size]
+
+    return design_matrix(table, coords[start:start + chunk_size])
+
+def normal_equations(table: OperatorTable, coords: np.ndarray, energies: np.ndarray, weights: np.ndarray, parameters: np.ndarray, chunk_size: int, designs: list[np.ndarray] = None) -> tuple[np.ndarray, np.ndarray, float]:
+    """
+    J^T W J, J^T W r and r^T W r of the energy residuals r, accumulated over chunks of geometries (J is never stored in full),
+    designs are the cached chunk_designs if any
+    """
+    nparameters = len(parameters)
+    jtj = np.zeros((nparameters, nparameters))
+    jtr = np.zeros(nparameters)
+    cost = 0.0
+
+    for start in range(0, len(coords), chunk_size):
+        stop = min(start + chunk_size, len(coords))
+        values, jacobian = energy_jacobian(chunk_design(table, coords, designs, start, chunk_size), parameters, table.shape[0])
+        sqrtw = np.sqrt(weights[start:stop]).reshape(-1)
+        residuals = (values - energies[start:stop]).reshape(-1) * sqrtw
+        jacobian = jacobian.reshape(len(residuals), nparameters) * sqrtw[:, None]
+        jtj += jacobian.T @ jacobian
+        jtr += jacobian.T @ residuals
+        cost += float(residuals @ residuals)
+
+    return (jtj, jtr, cost)
+
+def fit_cost(table: OperatorTable, coords: np.ndarray, energies: np.ndarray, weights: np.ndarray, parameters: np.ndarray) -> float:
+    residuals = adiabatic_energies(table, coords, parameters) - energies
+
+    return float(np.sum(weights * residuals ** 2))
+
+def initial_parameters(table: OperatorTable, coords: np.ndarray, energies: np.ndarray, chunk_size: int, designs: list[np.ndarray] = None) -> np.ndarray:
+    """
+    Linear least squares fit of the operator matrix to diag(energies) (diabatic = adiabatic states)
+    """
+    n = table.shape[0]
+    dtd = np.zeros((table.ngroups(), table.ngroups()))
+    dtt = np.zeros(table.ngroups())
+
+    for start in range(0, len(coords), chunk_size):
+        stop = min(start + chunk_size, len(coords))
+        design = chunk_design(table, coords, designs, start, chunk_size)
+        design = design.reshape(design.shape[0] * design.shape[1], design.shape[2])
+        targets = np.zeros((stop - start, n, n))
+        targets[:, np.arange(n), np.arange(n)] = energies[start:stop]
+        dtd += design.T @ design
+        dtt += design.T @ targets.reshape(-1)
+
+    return np.linalg.lstsq(dtd, dtt, rcond=None)[0]
+
+def fit_adiabatic(table: OperatorTable, coords: np.ndarray, energies: np.ndarray, parameters: np.ndarray = None, weights: np.ndarray = None, max_iterations: int = 100, tol: float = 1e-10, damping: float = 1e-3, chunk_size: int = 4096, max_bytes: int = 1 << 30) -> AdiabaticFit:
+    """
+    Levenberg-Marquardt fit of the parameters of an operator (one per group of its table, see OperatorTable)
+    so that the eigenvalues of the operator matrix match adiabatic energies
+
+    the jacobian of the energies is analytic (Hellmann-Feynman, see energy_jacobian) and the normal equations are
+    accumulated chunk by chunk, a step costs one pass over the geometries (and one evaluation per rejected trial),
+    the design matrices of the chunks are computed once when they fit in max_bytes
+
+    Args :
+        - table : compiled operator (a symmetric n x n matrix, e.g. compile_operator of a block of operator())
+        - coords : (N, ncoordinates) geometries
+        - energies : (N, n) adiabatic energies in increasing order
+        - parameters[=None] : initial parameters (by default the linear fit of the matrix to diag(energies))
+        - weights[=None] : (N,) or (N, n) weights of the squared residuals
+        - max_iterations[=100] : max number of accepted steps
+        - tol[=1e-10] : stops when the relative decrease of the cost (or the relative step) is below tol
+        - damping[=1e-3] : initial Marquardt damping (scaled by the diagonal of J^T J)
+        - chunk_size[=4096] : geometries per chunk of design matrix
+        - max_bytes[=1 << 30] : memory allowed for the cached design matrices (rebuilt at each pass above it)
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    energies = np.asarray(energies, dtype=np.float64)
+    n = table.shape[0]
+    assert table.shape[0] == table.shape[1]
+    assert coords.ndim == 2 and coords.shape[1] == table.ncoordinates
+    assert energies.shape == (len(coords), n)
+
+    weights = np.ones((len(coords), n)) if weights is None else np.broadcast_to(np.asarray(weights, dtype=np.float64).reshape(len(coords), -1), (len(coords), n))
+    designs = chunk_designs(table, coords, chunk_size, max_bytes)
+    check_symmetric(chunk_design(table, coords, designs, 0, chunk_size), n)
+    parameters = initial_parameters(table, coords, energies, chunk_size, designs) if parameters is None else np.array(parameters, dtype=np.float64)
+    assert parameters.shape == (table.ngroups(),)
+
+    jtj, jtr, cost = normal_equations(table, coords, energies, weights, parameters, chunk_size, designs)
+    costs = [cost]
+    converged = False
+    stalled = False
+    iterations = 0
+
+    while iterations < max_iterations and not converged:
+        scale = np.maximum(np.diag(jtj), np.finfo(np.float64).tiny)
+
+        # increases the damping until a step lowers the cost
+        while True:
+            step = np.linalg.solve(jtj + damping * np.diag(scale), -jtr)
+            trial = parameters + step
+            trial_cost = fit_cost(table, coords, energies, weights, trial)
+
+            if trial_cost < cost or damping > 1e16:
+                break
+
+            damping *= 4
+
+        # no step lowers the cost : the fit stops where it is, without having met the tolerance
+        if trial_cost >= cost:
+            stalled = True
+
+            break
+
+        small_step = np.linalg.norm(step) <= tol * (np.linalg.norm(parameters) + tol)
+        small_decrease = cost - trial_cost <= tol * cost
+        parameters = trial
+        damping = max(damping / 3, 1e-12)
+        iterations += 1
+        jtj, jtr, cost = normal_equations(table, coords, energies, weights, parameters, chunk_size, designs)
+        costs.append(cost)
+        converged = small_step or small_decrease
+
+    residuals = adiabatic_energies(table, coords, parameters) - energies
+
+    return AdiabaticFit(
+        table,
+        parameters,
+        costs,
+        iterations,
+        converged,
+        stalled,
+        float(np.sqrt(np.mean(residuals ** 2))) if residuals.size > 0 else 0.0,
+        float(np.abs(residuals).max(initial=0.0))
+    )
@@ -0,0 +1,98 @@
+import numpy as np
+from .variable import Variable
+
+class CartesianTransformer:
+    """
+    Linear map between Cartesian geometries and the real coordinates of a variables list
+
+    the geometries are expressed in the C_nv frame (origin on the C_n axis, rows of the rotation being
+    the x, y (in a sigma_v plane) and z (C_n axis) directions), then projected on the displacement
+    vectors of the modes : one vector per A/B variable and two vectors (Re and Im of Q+) per E variable
+    """
+
+    def __init__(self, reference: np.ndarray, displacements: list[np.ndarray], variables: list[Variable] = None, rotation: np.ndarray = None, origin: np.ndarray = None, masses: np.ndarray = None):
+        """
+        Args :
+            - reference : (natoms, 3) reference geometry in the C_nv frame
+            - displacements : per mode displacement vectors, (natoms, 3) for A/B modes and (2, natoms, 3) for E modes
+            - variables[=None] : variables list the modes correspond to (to check the number of modes)
+            - rotation[=None] : (3, 3) rotation from the lab frame to the C_nv frame (identity by default)
+            - origin[=None] : (3,) origin of the C_nv frame in the lab frame (0 by default)
+            - masses[=None] : (natoms,) masses for a mass weighted projection (unweighted by default)
+        """
+        self.reference = np.asarray(reference, dtype=np.float64)
+        self.natoms = self.reference.shape[0]
+        assert self.reference.shape == (self.natoms, 3)
+
+        self.rotation = np.eye(3) if rotation is None else np.asarray(rotation, dtype=np.float64)
+        self.origin = np.zeros(3) if origin is None else np.asarray(origin, dtype=np.float64)
+        assert self.rotation.shape == (3, 3) and np.allclose(self.rotation @ self.rotation.T, np.eye(3))
+
+        vectors = []
+
+        for d in displacements:
+            d = np.asarray(d, dtype=np.float64)
+
+            if d.ndim == 3:
+                assert d.shape == (2, self.natoms, 3)
+                vectors.extend([d[0], d[1]])
+            else:
+                assert d.shape == (self.natoms, 3)
+                vectors.append(d)
+
+        if variables is not None:
+            nmodes = sum(1 for v in variables if not (v.symmetry.is_E() and v.complex_conjugate))
+
+            if nmodes != len(displacements):
+                raise ValueError(f"expected {nmodes} modes for the variables list, got {len(displacements)}")
+
+        # X = reference + q @ D, and q = (X - reference) @ P with P the (metric weighted) pseudo inverse of D
+        self.displacements = np.array(vectors).reshape(len(vectors), 3 * self.natoms)
+        metric = np.ones(3 * self.natoms) if masses is None else np.repeat(np.asarray(masses, dtype=np.float64), 3)
+        weighted = self.displacements * metric
+        self.projection = weighted.T @ np.linalg.inv(self.displacements @ weighted.T)
+        self.ncoordinates = len(vectors)
+
+    def to_frame(self, cartesians: np.ndarray) -> np.ndarray:
+        return (np.asarray(cartesians, dtype=np.float64) - self.origin) @ self.rotation.T
+
+    def from_frame(self, cartesians: np.ndarray) -> np.ndarray:
+        return cartesians @ self.rotation + self.origin
+
+    def to_coordinates(self, cartesians: np.ndarray) -> np.ndarray:
+        """
+        Maps (N, natoms, 3) lab frame geometries to (N, ncoordinates) real coordinates
+        """
+        cartesians = np.asarray(cartesians, dtype=np.float64)
+        displacement = (self.to_frame(cartesians) - self.reference).reshape(cartesians.shape[0], 3 * self.natoms)
+
+        return displacement @ self.projection
+
+    def to_cartesians(self, coords: np.ndarray) -> np.ndarray:
+        """
+        Maps (N, ncoordinates) real coordinates to (N, natoms, 3) lab frame geometries
+        """
+        coords = np.asarray(coords, dtype=np.float64)
+        frame = self.reference + (coords @ self.displacements).reshape(coords.shape[0], self.natoms, 3)
+
+        return self.from_frame(frame)
+
+    def jacobian(self) -> np.ndarray:
+        """
+        Derivatives of the coordinates with respect to the lab frame Cartesians, shape (ncoordinates, natoms, 3)
+        """
+        return np.einsum("ajc,jk->cak", self.projection.reshape(self.natoms, 3, self.ncoordinates), self.rotation)
+
+    def inverse_jacobian(self) -> np.ndarray:
+        """
+        Derivatives of the lab frame Cartesians with respect to the coordinates, shape (ncoordinates, natoms, 3)
+        """
+        return self.displacements.reshape(self.ncoordinates, self.natoms, 3) @ self.rotation
+
+    def pullback(self, gradient: np.ndarray) -> np.ndarray:
+        """
+        Pulls (N, ncoordinates, ...) derivatives with respect to the coordinates back to (N, natoms, 3, ...) Cartesian derivatives
+        """
+        gradient = np.asarray(gradient, dtype=np.float64)
+
+        return np.moveaxis(np.tensordot(gradient, self.jacobian(), axes=([1], [0])), (-2, -1), (1, 2))
@@ -0,0 +1,107 @@
+import gzip
+import json
+import os
+from dataclasses import dataclass, field
+from .symmetry import Symmetry
+from .variable import Variable
+from .monome import Monome
+from .invariant import InvariantType
+
+@dataclass
+class GenerationState:
+    """
+    Progress of generate_invariants_and_monoms : the next monome to classify is the position-th
+    of the given order (in the order of generate_monoms), order > max_order once the run is complete
+    """
+    variables: list[Variable]
+    n: int
+    min_order: int
+    max_order: int
+    remove_cc: bool
+    order: int
+    position: int = 0
+    invs: list[Monome] = field(default_factory=list)
+    rhos: list[Monome] = field(default_factory=list)
+    amonoms: list[Monome] = field(default_factory=list)
+
+    def is_complete(self) -> bool:
+        return self.order > self.max_order
+
+def extended_variables(variables: list[Variable]) -> list[Variable]:
+    """
+    Variables followed by the conjugated variables that aren't in the list (conjugated A2/B2 variables)
+    """
+    table = list(variables)
+
+    for v in variables:
+        if v.conjugate() not in table:
+            table.append(v.conjugate())
+
+    return table
+
+def encode_variable(v: Variable) -> list:
+    return [v.name, v.symmetry.irrep, v.symmetry.gamma, v.complex_conjugate]
+
+def decode_variable(data: list) -> Variable:
+    name, irrep, gamma, cc = data
+
+    return Variable(name, Symmetry(irrep, gamma=gamma), complex_conjugate=cc)
+
+def encode_type(t: InvariantType) -> int:
+    return -1 if t is None else 4 * t.invariant + 2 * t.real + t.imag
+
+def decode_type(code: int) -> InvariantType:
+    return None if code < 0 else InvariantType(invariant=bool(code & 4), real=bool(code & 2), imag=bool(code & 1))
+
+def save_checkpoint(state: GenerationState, filename: str):
+    """
+    Writes the state (gzipped json, monomes as ordered indices in a variables table) atomically
+    """
+    table = extended_variables(state.variables)
+    index = {v: i for i, v in enumerate(table)}
+
+    def encode_monoms(monoms: list[Monome]) -> list:
+        return [[[index[v] for v in m.variables], encode_type(m.invariant_type), int(m.complex_conjugate)] for m in monoms]
+
+    data = {
+        "table": [encode_variable(v) for v in table],
+        "nvariables": len(state.variables),
+        "n": state.n,
+        "min_order": state.min_order,
+        "max_order": state.max_order,
+        "remove_cc": state.remove_cc,
+        "order": state.order,
+        "position": state.position,
+        "invs": encode_monoms(state.invs),
+        "rhos": encode_monoms(state.rhos),
+        "amonoms": encode_monoms(state.amonoms),
+    }
+
+    tmp = f"{filename}.tmp"
+
+    with gzip.open(tmp, "wt") as f:
+        json.dump(data, f, separators=(",", ":"))
+
+    os.replace(tmp, filename)
+
+def load_checkpoint(filename: str) -> GenerationState:
+    with gzip.open(filename, "rt") as f:
+        data = json.load(f)
+
+    table = [decode_variable(v) for v in data["table"]]
+
+    def decode_monoms(monoms: list) -> list[Monome]:
+        return [Monome([table[i] for i in variables], complex_conjugate=bool(cc), invariant_type=decode_type(code)) for variables, code, cc in monoms]
+
+    return GenerationState(
+        table[:data["nvariables"]],
+        data["n"],
+        data["min_order"],
+        data["max_order"],
+        data["remove_cc"],
+        data["order"],
+        data["position"],
+        decode_monoms(data["invs"]),
+        decode_monoms(data["rhos"]),
+        decode_monoms(data["amonoms"])
+    )
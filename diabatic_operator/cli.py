@@ -0,0 +1,146 @@
+import argparse
+import sys
+
+# the subcommands import what they need when they run, so that the startup only costs argparse
+# (numpy alone takes longer than the rest of the startup)
+
+def parse_ints(text: str) -> list[int]:
+    return [int(x) for x in text.replace(",", " ").split()]
+
+def add_operator_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("n", type=int, help="type of point group (C_nv)")
+    parser.add_argument("opsymmetry", help="operator symmetry (A1, A2, B1, B2, E1, ...)")
+    parser.add_argument("s1", help="symmetry of the first state")
+    parser.add_argument("s2", help="symmetry of the second state")
+    parser.add_argument("--nvarsym", type=parse_ints, required=True, help="number of variables of each symmetry, e.g. 1,0,0,0,2")
+    parser.add_argument("--max-order", type=int, default=None, help="max order of the expansion (n by default)")
+
+def symmetries(args) -> tuple:
+    from .symmetry import parse_symmetry
+
+    return tuple(parse_symmetry(name, args.n) for name in (args.opsymmetry, args.s1, args.s2))
+
+def output(args):
+    return sys.stdout if args.output in (None, "-") else open(args.output, "w")
+
+def build(args) -> int:
+    from .operator_representation import operator
+    from .rendering import render_operator
+
+    op = operator(args.n, *symmetries(args), args.nvarsym, args.n if args.max_order is None else args.max_order)
+    file = output(args)
+
+    try:
+        render_operator(op, file, args.format, args.by_order, args.max_terms)
+    finally:
+        if file is not sys.stdout:
+            file.close()
+
+    return 0
+
+def export(args) -> int:
+    import json
+    import zipfile
+    from .selection_rules import selection_rules
+    from .sweep import sweep_group, store_group
+
+    symmetries(args)
+    max_order = args.n if args.max_order is None else args.max_order
+    result = sweep_group(args.n, args.nvarsym, max_order, [(args.opsymmetry, args.s1, args.s2)], selection_rules([args.n], max_order))
+    index = {"groups": {}, "cells": {}}
+
+    with zipfile.ZipFile(args.output, "w", compression=zipfile.ZIP_STORED) as archive:
+        store_group(archive, index, 0, result)
+        archive.writestr("index.json", json.dumps(index))
+
+    print(f"{args.output} : {result['monomials']} monomials, coordinates {' '.join(result['coordinates'])}", file=sys.stderr)
+
+    return 0
+
+def evaluate(args) -> int:
+    import json
+    import numpy as np
+    from .sweep import SweepArchive
+
+    if args.geometries == "-":
+        coords = np.loadtxt(sys.stdin, ndmin=2)
+    elif args.geometries.endswith(".npy"):
+        coords = np.load(args.geometries)
+    else:
+        coords = np.loadtxt(args.geometries, ndmin=2)
+
+    with SweepArchive(args.archive) as archive:
+        keys = archive.keys()
+
+        if not 0 <= args.cell < len(keys):
+            raise ValueError(f"the archive has {len(keys)} cells")
+
+        n, o, s1, s2, nvarsym, max_order = json.loads(keys[args.cell])
+        table = archive.table(n, o, s1, s2, nvarsym, max_order, tuple(args.block), args.component)
+
+    values = table.evaluator().evaluate(coords).reshape(coords.shape[0], -1)
+
+    if args.output is not None and args.output.endswith(".npy"):
+        np.save(args.output, values)
+    else:
+        file = output(args)
+
+        try:
+            np.savetxt(file, values)
+        finally:
+            if file is not sys.stdout:
+                file.close()
+
+    return 0
+
+def plan_job(args) -> int:
+    from .planner import plan
+
+    print(plan(args.n, *symmetries(args), args.nvarsym, args.n if args.max_order is None else args.max_order))
+
+    return 0
+
+def parser() -> argparse.ArgumentParser:
+    main_parser = argparse.ArgumentParser(prog="diabatic-operator", description="Symmetry adapted diabatic operator expansions for C_nv point groups")
+    subparsers = main_parser.add_subparsers(dest="command", required=True)
+
+    p = subparsers.add_parser("build", help="builds an operator and writes its expansion")
+    add_operator_arguments(p)
+    p.add_argument("--format", choices=("text", "latex"), default="text")
+    p.add_argument("--by-order", action="store_true", help="one section per order")
+    p.add_argument("--max-terms", type=int, default=None, help="max number of terms written per entry")
+    p.add_argument("-o", "--output", default=None, help="output file (standard output by default)")
+    p.set_defaults(run=build)
+
+    p = subparsers.add_parser("export", help="builds an operator and writes its compiled tables to an archive (see SweepArchive)")
+    add_operator_arguments(p)
+    p.add_argument("-o", "--output", required=True, help="archive file")
+    p.set_defaults(run=export)
+
+    p = subparsers.add_parser("evaluate", help="evaluates an exported operator on geometries")
+    p.add_argument("archive", help="archive written by export (or run_sweep)")
+    p.add_argument("geometries", help="(N, ncoordinates) geometries, .npy or text file ('-' for the standard input)")
+    p.add_argument("--cell", type=int, default=0, help="cell of the archive (0 by default)")
+    p.add_argument("--block", type=parse_ints, default=[0, 0], help="block of the operator, e.g. 0,1")
+    p.add_argument("--component", type=int, default=0, help="0 for X, 1 for Y")
+    p.add_argument("-o", "--output", default=None, help="output file, .npy or text (standard output by default)")
+    p.set_defaults(run=evaluate)
+
+    p = subparsers.add_parser("plan", help="predicts the size and cost of a build")
+    add_operator_arguments(p)
+    p.set_defaults(run=plan_job)
+
+    return main_parser
+
+def main(argv: list[str] = None) -> int:
+    args = parser().parse_args(argv)
+
+    try:
+        return args.run(args)
+    except (ValueError, KeyError, OSError) as e:
+        print(f"error : {e}", file=sys.stderr)
+
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+import numpy as np
+from .evaluation import OperatorTable, Evaluator
+
+def state_pairs(nstates: int) -> np.ndarray:
+    """
+    Pairs (a, b) with a < b of adiabatic states, in the order used for the couplings
+    """
+    return np.array([(a, b) for a in range(nstates) for b in range(a + 1, nstates)], dtype=np.int64).reshape(-1, 2)
+
+def derivative_couplings(op: OperatorTable | Evaluator, coords: np.ndarray, epsilon: float = 1e-8) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Computes the adiabatic states and the nonadiabatic derivative couplings <psi_a|grad psi_b> on a batch of geometries
+
+    the couplings come from the Hellmann-Feynman like expression <psi_a|grad W|psi_b> / (E_b - E_a),
+    where 1 / dE is regularised as dE / (dE^2 + epsilon^2) so that degeneracies (such as the
+    conical intersection at Q = 0) give vanishing couplings instead of NaNs
+
+    Args :
+        - op : compiled operator (or its evaluator), the diabatic matrix must be square
+        - coords : (N, ncoordinates) array of real coordinates
+        - epsilon[=1e-8] : regularisation of the energy differences
+
+    Returns :
+        - energies : (N, nstates) adiabatic energies in ascending order
+        - vectors : (N, nstates, nstates) adiabatic states (columns)
+        - couplings : (N, npairs, ncoordinates) coupling vectors of each pair (see state_pairs)
+        - pairs : (npairs, 2) indices of the states of each pair
+    """
+    evaluator = op if isinstance(op, Evaluator) else op.evaluator()
+    assert evaluator.shape[0] == evaluator.shape[1]
+
+    coords = np.asarray(coords, dtype=np.float64)
+    w = evaluator.evaluate(coords)
+    w = 0.5 * (w + np.swapaxes(w, -1, -2))
+    dw = evaluator.gradient(coords)
+    dw = 0.5 * (dw + np.swapaxes(dw, -1, -2))
+
+    energies, vectors = np.linalg.eigh(w)
+    pairs = state_pairs(evaluator.shape[0])
+
+    # gradient of the diabatic matrix in the adiabatic basis, only for the needed pairs
+    ua = vectors[:, :, pairs[:, 0]]
+    ub = vectors[:, :, pairs[:, 1]]
+    numerator = np.einsum("nip,ncij,njp->npc", ua, dw, ub, optimize=True)
+    de = energies[:, pairs[:, 1]] - energies[:, pairs[:, 0]]
+    inverse = de / (de * de + epsilon * epsilon)
+    couplings = np.ascontiguousarray(numerator * inverse[:, :, None])
+
+    return (energies, vectors, couplings, pairs)
@@ -0,0 +1,165 @@
+from dataclasses import dataclass
+import numpy as np
+from .evaluation import OperatorTable, Evaluator, SLOT_REAL, SLOT_PLUS, SLOT_MINUS
+
+@dataclass
+class PrimitiveGrid:
+    """
+    Primitive DVR grid of one coordinate : points and DVR weights (hbar = 1)
+    """
+    kind: str
+    points: np.ndarray
+    weights: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+def ho_dvr(npoints: int, omega: float = 1.0, mass: float = 1.0, center: float = 0.0) -> PrimitiveGrid:
+    """
+    Harmonic oscillator DVR : eigenvalues of the position operator in the basis of the npoints first HO functions
+    """
+    assert npoints > 0 and omega > 0 and mass > 0
+
+    k = np.arange(1, npoints)
+    x = np.diag(np.sqrt(k / (2 * mass * omega)), 1)
+    points, vectors = np.linalg.eigh(x + x.T)
+    # weights from the ground state function : w_i = (U_0i / phi_0(x_i))^2
+    phi0 = (mass * omega / np.pi) ** 0.25 * np.exp(-mass * omega * points ** 2 / 2)
+
+    return PrimitiveGrid("ho", center + points, (vectors[0] / phi0) ** 2)
+
+def sine_dvr(npoints: int, xmin: float, xmax: float) -> PrimitiveGrid:
+    """
+    Sine (particle in a box) DVR on ]xmin, xmax[ : npoints equally spaced points
+    """
+    assert npoints > 0 and xmax > xmin
+
+    step = (xmax - xmin) / (npoints + 1)
+
+    return PrimitiveGrid("sine", xmin + step * np.arange(1, npoints + 1), np.full(npoints, step))
+
+def grid_modes(evaluator: Evaluator) -> list[list[int]]:
+    """
+    Coordinates of each mode : the two coordinates of an E variable (shared by Q+ and Q-) form one mode,
+    the other coordinates are modes of their own
+    """
+    paired = {int(c) for kind, c in zip(evaluator.table.kinds, evaluator.table.columns) if kind in (SLOT_PLUS, SLOT_MINUS)}
+    modes = []
+    c = 0
+
+    while c < evaluator.ncoordinates:
+        modes.append([c, c + 1] if c in paired else [c])
+        c += len(modes[-1])
+
+    return modes
+
+def mode_factors(evaluator: Evaluator, mode: list[int], axes: list[np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Factors of the monomials on the sub-grid of a mode (C order over its coordinates)
+
+    Returns (ids, values) : the distinct factor of each monomial and the (ndistinct, size) values of the distinct factors
+    """
+    kinds, columns = evaluator.table.kinds, evaluator.table.columns
+    slots = [s for s in range(len(kinds)) if columns[s] == mode[0]]
+    exponents, ids = np.unique(evaluator.exponents[:, slots], axis=0, return_inverse=True)
+
+    if len(mode) == 2:
+        x, y = np.meshgrid(axes[mode[0]], axes[mode[1]], indexing="ij")
+        x, y = x.reshape(-1), y.reshape(-1)
+    else:
+        x, y = axes[mode[0]], np.zeros(len(axes[mode[0]]))
+
+    values = np.ones((len(exponents), len(x)), dtype=np.complex128)
+
+    for k, s in enumerate(slots):
+        if kinds[s] == SLOT_REAL:
+            z = x + 0j
+        elif kinds[s] == SLOT_PLUS:
+            z = x + 1j * y
+        elif kinds[s] == SLOT_MINUS:
+            z = x - 1j * y
+        else:
+            z = 1j * x
+
+        # powers of the slot up to its highest exponent in this mode
+        table = np.ones((exponents[:, k].max(initial=0) + 1, len(x)), dtype=np.complex128)
+
+        for p in range(1, len(table)):
+            table[p] = table[p - 1] * z
+
+        values *= table[exponents[:, k]]
+
+    return (ids.reshape(-1), values)
+
+def contract(factors: list[tuple[np.ndarray, np.ndarray]], weights: np.ndarray, members: np.ndarray, d: int) -> np.ndarray:
+    """
+    Sum over the members of the outer products of their factors on the modes d.. times their (complex) weights,
+    shape (nblocks, size of the sub-grid of the modes d..)
+    """
+    ids, values = factors[d]
+
+    if d == len(factors) - 1:
+        distinct, local = np.unique(ids[members], return_inverse=True)
+        summed = np.zeros((len(distinct), weights.shape[1]), dtype=np.complex128)
+        np.add.at(summed, local.reshape(-1), weights[members])
+
+        return summed.T @ values[distinct]
+
+    res = None
+
+    for e in np.unique(ids[members]):
+        child = contract(factors, weights, members[ids[members] == e], d + 1)
+        term = values[e][None, :, None] * child[:, None, :]
+        res = term if res is None else res + term
+
+    return res.reshape(weights.shape[1], -1)
+
+def assemble_dvr(op: OperatorTable | Evaluator, grids: list[PrimitiveGrid | np.ndarray], filename: str) -> np.memmap:
+    """
+    Evaluates an operator on the product of primitive DVR grids and writes the potential tensor
+    (diagonal in the grid, dense in the electronic blocks) to a .npy file of shape (n, m, grid...),
+    each block is a contiguous C order grid vector
+
+    the monomials are factorized into per mode factors, computed on the (1D or, for E variables, 2D) grid of each mode,
+    and contracted mode by mode : monomials sharing the same factor on a mode share the work on the modes after it
+
+    Args :
+        - op : compiled operator (or its evaluator)
+        - grids : one primitive grid (or array of points) per real coordinate (see coordinate_names)
+        - filename : path of the .npy output file
+    """
+    evaluator = op if isinstance(op, Evaluator) else op.evaluator()
+    axes = [np.asarray(g.points if isinstance(g, PrimitiveGrid) else g, dtype=np.float64) for g in grids]
+
+    if len(axes) != evaluator.ncoordinates:
+        raise ValueError(f"expected {evaluator.ncoordinates} grids, got {len(axes)}")
+
+    shape = tuple(len(a) for a in axes)
+    res = np.lib.format.open_memmap(filename, mode="w+", dtype=np.float64, shape=evaluator.shape + shape)
+    nblocks = evaluator.shape[0] * evaluator.shape[1]
+    modes = grid_modes(evaluator)
+    first = int(np.prod([len(axes[c]) for c in modes[0]], dtype=np.int64)) if len(modes) > 0 else 1
+    flat = res.reshape(nblocks, first, -1)
+    flat[...] = 0
+
+    if len(evaluator.exponents) > 0 and len(modes) > 0:
+        factors = [mode_factors(evaluator, mode, axes) for mode in modes]
+        # Re(m) wreal + Im(m) wimag = Re(m (wreal - i wimag))
+        weights = evaluator.wreal - 1j * evaluator.wimag
+        members = np.arange(len(evaluator.exponents))
+
+        if len(modes) == 1:
+            flat[:, :, 0] = contract(factors, weights, members, 0).real
+        else:
+            # only the real part of the first mode products is needed, it is accumulated straight into the output
+            ids, values = factors[0]
+
+            for e in np.unique(ids):
+                child = contract(factors, weights, members[ids == e], 1)
+
+                for g in range(first):
+                    flat[:, g] += values[e, g].real * child.real - values[e, g].imag * child.imag
+
+    res.flush()
+
+    return res
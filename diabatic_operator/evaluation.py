@@ -0,0 +1,519 @@
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+import os
+import numpy as np
+from .variable import Variable
+from .monome import Monome
+from .monomial_expansion import MonomialTerm
+from .operator_representation import Operator
+
+# kinds of variable slots, each slot being one complex variable of the monomials
+# A1/B1 -> x, A2/B2 -> i*x, E -> x + i*y (Q+) and x - i*y (Q-)
+SLOT_REAL = 0
+SLOT_IMAG = 1
+SLOT_PLUS = 2
+SLOT_MINUS = 3
+
+def coordinate_layout(variables: list[Variable]) -> tuple[np.ndarray, np.ndarray, int]:
+    """
+    Computes the kind of each variable slot and the (first) real coordinate it is built from
+    E variables use two coordinates (real and imaginary parts of Q+), shared by Q+ and Q-
+    """
+    kinds = np.empty(len(variables), dtype=np.int8)
+    columns = np.empty(len(variables), dtype=np.int64)
+    ncoordinates = 0
+    plus_columns = {}
+
+    for i, v in enumerate(variables):
+        if v.symmetry.is_A1() or v.symmetry.is_B1():
+            kinds[i] = SLOT_REAL
+            columns[i] = ncoordinates
+            ncoordinates += 1
+        elif v.symmetry.is_A2() or v.symmetry.is_B2():
+            kinds[i] = SLOT_IMAG
+            columns[i] = ncoordinates
+            ncoordinates += 1
+        else:
+            plus = v.conjugate() if v.complex_conjugate else v
+
+            if plus_columns.get(plus) is None:
+                plus_columns[plus] = ncoordinates
+                ncoordinates += 2
+
+            kinds[i] = SLOT_MINUS if v.complex_conjugate else SLOT_PLUS
+            columns[i] = plus_columns[plus]
+
+    return (kinds, columns, ncoordinates)
+
+def slot_derivatives(kinds: np.ndarray, columns: np.ndarray) -> list[list[tuple[int, complex]]]:
+    """
+    Derivatives of each variable slot with respect to the real coordinates, as (coordinate, factor) pairs
+    """
+    derivatives = []
+
+    for kind, column in zip(kinds, columns):
+        if kind == SLOT_REAL:
+            derivatives.append([(column, 1)])
+        elif kind == SLOT_IMAG:
+            derivatives.append([(column, 1j)])
+        elif kind == SLOT_PLUS:
+            derivatives.append([(column, 1), (column + 1, 1j)])
+        else:
+            derivatives.append([(column, 1), (column + 1, -1j)])
+
+    return derivatives
+
+def coordinate_names(variables: list[Variable]) -> list[str]:
+    """
+    Names of the real coordinates, in the order expected by the evaluators
+    """
+    names = []
+
+    for v in variables:
+        if v.symmetry.is_E():
+            if not v.complex_conjugate:
+                names.extend([f"Re({v})", f"Im({v})"])
+        else:
+            names.append(str(v))
+
+    return names
+
+@dataclass
+class OperatorTable:
+    """
+    Flat numeric tables of an Operator expansion (one row per term of each matrix entry)
+    the value of a term is coeff.real * Re(m) + coeff.imag * Im(m) where m = prod(slot^exponent)
+    """
+    kinds: np.ndarray       # (nslots,) kind of each variable slot
+    columns: np.ndarray     # (nslots,) coordinate used by each slot
+    ncoordinates: int
+    shape: tuple[int, int]
+    exponents: np.ndarray   # (nterms, nslots) exponents of monome^order
+    orders: np.ndarray      # (nterms,) order of the term
+    blocks: np.ndarray      # (nterms,) flat index of the matrix entry
+    coeffs: np.ndarray      # (nterms,) complex coefficient
+    groups: np.ndarray      # (nterms,) index of the (order, monome) shared by several entries
+
+    def nterms(self) -> int:
+        return len(self.orders)
+
+    def ngroups(self) -> int:
+        return int(self.groups.max()) + 1 if len(self.groups) > 0 else 0
+
+    def evaluator(self, parameters: np.ndarray = None):
+        return Evaluator(self, parameters)
+
+def monome_exponents(monome: Monome, variables: list[Variable]) -> tuple[np.ndarray, int]:
+    """
+    Exponents of a monome over the variables list, and the sign coming from conjugated A2/B2 variables
+    """
+    exponents = np.zeros(len(variables), dtype=np.int64)
+    msign = 1
+
+    for v in monome.variables:
+        if v in variables:
+            exponents[variables.index(v)] += 1
+        elif (v.symmetry.is_A2() or v.symmetry.is_B2()) and v.conjugate() in variables:
+            # conjugate of i*x is -i*x
+            exponents[variables.index(v.conjugate())] += 1
+            msign = -msign
+        else:
+            raise ValueError(f"variable {v} is not part of the variables list")
+
+    return (exponents, msign)
+
+def compile_operator(op: Operator, variables: list[Variable]) -> OperatorTable:
+    """
+    Compiles an Operator into flat numeric tables that can be evaluated on geometries
+
+    Args :
+        - op : operator to compile
+        - variables : variables list (as given by generate_variables_list) the monomes are built on
+    """
+    kinds, columns, ncoordinates = coordinate_layout(variables)
+    n, m = op.expansion.shape
+
+    exponents = []
+    orders = []
+    blocks = []
+    coeffs = []
+    groups = []
+    group_index = {}
+
+    for i in range(n):
+        for j in range(m):
+            for order, exp in op.expansion[i, j].expansion.items():
+                for mterm, coeff in exp.items():
+                    if isinstance(mterm, MonomialTerm):
+                        if mterm.rho is not None:
+                            raise ValueError(f"term {mterm} is not a monomial")
+
+                        mterm = mterm.monome
+
+                    if mterm.invariant_type is not None:
+                        raise ValueError(f"term {mterm} is not a monomial")
+
+                    if coeff == 0:
+                        continue
+
+                    mexponents, msign = monome_exponents(mterm, variables)
+                    key = (order, tuple(mexponents))
+
+                    if group_index.get(key) is None:
+                        group_index[key] = len(group_index)
+
+                    exponents.append(order * mexponents)
+                    orders.append(order)
+                    blocks.append(i * m + j)
+                    coeffs.append(complex(coeff) * msign ** order)
+                    groups.append(group_index[key])
+
+    return OperatorTable(
+        kinds,
+        columns,
+        ncoordinates,
+        (n, m),
+        np.array(exponents, dtype=np.int64).reshape(len(orders), len(variables)),
+        np.array(orders, dtype=np.int64),
+        np.array(blocks, dtype=np.int64),
+        np.array(coeffs, dtype=np.complex128),
+        np.array(groups, dtype=np.int64)
+    )
+
+class Evaluator:
+    """
+    Evaluates an OperatorTable on batches of geometries
+
+    distinct monomials are computed once and shared by all the matrix entries,
+    parameters (one per group of the table) scale the coefficients of the table
+    """
+
+    def __init__(self, table: OperatorTable, parameters: np.ndarray = None):
+        self.table = table
+        self.shape = table.shape
+        self.ncoordinates = table.ncoordinates
+
+        if parameters is None:
+            parameters = np.ones(table.ngroups())
+
+        parameters = np.asarray(parameters, dtype=np.float64)
+        assert parameters.shape == (table.ngroups(),)
+
+        nblocks = self.shape[0] * self.shape[1]
+        nslots = len(table.kinds)
+
+        if table.nterms() > 0:
+            self.exponents, inverse = np.unique(table.exponents, axis=0, return_inverse=True)
+            inverse = inverse.reshape(-1)
+        else:
+            self.exponents = np.zeros((0, nslots), dtype=np.int64)
+            inverse = np.zeros(0, dtype=np.int64)
+
+        coeffs = table.coeffs * parameters[table.groups]
+        self.wreal = np.zeros((len(self.exponents), nblocks))
+        self.wimag = np.zeros((len(self.exponents), nblocks))
+        np.add.at(self.wreal, (inverse, table.blocks), coeffs.real)
+        np.add.at(self.wimag, (inverse, table.blocks), coeffs.imag)
+
+        # distinct monomial of each term and scaled coefficients, for the per order weights (see evaluate_orders)
+        self.inverse = inverse
+        self.coeffs = coeffs
+        self.__setup()
+
+    def __setup(self):
+        nslots = len(self.table.kinds)
+        self.max_power = self.exponents.max(axis=0) if len(self.exponents) > 0 else np.zeros(nslots, dtype=np.int64)
+        self.active = [s for s in range(nslots) if self.max_power[s] > 0]
+        self.rows = [np.nonzero(self.exponents[:, s])[0] for s in range(nslots)]
+        self.__order_weights = None
+
+    @classmethod
+    def from_weights(cls, table: OperatorTable, exponents: np.ndarray, wreal: np.ndarray, wimag: np.ndarray):
+        """
+        Evaluator from its distinct monomials and weights (as computed by the constructor), the arrays aren't copied
+        """
+        evaluator = cls.__new__(cls)
+        evaluator.table = table
+        evaluator.shape = table.shape
+        evaluator.ncoordinates = table.ncoordinates
+        evaluator.exponents = exponents
+        evaluator.wreal = wreal
+        evaluator.wimag = wimag
+        evaluator.inverse = None
+        evaluator.coeffs = None
+        evaluator.__setup()
+
+        return evaluator
+
+    def slot_values(self, coords: np.ndarray) -> np.ndarray:
+        """
+        Complex values of each variable slot, shape (nslots, N)
+        """
+        coords = np.asarray(coords, dtype=np.float64)
+        z = np.empty((len(self.table.kinds), coords.shape[0]), dtype=np.complex128)
+
+        for s, (kind, column) in enumerate(zip(self.table.kinds, self.table.columns)):
+            if kind == SLOT_REAL:
+                z[s] = coords[:, column]
+            elif kind == SLOT_IMAG:
+                z[s] = 1j * coords[:, column]
+            elif kind == SLOT_PLUS:
+                z[s] = coords[:, column] + 1j * coords[:, column + 1]
+            else:
+                z[s] = coords[:, column] - 1j * coords[:, column + 1]
+
+        return z
+
+    def power_tables(self, z: np.ndarray) -> list[np.ndarray]:
+        """
+        Powers of each slot up to the highest exponent used, tables[s][p] = z[s]^p
+        """
+        tables = []
+
+        for s in range(len(z)):
+            table = np.empty((self.max_power[s] + 1, z.shape[1]), dtype=np.complex128)
+            table[0] = 1
+
+            for p in range(1, self.max_power[s] + 1):
+                np.multiply(table[p - 1], z[s], out=table[p])
+
+            tables.append(table)
+
+        return tables
+
+    def monomials(self, coords: np.ndarray) -> np.ndarray:
+        """
+        Values of every distinct monomial, shape (nmonomials, N)
+        """
+        tables = self.power_tables(self.slot_values(coords))
+        values = np.ones((len(self.exponents), np.shape(coords)[0]), dtype=np.complex128)
+
+        for s in self.active:
+            rows = self.rows[s]
+            values[rows] *= tables[s][self.exponents[rows, s]]
+
+        return values
+
+    def evaluate(self, coords: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        """
+        Evaluates the operator matrix on a batch of geometries
+
+        Args :
+            - coords : (N, ncoordinates) array of real coordinates (see coordinate_names)
+            - out[=None] : optional (N, n, m) output array
+        """
+        coords = np.asarray(coords, dtype=np.float64)
+        assert coords.ndim == 2 and coords.shape[1] == self.ncoordinates
+
+        values = self.monomials(coords)
+        res = values.real.T @ self.wreal
+        res += values.imag.T @ self.wimag
+
+        if out is None:
+            return res.reshape(coords.shape[0], *self.shape)
+
+        out[...] = res.reshape(coords.shape[0], *self.shape)
+
+        return out
+
+    def order_weights(self) -> list[tuple[int, np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        (order, rows, wreal, wimag) for each order of the table : the distinct monomials used by the terms of that order
+        and their weights restricted to these terms (the weights of all the orders add up to wreal, wimag)
+        """
+        if self.__order_weights is not None:
+            return self.__order_weights
+
+        if self.inverse is None:
+            raise ValueError("the terms of an evaluator built from its weights aren't known, the orders can't be separated")
+
+        table = self.table
+        nblocks = self.wreal.shape[1]
+        self.__order_weights = []
+
+        for order in np.unique(table.orders):
+            terms = np.nonzero(table.orders == order)[0]
+            rows, local = np.unique(self.inverse[terms], return_inverse=True)
+            wreal = np.zeros((len(rows), nblocks))
+            wimag = np.zeros((len(rows), nblocks))
+            np.add.at(wreal, (local.reshape(-1), table.blocks[terms]), self.coeffs[terms].real)
+            np.add.at(wimag, (local.reshape(-1), table.blocks[terms]), self.coeffs[terms].imag)
+            self.__order_weights.append((int(order), rows, wreal, wimag))
+
+        return self.__order_weights
+
+    def evaluate_orders(self, coords: np.ndarray, max_order: int = None) -> np.ndarray:
+        """
+        Evaluates the operator truncated at every order p = 0..max_order in a single pass,
+        res[p] is the evaluation of op.up_to_order(p), shape (max_order + 1, N, n, m)
+
+        the monomials (and the power tables) are computed once, each term is used once in the partial sum of its order,
+        then the partial sums are accumulated over the orders
+
+        Args :
+            - coords : (N, ncoordinates) array of real coordinates (see coordinate_names)
+            - max_order[=None] : highest truncation order (the highest order of the table by default)
+        """
+        coords = np.asarray(coords, dtype=np.float64)
+        assert coords.ndim == 2 and coords.shape[1] == self.ncoordinates
+
+        if max_order is None:
+            max_order = int(self.table.orders.max()) if self.table.nterms() > 0 else 0
+
+        assert max_order >= 0
+
+        values = self.monomials(coords)
+        res = np.zeros((max_order + 1, coords.shape[0], self.wreal.shape[1]))
+
+        for order, rows, wreal, wimag in self.order_weights():
+            if order > max_order:
+                continue
+
+            v = values[rows]
+            res[order] = v.real.T @ wreal
+            res[order] += v.imag.T @ wimag
+
+        np.cumsum(res, axis=0, out=res)
+
+        return res.reshape(max_order + 1, coords.shape[0], *self.shape)
+
+    def gradient(self, coords: np.ndarray) -> np.ndarray:
+        """
+        Analytic derivatives of the operator matrix with respect to the real coordinates, shape (N, ncoordinates, n, m)
+        """
+        coords = np.asarray(coords, dtype=np.float64)
+        assert coords.ndim == 2 and coords.shape[1] == self.ncoordinates
+
+        npoints = coords.shape[0]
+        tables = self.power_tables(self.slot_values(coords))
+        derivatives = slot_derivatives(self.table.kinds, self.table.columns)
+        res = np.zeros((npoints, self.ncoordinates, self.wreal.shape[1]))
+
+        for s in self.active:
+            rows = self.rows[s]
+            exponents = self.exponents[rows]
+            # d(z_s^e)/dz_s = e * z_s^(e - 1)
+            partial = exponents[:, s][:, None] * tables[s][exponents[:, s] - 1]
+
+            for t in self.active:
+                if t != s:
+                    partial *= tables[t][exponents[:, t]]
+
+            for column, factor in derivatives[s]:
+                d = factor * partial
+                res[:, column] += d.real.T @ self.wreal[rows] + d.imag.T @ self.wimag[rows]
+
+        return res.reshape(npoints, self.ncoordinates, *self.shape)
+
+    def work_buffers(self, chunk_size: int):
+        return WorkBuffers(self, chunk_size)
+
+    def evaluate_into(self, coords: np.ndarray, buffers, out: np.ndarray) -> np.ndarray:
+        """
+        Evaluates a chunk of at most buffers.chunk_size geometries into out (N, n, m)
+        without allocating, all the intermediate values are stored in the work buffers
+        """
+        npoints = coords.shape[0]
+        assert npoints <= buffers.chunk_size
+
+        z = buffers.z[:, :npoints]
+        values = buffers.values[:, :npoints]
+        gathered = buffers.gathered[:, :npoints]
+        res = buffers.res[:npoints]
+
+        for s, (kind, column) in enumerate(zip(self.table.kinds, self.table.columns)):
+            if kind == SLOT_REAL:
+                z[s].real = coords[:, column]
+                z[s].imag = 0
+            elif kind == SLOT_IMAG:
+                z[s].real = 0
+                z[s].imag = coords[:, column]
+            else:
+                z[s].real = coords[:, column]
+                z[s].imag = coords[:, column + 1]
+
+                if kind == SLOT_MINUS:
+                    np.negative(z[s].imag, out=z[s].imag)
+
+        values.fill(1)
+
+        for s in self.active:
+            table = buffers.tables[s][:, :npoints]
+
+            for p in range(1, self.max_power[s] + 1):
+                np.multiply(table[p - 1], z[s], out=table[p])
+
+            np.take(table, self.exponents[:, s], axis=0, out=gathered)
+            np.multiply(values, gathered, out=values)
+
+        np.matmul(values.real.T, self.wreal, out=res)
+        np.matmul(values.imag.T, self.wimag, out=buffers.res_imag[:npoints])
+        np.add(res, buffers.res_imag[:npoints], out=res)
+        out.reshape(npoints, -1)[...] = res
+
+        return out
+
+class WorkBuffers:
+    """
+    Preallocated buffers (slot values, power tables, monomial values) for the evaluation of one chunk
+    """
+
+    def __init__(self, evaluator: Evaluator, chunk_size: int):
+        nslots = len(evaluator.table.kinds)
+        nblocks = evaluator.shape[0] * evaluator.shape[1]
+
+        self.chunk_size = chunk_size
+        self.z = np.empty((nslots, chunk_size), dtype=np.complex128)
+        self.tables = []
+
+        for s in range(nslots):
+            table = np.empty((evaluator.max_power[s] + 1, chunk_size), dtype=np.complex128)
+            table[0] = 1
+            self.tables.append(table)
+
+        self.values = np.empty((len(evaluator.exponents), chunk_size), dtype=np.complex128)
+        self.gathered = np.empty_like(self.values)
+        self.res = np.empty((chunk_size, nblocks))
+        self.res_imag = np.empty((chunk_size, nblocks))
+
+def evaluate_parallel(evaluator: Evaluator, coords: np.ndarray, nthreads: int = None, chunk_size: int = 1024, out: np.ndarray = None) -> np.ndarray:
+    """
+    Evaluates the operator matrix on a batch of geometries using a pool of threads
+
+    the batch is split in one contiguous range per thread, each thread going through its range
+    chunk by chunk with its own work buffers, the numpy kernels used release the GIL
+
+    Args :
+        - evaluator : evaluator of the operator
+        - coords : (N, ncoordinates) array of real coordinates
+        - nthreads[=None] : number of threads (defaults to the number of cpus)
+        - chunk_size[=1024] : number of geometries evaluated at once by a thread
+        - out[=None] : optional (N, n, m) output array
+    """
+    coords = np.ascontiguousarray(coords, dtype=np.float64)
+    assert coords.ndim == 2 and coords.shape[1] == evaluator.ncoordinates
+
+    if nthreads is None:
+        nthreads = os.cpu_count() or 1
+
+    npoints = coords.shape[0]
+
+    if out is None:
+        out = np.empty((npoints, *evaluator.shape))
+
+    bounds = np.linspace(0, npoints, nthreads + 1).astype(np.int64)
+
+    def work(start: int, stop: int):
+        buffers = evaluator.work_buffers(min(chunk_size, max(stop - start, 1)))
+
+        for cstart in range(start, stop, buffers.chunk_size):
+            cstop = min(cstart + buffers.chunk_size, stop)
+            evaluator.evaluate_into(coords[cstart:cstop], buffers, out[cstart:cstop])
+
+    with ThreadPoolExecutor(max_workers=nthreads) as executor:
+        futures = [executor.submit(work, bounds[t], bounds[t + 1]) for t in range(nthreads) if bounds[t + 1] > bounds[t]]
+
+        for future in futures:
+            future.result()
+
+    return out
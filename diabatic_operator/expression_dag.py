@@ -0,0 +1,210 @@
+from dataclasses import dataclass
+import numpy as np
+from .variable import Variable
+from .monomial_expansion import MonomialTerm
+from .operator_representation import Operator
+from .evaluation import coordinate_layout, monome_exponents, SLOT_REAL, SLOT_IMAG, SLOT_PLUS
+
+# kinds of nodes of the expression DAG
+NODE_ONE = 0    # constant 1 (terms of order 0)
+NODE_SLOT = 1   # value of a variable slot (see evaluation.coordinate_layout)
+NODE_MUL = 2    # product of two nodes
+
+@dataclass
+class ExpressionDAG:
+    """
+    Single expression DAG of all the entries of an operator matrix (every block and both components)
+
+    the nodes are hash-consed : a slot power or a product of powers (prefix of the monomials in the slot order)
+    is a single node whatever the number of terms using it, nodes are stored in topological order,
+    the outputs are the nodes whose real and imaginary parts are combined into the entries
+    """
+    kinds: np.ndarray       # (nslots,) kind of each variable slot
+    columns: np.ndarray     # (nslots,) coordinate used by each slot
+    ncoordinates: int
+    shape: tuple            # shape of the evaluated matrix
+    ops: np.ndarray         # (nnodes,) kind of each node
+    args: np.ndarray        # (nnodes, 2) slot of a NODE_SLOT, operands of a NODE_MUL
+    levels: np.ndarray      # (nnodes,) depth of each node
+    outputs: np.ndarray     # (noutputs,) nodes used by the entries
+    wreal: np.ndarray       # (noutputs, nentries) weights of Re(node)
+    wimag: np.ndarray       # (noutputs, nentries) weights of Im(node)
+
+    def nnodes(self) -> int:
+        return len(self.ops)
+
+    def nmultiplications(self) -> int:
+        return int(np.count_nonzero(self.ops == NODE_MUL))
+
+    def evaluator(self):
+        return DAGEvaluator(self)
+
+class DAGBuilder:
+    """
+    Hash-consing construction of the nodes of an ExpressionDAG
+    """
+
+    def __init__(self, nslots: int):
+        self.ops = [NODE_ONE]
+        self.args = [(-1, -1)]
+        self.levels = [0]
+        self.index = {(NODE_ONE, -1, -1): 0}
+        self.powers = [[None] for _ in range(nslots)]
+
+    def node(self, op: int, a: int, b: int = -1) -> int:
+        if op == NODE_MUL and a > b:
+            a, b = b, a
+
+        if self.index.get((op, a, b)) is None:
+            self.index[(op, a, b)] = len(self.ops)
+            self.ops.append(op)
+            self.args.append((a, b))
+            self.levels.append(0 if op == NODE_SLOT else max(self.levels[a], self.levels[b]) + 1)
+
+        return self.index[(op, a, b)]
+
+    def power(self, s: int, p: int) -> int:
+        # z^p = z^(p - 1) * z, every power below p is shared
+        powers = self.powers[s]
+
+        while len(powers) <= p:
+            k = len(powers)
+            powers.append(self.node(NODE_SLOT, s) if k == 1 else self.node(NODE_MUL, powers[k - 1], powers[1]))
+
+        return powers[p]
+
+    def monomial(self, exponents: np.ndarray) -> int:
+        # product of the powers in the slot order, monomials with the same first powers share their prefix
+        res = 0
+
+        for s in np.nonzero(exponents)[0]:
+            p = self.power(s, int(exponents[s]))
+            res = p if res == 0 else self.node(NODE_MUL, res, p)
+
+        return res
+
+def lower_operator(op: Operator | np.ndarray, variables: list[Variable]) -> ExpressionDAG:
+    """
+    Lowers an operator matrix into a single expression DAG
+
+    Args :
+        - op : Operator, or array of Operators as returned by operator() (all the blocks and components are lowered
+          together, the entries of the DAG being ordered as op.shape + expansion shape)
+        - variables : variables list (as given by generate_variables_list) the monomes are built on
+    """
+    ops = np.empty((), dtype=object) if isinstance(op, Operator) else np.asarray(op, dtype=object)
+
+    if isinstance(op, Operator):
+        ops[()] = op
+
+    kinds, columns, ncoordinates = coordinate_layout(variables)
+    n, m = ops.flat[0].expansion.shape
+    shape = ops.shape + (n, m)
+    nentries = int(np.prod(shape, dtype=np.int64))
+    builder = DAGBuilder(len(variables))
+    weights = {}
+
+    for k, o in enumerate(ops.flat):
+        assert o.expansion.shape == (n, m)
+
+        for i in range(n):
+            for j in range(m):
+                entry = (k * n + i) * m + j
+
+                for order, exp in o.expansion[i, j].expansion.items():
+                    for mterm, coeff in exp.items():
+                        if isinstance(mterm, MonomialTerm):
+                            if mterm.rho is not None:
+                                raise ValueError(f"term {mterm} is not a monomial")
+
+                            mterm = mterm.monome
+
+                        if mterm.invariant_type is not None:
+                            raise ValueError(f"term {mterm} is not a monomial")
+
+                        if coeff == 0:
+                            continue
+
+                        mexponents, msign = monome_exponents(mterm, variables)
+                        node = builder.monomial(order * mexponents)
+                        coeff = complex(coeff) * msign ** order
+
+                        if weights.get(node) is None:
+                            weights[node] = np.zeros(nentries, dtype=np.complex128)
+
+                        weights[node][entry] += coeff
+
+    outputs = np.array(sorted(weights), dtype=np.int64)
+    w = np.array([weights[node] for node in outputs], dtype=np.complex128).reshape(len(outputs), nentries)
+
+    return ExpressionDAG(
+        kinds,
+        columns,
+        ncoordinates,
+        shape,
+        np.array(builder.ops, dtype=np.int8),
+        np.array(builder.args, dtype=np.int64).reshape(-1, 2),
+        np.array(builder.levels, dtype=np.int64),
+        outputs,
+        np.ascontiguousarray(w.real),
+        np.ascontiguousarray(w.imag)
+    )
+
+class DAGEvaluator:
+    """
+    Evaluates an ExpressionDAG on batches of geometries, each node is computed once per geometry
+    (the products of a level of the DAG are computed together)
+    """
+
+    def __init__(self, dag: ExpressionDAG):
+        self.dag = dag
+        self.shape = dag.shape
+        self.ncoordinates = dag.ncoordinates
+        self.slots = np.nonzero(dag.ops == NODE_SLOT)[0]
+        products = np.nonzero(dag.ops == NODE_MUL)[0]
+        self.products = [products[dag.levels[products] == level] for level in np.unique(dag.levels[products])]
+
+    def nodes(self, coords: np.ndarray) -> np.ndarray:
+        """
+        Values of every node, shape (nnodes, N)
+        """
+        coords = np.asarray(coords, dtype=np.float64)
+        dag = self.dag
+        values = np.empty((dag.nnodes(), coords.shape[0]), dtype=np.complex128)
+        values[0] = 1
+
+        for k in self.slots:
+            s = dag.args[k, 0]
+            kind, column = dag.kinds[s], dag.columns[s]
+
+            if kind == SLOT_REAL:
+                values[k] = coords[:, column]
+            elif kind == SLOT_IMAG:
+                values[k] = 1j * coords[:, column]
+            elif kind == SLOT_PLUS:
+                values[k] = coords[:, column] + 1j * coords[:, column + 1]
+            else:
+                values[k] = coords[:, column] - 1j * coords[:, column + 1]
+
+        for rows in self.products:
+            values[rows] = values[dag.args[rows, 0]] * values[dag.args[rows, 1]]
+
+        return values
+
+    def evaluate(self, coords: np.ndarray) -> np.ndarray:
+        """
+        Evaluates all the entries on a batch of geometries
+
+        Args :
+            - coords : (N, ncoordinates) array of real coordinates (see coordinate_names)
+
+        Returns a (N, *shape) array
+        """
+        coords = np.asarray(coords, dtype=np.float64)
+        assert coords.ndim == 2 and coords.shape[1] == self.ncoordinates
+
+        values = self.nodes(coords)[self.dag.outputs]
+        res = values.real.T @ self.dag.wreal
+        res += values.imag.T @ self.dag.wimag
+
+        return res.reshape(coords.shape[0], *self.shape)
@@ -0,0 +1,72 @@
+from .symmetry import Symmetry
+
+# component of the operator form
+COMPONENT_X = 0
+COMPONENT_Y = 1
+
+def term_order(component, n, j, sg, gamma, sigma1, alpha1, sigma2, alpha2):
+    """
+    Order k of the term (j, sg, sigma1, sigma2) of the loops of A_x / A_y :
+    k = n j + sg gamma + sigma1 alpha1 + sigma2 alpha2 (X component) or k = n j + gamma + sigma1 alpha1 - sigma2 alpha2 (Y component)
+
+    only uses arithmetic so that it works on ints as well as on broadcast numpy arrays (see selection_rules)
+    """
+    x = n * j + sg * gamma + sigma1 * alpha1 + sigma2 * alpha2
+    y = n * j + gamma + sigma1 * alpha1 - sigma2 * alpha2
+
+    return x + (y - x) * component
+
+def term_form(component, sg, sigma1, sigma2) -> tuple:
+    """
+    (sigma, tilde, sign) arguments of the form matrix of the term (j, sg, sigma1, sigma2) :
+    sigma = -sigma2, the tilde form when sigma1 sigma2 < 0 and the sign sg for the Y component (1 for X)
+    """
+    return (-sigma2, sigma1 * sigma2 < 0, 1 + (sg - 1) * component)
+
+def form_terms(n: int, gamma: int, alpha1: int, alpha2: int, component: int, max_order: int):
+    """
+    Yields (order, sigma, tilde, sign) for each allowed term of an operator form, in the order of the loops over (j, sg, sigma1, sigma2)
+
+    the loops stop at the first j for which all the orders exceed max_order, j <= (max_order + gamma + alpha1 + alpha2) / n
+    """
+    for j in range((max_order + gamma + alpha1 + alpha2) // n + 1):
+        for sg in (-1, 1):
+            for sigma1 in (-1, 1):
+                for sigma2 in (-1, 1):
+                    k = term_order(component, n, j, sg, gamma, sigma1, alpha1, sigma2, alpha2)
+
+                    if 0 <= k <= max_order:
+                        yield (k,) + term_form(component, sg, sigma1, sigma2)
+
+def form_entries(component: int, tilde: bool, sigma: int, sign: int) -> list[list[complex]]:
+    """
+    Matrix of a term of the operator forms (X, X~, Y or Y~) as nested lists
+    """
+    if component == COMPONENT_X:
+        if not tilde:
+            return [[sign, sign * sigma * 1j], [sign * sigma * 1j, sign * (-1) ** sigma]]
+
+        return [[sign, sign * sigma * 1j], [-sign * sigma * 1j, sign]]
+
+    if not tilde:
+        return [[sign * 1j, -sign * sigma], [-sign * sigma, sign * ((-1) ** sigma) * 1j]]
+
+    return [[sign * 1j, -sign * sigma], [sign * sigma, sign * 1j]]
+
+def has_component(opsymmetry: Symmetry, component: int) -> bool:
+    """
+    A2 / B2 operators have no X component, A1 / B1 ones no Y component
+    """
+    if component == COMPONENT_X:
+        return not (opsymmetry.is_A2() or opsymmetry.is_B2())
+
+    return not (opsymmetry.is_A1() or opsymmetry.is_B1())
+
+def kept_entries(s1: Symmetry, s2: Symmetry) -> list[list[bool]]:
+    """
+    Entries of the 2x2 operator form kept by the states symmetries (row (s1 + 1) % 2 and column (s2 + 1) % 2 vanish unless the state is E)
+    """
+    rows = [s1.is_E() or a != (s1.value() + 1) % 2 for a in range(2)]
+    columns = [s2.is_E() or b != (s2.value() + 1) % 2 for b in range(2)]
+
+    return [[rows[a] and columns[b] for b in range(2)] for a in range(2)]
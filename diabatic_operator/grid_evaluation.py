@@ -0,0 +1,60 @@
+import numpy as np
+from .evaluation import OperatorTable, Evaluator
+
+def chunk_size_for(evaluator: Evaluator, cache_bytes: int = 1 << 22) -> int:
+    """
+    Number of geometries per chunk so that the monomial values of a chunk fit in cache_bytes
+    """
+    # complex monomial values + coordinates + real output per geometry
+    nmonomials = max(len(evaluator.exponents), 1)
+    per_point = 16 * nmonomials + 8 * evaluator.ncoordinates + 8 * evaluator.shape[0] * evaluator.shape[1]
+
+    return max(1, cache_bytes // per_point)
+
+def grid_coordinates(axes: list[np.ndarray], start: int, stop: int) -> np.ndarray:
+    """
+    Coordinates of the points start..stop-1 (C order) of the product grid built on axes
+    """
+    shape = tuple(len(a) for a in axes)
+    indices = np.unravel_index(np.arange(start, stop), shape)
+    coords = np.empty((stop - start, len(axes)))
+
+    for c, (axis, idx) in enumerate(zip(axes, indices)):
+        coords[:, c] = axis[idx]
+
+    return coords
+
+def evaluate_grid(op: OperatorTable | Evaluator, axes: list[np.ndarray], filename: str, chunk_size: int = None) -> np.memmap:
+    """
+    Evaluates an operator on the product grid of axes and writes the (grid..., n, m) result to a .npy file
+
+    the grid is never built in full : the points are generated and evaluated chunk by chunk,
+    and each chunk is written straight into the memory mapped output file
+
+    Args :
+        - op : compiled operator (or its evaluator)
+        - axes : one 1D array of values per real coordinate (see coordinate_names)
+        - filename : path of the .npy output file
+        - chunk_size[=None] : number of points evaluated at once (defaults to a cache sized chunk)
+    """
+    evaluator = op if isinstance(op, Evaluator) else op.evaluator()
+    axes = [np.asarray(a, dtype=np.float64) for a in axes]
+
+    if len(axes) != evaluator.ncoordinates:
+        raise ValueError(f"expected {evaluator.ncoordinates} axes, got {len(axes)}")
+
+    if chunk_size is None:
+        chunk_size = chunk_size_for(evaluator)
+
+    shape = tuple(len(a) for a in axes)
+    npoints = int(np.prod(shape, dtype=np.int64))
+    res = np.lib.format.open_memmap(filename, mode="w+", dtype=np.float64, shape=shape + evaluator.shape)
+    flat = res.reshape(npoints, *evaluator.shape)
+
+    for start in range(0, npoints, chunk_size):
+        stop = min(start + chunk_size, npoints)
+        evaluator.evaluate(grid_coordinates(axes, start, stop), out=flat[start:stop])
+
+    res.flush()
+
+    return res
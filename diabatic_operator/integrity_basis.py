@@ -0,0 +1,200 @@
+from dataclasses import dataclass, field
+import numpy as np
+from .variable import Variable
+from .monome import Monome
+from .evaluation import coordinate_layout, monome_exponents, SLOT_REAL, SLOT_IMAG, SLOT_PLUS
+
+# the invariants are evaluated exactly in Z/PRIME at random points, a polynomial relation holds
+# (with probability >= 1 - degree / PRIME) if and only if it holds at the points
+PRIME = 2147483647
+
+@dataclass
+class IntegrityBasis:
+    """
+    Invariants left after removing the ones that are polynomials in the others (up to max_degree),
+    a report only : nothing else in the generation, the operator or its compiled tables uses it
+    """
+    invariants: list[Monome]
+    eliminated: list[Monome] = field(default_factory=list)
+    max_degree: int = None
+
+    def neliminated(self) -> int:
+        return len(self.eliminated)
+
+    def __str__(self) -> str:
+        return f"{len(self.invariants)} invariants ({self.neliminated()} eliminated up to degree {self.max_degree})"
+
+def invariant_degree(inv: Monome) -> int:
+    """
+    Degree of the invariant in the coordinates (rho^2 is the square of the imaginary part)
+    """
+    return 2 * len(inv.variables) if inv.invariant_type.is_pseudo_invariant() else len(inv.variables)
+
+def invariant_values(inv: Monome, variables: list[Variable], slots: list[tuple[np.ndarray, np.ndarray]]) -> np.ndarray:
+    """
+    Values (mod PRIME) of the real function of an invariant : the monome (full invariant), its real part (real invariant)
+    or the square of its imaginary part (pseudo invariant), slots being the (real, imag) values of each variable slot
+    """
+    exponents, msign = monome_exponents(inv, variables)
+    npoints = len(slots[0][0]) if len(slots) > 0 else 0
+    re = np.full(npoints, msign % PRIME, dtype=np.int64)
+    im = np.zeros(npoints, dtype=np.int64)
+
+    for s in np.nonzero(exponents)[0]:
+        a, b = slots[s]
+
+        for _ in range(exponents[s]):
+            re, im = (re * a - im * b) % PRIME, (re * b + im * a) % PRIME
+
+    if inv.invariant_type.is_pseudo_invariant():
+        return im * im % PRIME
+
+    if not inv.invariant_type.is_real_invariant():
+        assert not np.any(im), f"{inv} isn't real"
+
+    return re
+
+def invariant_multidegree(inv: Monome, variables: list[Variable], columns: np.ndarray) -> tuple[int, ...]:
+    """
+    Degrees of the invariant in each variable (Q+ and Q- of an E variable counting together),
+    the relations between invariants are multihomogeneous
+    """
+    exponents, _ = monome_exponents(inv, variables)
+    multidegree = np.zeros(len(variables), dtype=np.int64)
+    np.add.at(multidegree, columns, exponents)
+
+    return tuple((2 if inv.invariant_type.is_pseudo_invariant() else 1) * multidegree)
+
+def product_combos(multidegrees: list[tuple[int, ...]], target: tuple[int, ...]) -> list[tuple[int, ...]]:
+    """
+    Multisets of indices (at least two, non decreasing) whose multidegrees sum to target
+    """
+    res = []
+    multidegrees = [np.array(d) for d in multidegrees]
+
+    def search(prefix: list[int], start: int, remaining: np.ndarray):
+        if not np.any(remaining):
+            if len(prefix) >= 2:
+                res.append(tuple(prefix))
+
+            return
+
+        for k in range(start, len(multidegrees)):
+            if np.all(multidegrees[k] <= remaining):
+                prefix.append(k)
+                search(prefix, k, remaining - multidegrees[k])
+                prefix.pop()
+
+    search([], 0, np.array(target))
+
+    return res
+
+class Echelon:
+    """
+    Row echelon form (mod PRIME) of a growing set of vectors, to test linear independence
+    """
+
+    def __init__(self):
+        self.rows = []
+        self.pivots = []
+
+    def add(self, vector: np.ndarray) -> bool:
+        """
+        Adds the vector if it isn't a linear combination of the previous ones, returns True if it was added
+        """
+        v = vector % PRIME
+
+        for row, pivot in zip(self.rows, self.pivots):
+            if v[pivot] != 0:
+                v = (v - v[pivot] * row) % PRIME
+
+        nonzero = np.nonzero(v)[0]
+
+        if len(nonzero) == 0:
+            return False
+
+        pivot = int(nonzero[0])
+        self.rows.append(v * pow(int(v[pivot]), PRIME - 2, PRIME) % PRIME)
+        self.pivots.append(pivot)
+
+        return True
+
+def minimal_integrity_basis(invs: list[Monome], variables: list[Variable], max_degree: int = None, seed: int = 0) -> IntegrityBasis:
+    """
+    Removes the invariants that are polynomials in the other ones (syzygies among the generated invariants),
+    e.g. rho^2(m) = m conj(m) - r(m)^2 when m conj(m) is an invariant
+
+    it only reports the redundancy : operator() and compile_operator don't use the invariants (the parameters of the
+    compiled tables are those of the groups of appearing monomes, see OperatorTable), so the reduced basis changes
+    neither the operator nor its number of parameters, it is meant for code that expands the coefficients in the invariants
+
+    the invariants are taken by increasing degree, an invariant is eliminated if it is a linear combination of the
+    products of the kept invariants of lower degree and of the kept invariants of the same degree, only the products
+    with the same multidegree (degree in each variable) are needed
+
+    Args :
+        - invs : invariants (as returned by generate_invariants_and_monoms)
+        - variables : variables list the invariants are built on
+        - max_degree[=None] : invariants of higher degree (in the coordinates) are kept without being tested (no limit by default)
+        - seed[=0] : seed of the random evaluation points
+    """
+    kinds, columns, ncoordinates = coordinate_layout(variables)
+    degrees = [invariant_degree(inv) for inv in invs]
+    multidegrees = [invariant_multidegree(inv, variables, columns) for inv in invs]
+    max_degree = max(degrees, default=0) if max_degree is None else max_degree
+    rng = np.random.default_rng(seed)
+    kept = []
+    eliminated = set()
+
+    for degree in sorted(set(d for d in degrees if d <= max_degree)):
+        lower = list(kept)
+        groups = {}
+
+        for k, d in enumerate(degrees):
+            if d == degree:
+                groups.setdefault(multidegrees[k], []).append(k)
+
+        for target, candidates in groups.items():
+            combos = product_combos([multidegrees[k] for k in lower], target)
+            # more points than vectors, so that the rank of the evaluations is the dimension of their span
+            npoints = len(combos) + len(candidates) + 16
+            coords = rng.integers(0, PRIME, size=(npoints, ncoordinates), dtype=np.int64)
+            slots = []
+
+            for kind, column in zip(kinds, columns):
+                zero = np.zeros(npoints, dtype=np.int64)
+
+                if kind == SLOT_REAL:
+                    slots.append((coords[:, column], zero))
+                elif kind == SLOT_IMAG:
+                    slots.append((zero, coords[:, column]))
+                elif kind == SLOT_PLUS:
+                    slots.append((coords[:, column], coords[:, column + 1]))
+                else:
+                    slots.append((coords[:, column], -coords[:, column + 1] % PRIME))
+
+            values = {}
+            echelon = Echelon()
+
+            for combo in combos:
+                product = None
+
+                for i in combo:
+                    if values.get(lower[i]) is None:
+                        values[lower[i]] = invariant_values(invs[lower[i]], variables, slots)
+
+                    product = values[lower[i]] if product is None else product * values[lower[i]] % PRIME
+
+                echelon.add(product)
+
+            for k in candidates:
+                if echelon.add(invariant_values(invs[k], variables, slots)):
+                    kept.append(k)
+                else:
+                    eliminated.add(k)
+
+    return IntegrityBasis(
+        [inv for k, inv in enumerate(invs) if k not in eliminated],
+        [inv for k, inv in enumerate(invs) if k in eliminated],
+        max_degree
+    )
@@ -0,0 +1,216 @@
+import os
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from .symmetry import Symmetry
+from .variable import Variable, generate_variables_list
+from .monomial_expansion import MonomialTerm, generate_invariants_and_monoms
+from .operator_representation import Operator, assemble_operator
+from .selection_rules import selection_rules
+from .evaluation import OperatorTable, Evaluator, compile_operator, monome_exponents, coordinate_names
+
+# design matrices and targets of the worker processes, set once by init_worker
+worker_designs = None
+worker_targets = None
+worker_folds = None
+
+@dataclass
+class ModelSelection:
+    """
+    Cross-validation errors of the models (nvarsym, max_order) and the chosen one (lowest mean validation error)
+    """
+    nvarsyms: list[list[int]]
+    orders: list[int]
+    errors: np.ndarray      # (nlayouts, norders) mean validation rms error over the folds
+    deviations: np.ndarray  # (nlayouts, norders) standard deviation of the validation error over the folds
+    nparameters: np.ndarray # (nlayouts, norders) number of fitted parameters
+    best: tuple[int, int]   # (layout, order) indices of the chosen model
+    table: OperatorTable    # compiled operator of the chosen layout at the largest order
+    parameters: np.ndarray  # parameters of the chosen model fitted on all the data (0 for the groups above its order)
+
+    def nvarsym(self) -> list[int]:
+        return self.nvarsyms[self.best[0]]
+
+    def max_order(self) -> int:
+        return self.orders[self.best[1]]
+
+    def evaluator(self) -> Evaluator:
+        return self.table.evaluator(self.parameters)
+
+    def __str__(self) -> str:
+        lines = [f"{'nvarsym':>24} {'order':>6} {'params':>7} {'error':>12} {'deviation':>12}"]
+
+        for (l, o), error in np.ndenumerate(self.errors):
+            mark = " *" if (l, o) == self.best else ""
+            lines.append(f"{str(self.nvarsyms[l]):>24} {self.orders[o]:>6} {self.nparameters[l, o]:>7} {error:>12.6g} {self.deviations[l, o]:>12.6g}{mark}")
+
+        return "\n".join(lines)
+
+def group_orders(op: Operator, variables: list[Variable]) -> np.ndarray:
+    """
+    Order (in the sense of max_order, order * weight of the monome) of each group of compile_operator(op, variables),
+    the terms of a group built with a lower max_order are the groups of order <= max_order
+    """
+    n, m = op.expansion.shape
+    orders = {}
+
+    # same loops as compile_operator
+    for i in range(n):
+        for j in range(m):
+            for order, exp in op.expansion[i, j].expansion.items():
+                for mterm, coeff in exp.items():
+                    if isinstance(mterm, MonomialTerm):
+                        mterm = mterm.monome
+
+                    if coeff == 0:
+                        continue
+
+                    mexponents, _ = monome_exponents(mterm, variables)
+                    key = (order, tuple(mexponents))
+                    orders[key] = max(orders.get(key, 0), order * mterm.weight())
+
+    return np.array(list(orders.values()), dtype=np.int64)
+
+def design_matrix(table: OperatorTable, coords: np.ndarray) -> np.ndarray:
+    """
+    Contribution of each group of the table (at unit parameter) to each entry, shape (N, n * m, ngroups),
+    the operator evaluated with parameters p is design @ p
+    """
+    nblocks = table.shape[0] * table.shape[1]
+
+    # no terms : the operator is 0 and has no parameters
+    if table.ngroups() == 0:
+        return np.zeros((len(coords), nblocks, 0))
+
+    evaluator = table.evaluator()
+    values = evaluator.monomials(coords)
+    # index of the monomial of each term in the evaluator
+    index = {tuple(e): u for u, e in enumerate(evaluator.exponents)}
+    rows = np.array([index[tuple(e)] for e in table.exponents], dtype=np.int64)
+    contributions = table.coeffs.real[:, None] * values[rows].real + table.coeffs.imag[:, None] * values[rows].imag
+    design = np.zeros((nblocks * table.ngroups(), coords.shape[0]))
+    np.add.at(design, table.blocks * table.ngroups() + table.groups, contributions)
+
+    return np.ascontiguousarray(design.reshape(nblocks, table.ngroups(), -1).transpose(2, 0, 1))
+
+def fold_indices(npoints: int, folds: int, seed: int = 0) -> list[np.ndarray]:
+    """
+    Shuffled split of the points in folds
+    """
+    assert 2 <= folds <= npoints
+
+    return np.array_split(np.random.default_rng(seed).permutation(npoints), folds)
+
+def fit_parameters(design: np.ndarray, targets: np.ndarray, columns: np.ndarray) -> np.ndarray:
+    """
+    Least squares fit of the parameters of the columns (other parameters are 0)
+    """
+    parameters = np.zeros(design.shape[2])
+
+    if len(columns) > 0:
+        parameters[columns] = np.linalg.lstsq(design[:, :, columns].reshape(-1, len(columns)), targets.reshape(-1), rcond=None)[0]
+
+    return parameters
+
+def cross_validate(design: np.ndarray, targets: np.ndarray, columns: np.ndarray, folds: list[np.ndarray]) -> tuple[float, float]:
+    """
+    Mean and standard deviation over the folds of the rms validation error of the fit restricted to columns
+    """
+    errors = []
+
+    for k, test in enumerate(folds):
+        train = np.concatenate([f for i, f in enumerate(folds) if i != k])
+        parameters = fit_parameters(design[train], targets[train], columns)
+        residuals = design[test] @ parameters - targets[test]
+        errors.append(np.sqrt(np.mean(residuals ** 2)))
+
+    return (float(np.mean(errors)), float(np.std(errors)))
+
+def init_worker(designs: list[tuple[np.ndarray, np.ndarray]], targets: np.ndarray, folds: list[np.ndarray]):
+    global worker_designs, worker_targets, worker_folds
+    worker_designs, worker_targets, worker_folds = designs, targets, folds
+
+def validate_model(layout: int, order: int) -> tuple[float, float, int]:
+    design, korders = worker_designs[layout]
+    columns = np.nonzero(korders <= order)[0]
+
+    return cross_validate(design, worker_targets, columns, worker_folds) + (len(columns),)
+
+def select_model(coords: np.ndarray, targets: np.ndarray, n: int, opsymmetry: Symmetry, s1: Symmetry, s2: Symmetry, nvarsyms: list[list[int]], orders: list[int], names: list[str] = None, block: tuple[int, int] = (0, 0), component: int = 0, folds: int = 5, seed: int = 0, workers: int = None) -> ModelSelection:
+    """
+    Chooses nvarsym and max_order by k-fold cross-validation of the least squares fit of the operator parameters
+    (one per group of the compiled operator, see OperatorTable) to reference matrices
+
+    each layout is built once at the largest order (the operator forms are shared between layouts) and its design
+    matrix is computed once, the models of lower orders use a subset of its columns and the folds a subset of its rows,
+    the (layout, order) models are cross-validated on a process pool
+
+    Args :
+        - coords : (N, ncoordinates) reference geometries
+        - targets : (N, 2, 2) reference matrices
+        - nvarsyms : candidate variables layouts (see generate_variables_list)
+        - orders : candidate max orders
+        - names[=None] : names of the columns of coords (see coordinate_names), each layout uses its own coordinates,
+          if None every layout should have the coordinates of coords
+        - block[=(0, 0)], component[=0] : operator fitted among the ones returned by operator() (0 for X, 1 for Y)
+        - folds[=5] : number of folds
+        - seed[=0] : seed of the split in folds
+        - workers[=None] : number of worker processes (os.cpu_count() by default, 0 to run in this process)
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    targets = np.asarray(targets, dtype=np.float64)
+    assert coords.ndim == 2 and targets.shape[0] == coords.shape[0]
+
+    orders = sorted(orders)
+    max_order = orders[-1]
+    rules = selection_rules([n], max_order)
+    forms = {}
+    designs = []
+    tables = []
+
+    for nvarsym in nvarsyms:
+        variables = generate_variables_list(nvarsym, n)
+        invs, rhos, monoms = generate_invariants_and_monoms(variables, n)
+        op = assemble_operator(n, opsymmetry, s1, s2, monoms, max_order, rules, forms)[block][component]
+        table = compile_operator(op, variables)
+
+        if names is None:
+            lcoords = coords
+        else:
+            columns = [names.index(name) if name in names else None for name in coordinate_names(variables)]
+
+            if None in columns:
+                raise ValueError(f"the coordinates of {nvarsym} aren't all in names")
+
+            lcoords = coords[:, columns]
+
+        if lcoords.shape[1] != table.ncoordinates:
+            raise ValueError(f"expected {table.ncoordinates} coordinates for {nvarsym}, got {lcoords.shape[1]}")
+
+        designs.append((design_matrix(table, lcoords), group_orders(op, variables)))
+        tables.append(table)
+
+    split = fold_indices(coords.shape[0], folds, seed)
+    flat_targets = targets.reshape(targets.shape[0], -1)
+    errors = np.zeros((len(nvarsyms), len(orders)))
+    deviations = np.zeros_like(errors)
+    nparameters = np.zeros(errors.shape, dtype=np.int64)
+    workers = os.cpu_count() if workers is None else workers
+
+    if workers == 0:
+        init_worker(designs, flat_targets, split)
+        results = {(l, o): validate_model(l, order) for l in range(len(nvarsyms)) for o, order in enumerate(orders)}
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(designs, flat_targets, split)) as pool:
+            futures = {(l, o): pool.submit(validate_model, l, order) for l in range(len(nvarsyms)) for o, order in enumerate(orders)}
+            results = {key: future.result() for key, future in futures.items()}
+
+    for (l, o), (error, deviation, nparams) in results.items():
+        errors[l, o], deviations[l, o], nparameters[l, o] = error, deviation, nparams
+
+    best = np.unravel_index(np.argmin(errors), errors.shape)
+    best = (int(best[0]), int(best[1]))
+    design, korders = designs[best[0]]
+    parameters = fit_parameters(design, flat_targets, np.nonzero(korders <= orders[best[1]])[0])
+
+    return ModelSelection([list(v) for v in nvarsyms], orders, errors, deviations, nparameters, best, tables[best[0]], parameters)
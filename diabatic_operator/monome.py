@@ -1,10 +1,10 @@
 from dataclasses import dataclass
 from collections import Counter
 from itertools import combinations_with_replacement
-from variable import Variable
-from symmetry import Symmetry
-from utils import *
-from invariant import InvariantType
+from .variable import Variable
+from .symmetry import Symmetry
+from .utils import *
+from .invariant import InvariantType
 
 @dataclass
 class Monome:
@@ -0,0 +1,322 @@
+import os
+import shutil
+import tempfile
+from itertools import combinations_with_replacement
+import numpy as np
+from .variable import Variable
+from .monome import Monome
+from .monomial_expansion import classify_monome
+from .checkpoint import extended_variables, encode_type, decode_type
+
+# rows tested at once by the divisibility queries on the spilled runs
+QUERY_CHUNK = 1 << 16
+# arrays of a spilled run of a MonomeStore
+FIELDS = ("orders", "exponents", "meta", "seq")
+
+class KeySet:
+    """
+    Set of fixed length keys (ordered variable indices of the monoms of one order), the hot keys are kept
+    in a python set and spilled to sorted memory mapped runs when they exceed max_bytes (runs of similar
+    sizes are merged so there are O(log(size)) runs to search)
+    """
+
+    def __init__(self, directory: str, name: str, width: int, max_bytes: int):
+        self.directory = directory
+        self.name = name
+        self.width = width
+        self.max_bytes = max_bytes
+        self.hot = set()
+        self.runs = []
+        self.files = []
+        self.nfiles = 0
+
+    def key(self, indices: list[int]) -> bytes:
+        return np.array(indices, dtype=">i2").tobytes()
+
+    def hot_bytes(self) -> int:
+        # bytes object and set slot
+        return len(self.hot) * (80 + 2 * self.width)
+
+    def __contains__(self, key: bytes) -> bool:
+        if key in self.hot:
+            return True
+
+        for run in self.runs:
+            i = run.searchsorted(key)
+
+            if i < len(run) and run[i] == key:
+                return True
+
+        return False
+
+    def add(self, key: bytes):
+        # spills before the new key would take the hot set over max_bytes
+        if (len(self.hot) + 1) * (80 + 2 * self.width) > self.max_bytes:
+            self.spill()
+
+        self.hot.add(key)
+
+    def __filename(self) -> str:
+        self.nfiles += 1
+
+        return os.path.join(self.directory, f"{self.name}.{self.nfiles}.npy")
+
+    def spill(self):
+        if len(self.hot) == 0:
+            return
+
+        filename = self.__filename()
+        np.save(filename, np.array(sorted(self.hot), dtype=f"S{2 * self.width}"))
+        self.runs.append(np.load(filename, mmap_mode="r"))
+        self.files.append(filename)
+        self.hot = set()
+
+        while len(self.runs) >= 2 and len(self.runs[-2]) <= len(self.runs[-1]):
+            self.__merge()
+
+    def __merge(self):
+        # the two last runs are copied to a new file and sorted in place
+        (a, b), (fa, fb) = self.runs[-2:], self.files[-2:]
+        filename = self.__filename()
+        merged = np.lib.format.open_memmap(filename, mode="w+", dtype=a.dtype, shape=(len(a) + len(b),))
+        merged[:len(a)] = a
+        merged[len(a):] = b
+        merged.sort()
+        merged.flush()
+        del merged
+        self.runs[-2:] = [np.load(filename, mmap_mode="r")]
+        self.files[-2:] = [filename]
+        os.remove(fa)
+        os.remove(fb)
+
+    def close(self):
+        self.runs = []
+
+        for filename in self.files:
+            os.remove(filename)
+
+        self.files = []
+        self.hot = set()
+
+class MonomeStore:
+    """
+    Append only collection of monomes, the hot rows (ordered variable indices, exponents and type) are kept in
+    numpy buffers and spilled to memory mapped runs sorted by degree when they exceed max_bytes (runs of
+    similar sizes are merged)
+
+    iterating gives back the monomes in insertion order, has_factor tests the divisibility of a monome by any
+    stored monome on the exponent vectors (only the rows of lower degree of each run are read)
+    """
+
+    def __init__(self, table: list[Variable], directory: str, name: str, max_bytes: int, max_degree: int):
+        self.table = table
+        self.index = {v: i for i, v in enumerate(table)}
+        self.directory = directory
+        self.name = name
+        self.max_bytes = max_bytes
+        self.max_degree = max_degree
+        self.size = 0
+        self.runs = []
+        self.nfiles = 0
+        self.__allocate(min(64, self.capacity()))
+
+    def __allocate(self, capacity: int):
+        self.orders = np.full((capacity, self.max_degree), -1, dtype=np.int16)
+        self.exponents = np.zeros((capacity, len(self.table)), dtype=np.uint8)
+        # (degree, invariant type code, complex conjugate)
+        self.meta = np.zeros((capacity, 3), dtype=np.int8)
+        self.nhot = 0
+
+    def __grow(self):
+        orders, exponents, meta = self.orders, self.exponents, self.meta
+        self.__allocate(min(2 * len(orders), self.capacity()))
+        self.orders[:len(orders)] = orders
+        self.exponents[:len(orders)] = exponents
+        self.meta[:len(orders)] = meta
+        self.nhot = len(orders)
+
+    def row_bytes(self) -> int:
+        return 2 * self.max_degree + len(self.table) + 3
+
+    def hot_bytes(self) -> int:
+        return len(self.orders) * self.row_bytes()
+
+    def capacity(self) -> int:
+        # rows of the hot buffers allowed by max_bytes (at least one)
+        return max(1, self.max_bytes // self.row_bytes())
+
+    def exponents_of(self, m: Monome) -> np.ndarray:
+        return np.bincount([self.index[v] for v in m.variables], minlength=len(self.table)).astype(np.uint8)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def append(self, m: Monome):
+        if self.nhot == len(self.orders):
+            self.__grow()
+
+        indices = [self.index[v] for v in m.variables]
+        self.orders[self.nhot, :len(indices)] = indices
+        self.exponents[self.nhot] = np.bincount(indices, minlength=len(self.table))
+        self.meta[self.nhot] = (len(indices), encode_type(m.invariant_type), int(m.complex_conjugate))
+        self.nhot += 1
+        self.size += 1
+
+        # the buffers never grow past max_bytes, they are spilled once full
+        if self.nhot == self.capacity():
+            self.spill()
+
+    def __prefix(self) -> str:
+        self.nfiles += 1
+
+        return os.path.join(self.directory, f"{self.name}.{self.nfiles}")
+
+    def __open(self, prefix: str) -> dict:
+        run = {field: np.load(f"{prefix}.{field}.npy", mmap_mode="r") for field in FIELDS}
+        run["prefix"] = prefix
+        run["degrees"] = np.asarray(run["meta"][:, 0])
+
+        return run
+
+    def spill(self):
+        if self.nhot == 0:
+            return
+
+        # stable sort by degree, the insertion order is kept in seq
+        perm = np.argsort(self.meta[:self.nhot, 0], kind="stable")
+        start = self.size - self.nhot
+        prefix = self.__prefix()
+
+        for field, array in zip(FIELDS, (self.orders[perm], self.exponents[perm], self.meta[perm], start + perm.astype(np.int64))):
+            np.save(f"{prefix}.{field}.npy", array)
+
+        self.runs.append(self.__open(prefix))
+        self.__allocate(min(64, self.capacity()))
+
+        while len(self.runs) >= 2 and len(self.runs[-2]["seq"]) <= len(self.runs[-1]["seq"]):
+            self.__merge()
+
+    def __merge(self):
+        # the rows of the two last runs are copied degree by degree, so the merged run is still sorted by degree
+        runs = self.runs[-2:]
+        prefix = self.__prefix()
+        bounds = [np.searchsorted(run["degrees"], np.arange(self.max_degree + 2)) for run in runs]
+
+        for field in FIELDS:
+            first = runs[0][field]
+            merged = np.lib.format.open_memmap(f"{prefix}.{field}.npy", mode="w+", dtype=first.dtype, shape=(len(first) + len(runs[1][field]),) + first.shape[1:])
+            k = 0
+
+            for d in range(self.max_degree + 1):
+                for run, bound in zip(runs, bounds):
+                    rows = run[field][bound[d]:bound[d + 1]]
+                    merged[k:k + len(rows)] = rows
+                    k += len(rows)
+
+            merged.flush()
+            del merged
+
+        self.runs[-2:] = [self.__open(prefix)]
+
+        for run in runs:
+            self.__remove(run)
+
+    def __remove(self, run: dict):
+        for field in FIELDS:
+            os.remove(f"{run['prefix']}.{field}.npy")
+
+    def has_factor(self, m: Monome) -> bool:
+        """
+        True if a stored monome divides m (as try_to_factorize)
+        """
+        target = self.exponents_of(m)
+
+        if self.nhot > 0 and np.any(np.all(self.exponents[:self.nhot] <= target, axis=1)):
+            return True
+
+        for run in self.runs:
+            stop = np.searchsorted(run["degrees"], len(m.variables), side="right")
+
+            for start in range(0, stop, QUERY_CHUNK):
+                if np.any(np.all(run["exponents"][start:min(stop, start + QUERY_CHUNK)] <= target, axis=1)):
+                    return True
+
+        return False
+
+    def __decode(self, order: np.ndarray, meta: np.ndarray) -> Monome:
+        return Monome([self.table[i] for i in order[:meta[0]]], complex_conjugate=bool(meta[2]), invariant_type=decode_type(int(meta[1])))
+
+    def __iter__(self):
+        for run in self.runs:
+            for r in np.argsort(run["seq"]):
+                yield self.__decode(run["orders"][r], run["meta"][r])
+
+        for r in range(self.nhot):
+            yield self.__decode(self.orders[r], self.meta[r])
+
+    def close(self):
+        for run in self.runs:
+            self.__remove(run)
+
+        self.runs = []
+        self.__allocate(min(64, self.capacity()))
+        self.size = 0
+
+class SpillStorage:
+    """
+    Storage backend of generate_invariants_and_monoms keeping its memory use under memory_cap (in bytes),
+    the monoms of the current order, the invariants, the rhos and the appearing monoms each get a quarter
+    of the cap before spilling to disk
+
+    the candidates are classified as they are generated instead of being collected per order first
+    (the result is the same as the in memory generation), the returned collections are MonomeStore
+    """
+
+    def __init__(self, directory: str = None, memory_cap: int = 1 << 30):
+        self.directory = tempfile.mkdtemp(prefix="monome_store_") if directory is None else directory
+        self.memory_cap = memory_cap
+        os.makedirs(self.directory, exist_ok=True)
+
+    def cleanup(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def generate(self, variables: list[Variable], n: int, min_order: int, max_order: int, remove_cc: bool) -> tuple[MonomeStore, MonomeStore, MonomeStore]:
+        table = extended_variables(variables)
+        index = {v: i for i, v in enumerate(table)}
+        a2 = np.array([v.symmetry.is_A2() for v in table])
+        budget = self.memory_cap // 4
+        invs, rhos, amonoms = (MonomeStore(table, self.directory, name, budget, max(max_order, 1)) for name in ("invs", "rhos", "amonoms"))
+
+        def divisible(m: Monome, factors: MonomeStore) -> bool:
+            # same as try_to_factorize
+            if np.any(factors.exponents_of(m)[a2] >= 2):
+                return True
+
+            return factors.has_factor(m)
+
+        for order in range(min_order, max_order + 1):
+            # same decisions as generate_monoms, its Counter finds the monomes with the same ordered variables
+            seen = KeySet(self.directory, f"seen{order}", order, budget)
+
+            for combo in combinations_with_replacement(variables, order):
+                m = Monome(list(combo))
+                key = seen.key([index[v] for v in m.variables])
+
+                if key in seen:
+                    continue
+
+                cc = m.conjugate()
+                cckey = seen.key([index[v] for v in cc.variables])
+                m.complex_conjugate = cckey in seen or m.weight() < 0
+
+                if remove_cc and m.complex_conjugate:
+                    m = m.conjugate()
+                    key = cckey
+
+                if key not in seen:
+                    seen.add(key)
+                    classify_monome(m, n, invs, rhos, amonoms, divisible=divisible)
+
+            seen.close()
+
+        return (invs, rhos, amonoms)
@@ -0,0 +1,341 @@
+from dataclasses import dataclass
+import numpy as np
+from .variable import Variable
+from .monome import Monome
+from .invariant import InvariantType
+from .checkpoint import extended_variables
+
+# elements of the candidates x factors x variables comparisons done at once by has_factor
+FACTOR_CHUNK = 1 << 22
+
+@dataclass
+class MonomeTable:
+    """
+    Columnar table of monomes of the same degree : the variables of each monome (indices in the extended
+    variables list, in the order of Monome.variables) and its exponents
+    """
+    table: list[Variable]
+    sequences: np.ndarray   # (N, degree) uint8
+    exponents: np.ndarray   # (N, len(table)) uint8
+
+    def __len__(self) -> int:
+        return len(self.sequences)
+
+    def monome(self, r: int, complex_conjugate: bool = False, invariant_type: InvariantType = None) -> Monome:
+        return Monome([self.table[i] for i in self.sequences[r]], complex_conjugate=complex_conjugate, invariant_type=invariant_type)
+
+def row_keys(rows: np.ndarray) -> np.ndarray:
+    """
+    Byte keys of the rows of a uint8 array, in the lexicographic order of the rows (values are shifted by one
+    so that no key ends with a null byte)
+    """
+    if rows.shape[1] == 0:
+        return np.full(len(rows), b"", dtype="S1")
+
+    return np.ascontiguousarray(rows + 1, dtype=np.uint8).view(f"S{rows.shape[1]}").reshape(-1)
+
+@dataclass
+class VariableArrays:
+    """
+    Per variable arrays of an extended variables list
+    """
+    weights: np.ndarray     # weight of each variable
+    conjugates: np.ndarray  # index of the conjugate of each variable
+    a2: np.ndarray          # A2 variables (and their conjugates)
+    ab2: np.ndarray         # A2 and B2 variables (and their conjugates)
+
+def variable_arrays(table: list[Variable]) -> VariableArrays:
+    index = {v: i for i, v in enumerate(table)}
+
+    return VariableArrays(
+        np.array([v.weight() for v in table], dtype=np.int64),
+        np.array([index[v.conjugate()] for v in table], dtype=np.int64),
+        np.array([v.symmetry.is_A2() for v in table], dtype=bool),
+        np.array([v.symmetry.is_A2() or v.symmetry.is_B2() for v in table], dtype=bool)
+    )
+
+def combination_sequences(nvariables: int, order: int) -> np.ndarray:
+    """
+    Rows of combinations_with_replacement(range(nvariables), order), in the same order
+    """
+    sequences = np.zeros((1, 0), dtype=np.uint8)
+
+    # the combinations of order k are the combinations of order k - 1 followed by an index >= their last one
+    for _ in range(order):
+        last = sequences[:, -1].astype(np.int64) if sequences.shape[1] > 0 else np.zeros(len(sequences), dtype=np.int64)
+        counts = nvariables - last
+        rows = np.repeat(np.arange(len(sequences)), counts)
+        starts = np.repeat(np.cumsum(counts) - counts, counts)
+        appended = last[rows] + np.arange(len(rows)) - starts
+        sequences = np.concatenate([sequences[rows], appended[:, None].astype(np.uint8)], axis=1)
+
+    return sequences
+
+def sequence_exponents(sequences: np.ndarray, nvariables: int) -> np.ndarray:
+    exponents = np.zeros((len(sequences), nvariables), dtype=np.uint8)
+
+    for j in range(sequences.shape[1]):
+        exponents[np.arange(len(sequences)), sequences[:, j]] += 1
+
+    return exponents
+
+def combinations_table(table: list[Variable], nvariables: int, order: int) -> MonomeTable:
+    """
+    Monomes of combinations_with_replacement(table[:nvariables], order), in the same order
+    """
+    assert len(table) < 255
+
+    sequences = combination_sequences(nvariables, order)
+
+    return MonomeTable(table, sequences, sequence_exponents(sequences, len(table)))
+
+def touching_table(table: list[Variable], nvariables: int, columns: np.ndarray, order: int) -> MonomeTable:
+    """
+    Monomes of combinations_table(table, nvariables, order) with at least one variable in columns (sorted indices
+    below nvariables), in the same order : k variables of columns and order - k of the others, for k >= 1
+    """
+    assert len(table) < 255
+
+    others = np.setdiff1d(np.arange(nvariables), columns)
+    parts = [np.zeros((0, order), dtype=np.int64)]
+
+    for k in range(1, order + 1):
+        a = columns[combination_sequences(len(columns), k)]
+        b = others[combination_sequences(len(others), order - k)]
+        parts.append(np.concatenate([np.repeat(a, len(b), axis=0), np.tile(b, (len(a), 1))], axis=1))
+
+    sequences = np.sort(np.concatenate(parts), axis=1).astype(np.uint8)
+    # combinations_with_replacement order is the lexicographic order of the sorted rows
+    sequences = sequences[np.argsort(row_keys(sequences), kind="stable")]
+
+    return MonomeTable(table, sequences, sequence_exponents(sequences, len(table)))
+
+def has_factor(exponents: np.ndarray, factors: np.ndarray) -> np.ndarray:
+    """
+    For each row of exponents, whether one of the factors (rows of exponents) divides it
+    """
+    res = np.zeros(len(exponents), dtype=bool)
+
+    if len(factors) == 0:
+        return res
+
+    chunk = max(1, FACTOR_CHUNK // (len(factors) * max(exponents.shape[1], 1)))
+
+    for start in range(0, len(exponents), chunk):
+        block = exponents[start:start + chunk]
+        res[start:start + chunk] = np.any(np.all(block[:, None, :] >= factors[None, :, :], axis=2), axis=1)
+
+    return res
+
+def collect_candidates(mt: MonomeTable, arrays: VariableArrays, nvariables: int, remove_cc: bool) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Same decisions as collect_monoms on the combinations of a MonomeTable
+
+    collect_monoms finds the monomes with the same ordered variables : a combination is skipped if its (position wise)
+    conjugate is an earlier combination, otherwise it is kept and conjugated if its weight is negative (remove_cc)
+
+    Returns (rows, conjugated, complex_conjugate) of the kept monomes, in their order of collection
+    """
+    weights = mt.exponents @ arrays.weights
+    conjugate = arrays.conjugates[mt.sequences]
+    # the conjugate is a combination if its variables are in the list and sorted
+    combination = np.all(conjugate < nvariables, axis=1) & np.all(np.diff(conjugate, axis=1) >= 0, axis=1)
+    partner = np.searchsorted(row_keys(mt.sequences), row_keys(conjugate.astype(np.uint8)))
+    earlier = combination & (partner < np.arange(len(mt)))
+
+    if remove_cc:
+        rows = np.nonzero(~earlier)[0]
+
+        return (rows, weights[rows] < 0, np.zeros(len(rows), dtype=bool))
+
+    rows = np.arange(len(mt))
+
+    return (rows, np.zeros(len(rows), dtype=bool), earlier | (weights < 0))
+
+def classify_order(mt: MonomeTable, arrays: VariableArrays, nvariables: int, n: int, remove_cc: bool, factors: np.ndarray, divided: np.ndarray = None) -> tuple[list[tuple[int, int, Monome]], np.ndarray]:
+    """
+    Classifies the combinations of one order (same decisions as collect_monoms followed by classify_monome),
+    factors are the exponents of the invariants of the lower orders, divided (if given) the combinations already
+    known to be divisible by other invariants of the lower orders
+
+    Returns the (collection, row, monome) of the kept monomes in generation order (collection 0 for the invariants,
+    1 for the rhos and 2 for the appearing monoms, row the combination of mt the monome comes from) and the exponents
+    of the new invariants
+    """
+    rows, conjugated, cc = collect_candidates(mt, arrays, nvariables, remove_cc)
+    sequences = mt.sequences[rows]
+    sequences[conjugated] = arrays.conjugates[sequences[conjugated]]
+    exponents = mt.exponents[rows]
+    exponents[conjugated] = exponents[conjugated][:, arrays.conjugates]
+    candidates = MonomeTable(mt.table, sequences, exponents)
+    conjugates = exponents[:, arrays.conjugates]
+    weights = exponents @ arrays.weights
+
+    # same tests as classify_monome
+    keep = ~np.any(exponents[:, arrays.a2] >= 2, axis=1) & (weights <= n)
+
+    if divided is not None:
+        keep &= ~divided[rows]
+
+    keep[keep] &= ~has_factor(exponents[keep], factors) & ~has_factor(conjugates[keep], factors)
+    invariant = weights % n == 0
+    # an invariant is a factor of the later candidates of its order with the same (or conjugated) exponents
+    first = np.nonzero(keep & invariant)[0]
+    keys, ckeys = row_keys(exponents[first]), row_keys(conjugates[first])
+    canonical = np.where(keys <= ckeys, keys, ckeys)
+    _, unique = np.unique(canonical, return_index=True)
+    keep[first] = False
+    keep[first[unique]] = True
+
+    sigma = np.all(exponents == conjugates, axis=1)
+    pure_imag = np.count_nonzero(exponents[:, arrays.ab2] > 0, axis=1) % 2 == 1
+    entries = []
+
+    for r in np.nonzero(keep)[0]:
+        row = int(rows[r])
+
+        if not invariant[r]:
+            entries.append((2, row, candidates.monome(r, bool(cc[r]))))
+        elif sigma[r]:
+            entries.append((0, row, candidates.monome(r, bool(cc[r]), InvariantType.full_invariant())))
+        else:
+            if not pure_imag[r]:
+                entries.append((0, row, candidates.monome(r, bool(cc[r]), InvariantType.real_invariant())))
+
+            entries.append((0, row, candidates.monome(r, bool(cc[r]), InvariantType.pseudo_invariant())))
+            entries.append((1, row, candidates.monome(r, bool(cc[r]), InvariantType(invariant=False, real=False, imag=True))))
+
+    return (entries, exponents[keep & invariant])
+
+def generate_columnar(variables: list[Variable], n: int, min_order: int, max_order: int, remove_cc: bool = True) -> tuple[list[Monome], list[Monome], list[Monome]]:
+    """
+    Columnar generate_invariants_and_monoms (same result) : all the candidates of an order are classified
+    at once with array operations on their exponents, only the kept monomes are built as Monome
+
+    weights are dot products with the variable weights, the conjugates are permuted exponent columns
+    (sigma invariance compares them), the divisibility by the invariants of the previous orders is a broadcast
+    comparison, and an invariant of the current order removes the later candidates with the same exponents
+    (or conjugated exponents)
+    """
+    table = extended_variables(variables)
+    arrays = variable_arrays(table)
+    res = ([], [], [])
+    factors = np.zeros((0, len(table)), dtype=np.uint8)
+
+    for order in range(min_order, max_order + 1):
+        entries, invariants = classify_order(combinations_table(table, len(variables), order), arrays, len(variables), n, remove_cc, factors)
+
+        for collection, _, m in entries:
+            res[collection].append(m)
+
+        factors = np.concatenate([factors, invariants])
+
+    return res
+
+def monome_exponents(table: list[Variable], monoms: list[Monome]) -> np.ndarray:
+    """
+    Exponents of monomes (of any degrees) over a variables table
+    """
+    index = {v: i for i, v in enumerate(table)}
+    exponents = np.zeros((len(monoms), len(table)), dtype=np.uint8)
+
+    for r, m in enumerate(monoms):
+        for v in m.variables:
+            exponents[r, index[v]] += 1
+
+    return exponents
+
+def generate_columnar_order(variables: list[Variable], n: int, order: int, remove_cc: bool, invs: list[Monome]) -> tuple[list[Monome], list[Monome], list[Monome]]:
+    """
+    Invariants, rhos and appearing monoms of one order of generate_columnar, invs are the invariants of the lower
+    orders (their exponents are the factors), so that a generation can be checkpointed between orders
+    """
+    table = extended_variables(variables)
+    res = ([], [], [])
+    entries, _ = classify_order(combinations_table(table, len(variables), order), variable_arrays(table), len(variables), n, remove_cc, monome_exponents(table, invs))
+
+    for collection, _, m in entries:
+        res[collection].append(m)
+
+    return res
+
+def origin_keys(sequences: np.ndarray, arrays: VariableArrays, nvariables: int, remove_cc: bool) -> np.ndarray:
+    """
+    Keys (see row_keys) of the combinations the kept monomes with these stored sequences come from (see collect_candidates)
+    """
+    keys = row_keys(sequences)
+
+    if not remove_cc:
+        return keys
+
+    conjugate = arrays.conjugates[sequences].astype(np.uint8)
+    ckeys = row_keys(conjugate)
+    valid = [np.all(s < nvariables, axis=1) & np.all(np.diff(s.astype(np.int64), axis=1) >= 0, axis=1) for s in (sequences, conjugate)]
+    # a stored sequence is its combination, or the conjugate of it if the combination had a negative weight,
+    # when both are combinations the later one was skipped
+    conjugated = valid[1] & (~valid[0] | (ckeys < keys))
+
+    return np.where(conjugated, ckeys, keys)
+
+def extend_columnar(previous: tuple[list[Monome], list[Monome], list[Monome]], old_variables: list[Variable], variables: list[Variable], n: int, min_order: int, max_order: int, remove_cc: bool = True) -> tuple[list[Monome], list[Monome], list[Monome]]:
+    """
+    Columnar extend_invariants_and_monoms : only the combinations with at least one new variable are built
+    (touching_table) and classified against the invariants of the lower orders, then merged with the previous
+    monomes by the combination they come from
+
+    a previous invariant only has exponents on the old columns, it divides a combination (or its conjugate) if it
+    divides its old part (or the conjugate of it), so it is only tested once per distinct old part
+    """
+    table = extended_variables(variables)
+    arrays = variable_arrays(table)
+    index = {v: i for i, v in enumerate(table)}
+    nvariables = len(variables)
+    old = set(old_variables)
+    columns = np.array([i for i, v in enumerate(variables) if v not in old], dtype=np.int64)
+    conjugates = arrays.conjugates[columns]
+
+    # the combinations touching the new variables are then closed under conjugation
+    if np.any((conjugates < nvariables) & ~np.isin(conjugates, columns)):
+        raise ValueError("the conjugates of the new variables should be new variables")
+
+    # previous monomes of each order, as (collection, monome)
+    previous_orders = {}
+
+    for collection, ms in enumerate(previous):
+        for m in ms:
+            if not all(v in old or v.conjugate() in old for v in m.variables):
+                raise ValueError(f"{m} isn't a monome of the old variables")
+
+            previous_orders.setdefault(len(m.variables), []).append((collection, m))
+
+    # columns of the new variables and of their conjugates
+    new_columns = np.zeros(len(table), dtype=bool)
+    new_columns[columns] = True
+    new_columns[arrays.conjugates[columns]] = True
+    res = ([], [], [])
+    old_factors = np.zeros((0, len(table)), dtype=np.uint8)
+    new_factors = np.zeros((0, len(table)), dtype=np.uint8)
+
+    for order in range(min_order, max_order + 1):
+        olds = previous_orders.get(order, [])
+        sequences = np.array([[index[v] for v in m.variables] for _, m in olds], dtype=np.uint8).reshape(len(olds), order)
+        keyed = [(key, collection, m) for key, (collection, m) in zip(origin_keys(sequences, arrays, nvariables, remove_cc).tolist(), olds)]
+
+        mt = touching_table(table, nvariables, columns, order)
+        parts = np.where(new_columns, 0, mt.exponents).astype(np.uint8)
+        _, first, inverse = np.unique(row_keys(parts), return_index=True, return_inverse=True)
+        parts = parts[first]
+        divided = (has_factor(parts, old_factors) | has_factor(parts[:, arrays.conjugates], old_factors))[inverse.reshape(-1)]
+        entries, invariants = classify_order(mt, arrays, nvariables, n, remove_cc, new_factors, divided)
+        keys = row_keys(mt.sequences).tolist()
+        keyed.extend((keys[row], collection, m) for collection, row, m in entries)
+
+        # an old and a new monome never come from the same combination, the monomes of a combination keep their order
+        for _, collection, m in sorted(keyed, key=lambda x: x[0]):
+            res[collection].append(m)
+
+        is_invariant = np.array([collection == 0 for collection, _ in olds], dtype=bool)
+        old_factors = np.concatenate([old_factors, sequence_exponents(sequences[is_invariant], len(table))])
+        new_factors = np.concatenate([new_factors, invariants])
+
+    return res
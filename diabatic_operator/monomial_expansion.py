@@ -0,0 +1,466 @@
+import time
+from dataclasses import dataclass
+from collections import Counter
+from itertools import combinations_with_replacement
+from typing import Optional
+from .monome import Monome
+from .variable import Variable
+from .invariant import InvariantType
+from .checkpoint import GenerationState, save_checkpoint, load_checkpoint
+from .utils import sign, num2sup
+
+# MonomialTerm implements the conjunction of a monome
+# with a rho, which is fundamental for a
+# MonomialExpansion
+@dataclass
+class MonomialTerm:
+    monome: Monome
+    rho: Optional[Monome] = None
+
+    def __str__(self) -> str:
+        return f"{self.rho}*{self.monome}" if self.rho is not None else f"{self.monome}"
+
+    def __hash__(self) -> int:
+        return hash(str(self.monome) + str(self.rho))
+
+    def weight(self):
+        return self.monome.weight()
+
+type ExpansionTerm = dict[MonomialTerm, complex]
+
+@dataclass
+class MonomialExpansion:
+    # [order -> [MonomialTerm -> count]]
+    # ex : [1 -> [Q+ -> +i, Q+2 -> -1]]
+    expansion: dict[int, ExpansionTerm]
+
+    def __str__(self) -> str:
+        if len(self.expansion) == 0:
+            return "0"
+
+        return "".join(self.text_pieces())
+
+    def text_pieces(self):
+        """
+        Pieces of the text form in order (str is their concatenation), see rendering for large expansions
+        """
+        for order, exp in self.expansion.items():
+            if order == 0 and len(exp) != 0:
+                yield "+1"
+
+                continue
+
+            for mterm, coeff in exp.items():
+                if coeff != 0:
+                    if coeff.real != 0:
+                        yield sign(coeff.real)
+                        yield f"Re(({mterm}){num2sup(order)})" if order > 1 else f"Re({mterm})"
+
+                    if coeff.imag != 0:
+                        yield sign(coeff.imag)
+                        yield f"Im(({mterm}){num2sup(order)})" if order > 1 else f"Im({mterm})"
+
+    def __add__(self, other):
+        assert isinstance(other, MonomialExpansion)
+
+        res = MonomialExpansion({})
+
+        for order, exp in self.expansion.items():
+            if order == 0:
+                res.expansion[order] = self.__constant(exp)
+
+                continue
+
+            res.expansion[order] = exp.copy()
+
+            if other.expansion.get(order) is not None:
+                for mterm, coeff in other.expansion[order].items():
+                    if res.expansion[order].get(mterm) is None:
+                        res.expansion[order][mterm] = coeff
+                    else:
+                        res.expansion[order][mterm] += coeff
+
+        for order in other.expansion:
+            if res.expansion.get(order) is None:
+                res.expansion[order] = self.__constant(other.expansion[order]) if order == 0 else other.expansion[order].copy()
+
+        res.__update()
+
+        return res
+
+    @staticmethod
+    def __constant(exp: dict) -> dict:
+        """
+        Term of order 0 kept by an addition : the first one with a non null real part, whichever operand it comes from
+        (the imaginary part of a constant doesn't contribute, Im(1) = 0)
+        """
+        for mterm, coeff in exp.items():
+            if coeff.real != 0:
+                return {mterm: coeff}
+
+        return {}
+
+    def __update(self):
+        for order in list(self.expansion.keys()):
+            for mterm in list(self.expansion[order].keys()):
+                if self.expansion[order][mterm] == 0:
+                    self.expansion[order].pop(mterm)
+
+            if len(self.expansion[order]) == 0:
+                self.expansion.pop(order)
+
+    def add_terms(self, monome: Monome, orders: list[int], coeffs: list[complex]):
+        """
+        Same as adding MonomialExpansion({order: {monome: coeff}}) for each (order, coeff) in turn,
+        without building the intermediate expansions
+        """
+        res = MonomialExpansion({order: exp.copy() for order, exp in self.expansion.items()})
+        res.__update()
+        expansion = res.expansion
+
+        for order, coeff in zip(orders, coeffs):
+            # each addition only keeps the first term of order 0 with a non null real part (and ignores the added one),
+            # an added term of order 0 is only kept if its real part isn't null
+            if expansion.get(0) is not None:
+                first = next(((mterm, c) for mterm, c in expansion[0].items() if c.real != 0), None)
+
+                if first is None:
+                    expansion.pop(0)
+                else:
+                    expansion[0] = {first[0]: first[1]}
+
+                if order == 0:
+                    continue
+
+            if expansion.get(order) is None:
+                if coeff != 0 and (order != 0 or coeff.real != 0):
+                    expansion[order] = {monome: coeff}
+            else:
+                exp = expansion[order]
+                exp[monome] = exp[monome] + coeff if exp.get(monome) is not None else coeff
+
+                if exp[monome] == 0:
+                    exp.pop(monome)
+
+                    if len(exp) == 0:
+                        expansion.pop(order)
+
+        return res
+
+    def extract_order(self, order: int):
+        assert order >= 0
+
+        if self.expansion.get(order) is None:
+            return MonomialExpansion({})
+
+        return MonomialExpansion({order: self.expansion[order].copy()})
+
+    def reduce(self, monome: Monome):
+        newexp = MonomialExpansion({})
+
+        for order, exp in self.expansion.items():
+            for mterm, coeff in exp.items():
+                totalorder = order * mterm.weight()
+
+                if order != 0 and (totalorder % monome.weight() != 0 or totalorder < monome.weight()):
+                    continue
+
+                neworder = totalorder // monome.weight()
+
+                if newexp.expansion.get(neworder) is None:
+                    newexp.expansion[neworder] = {}
+
+                newexp.expansion[neworder][monome] = coeff
+
+        return newexp
+
+    def up_to_order(self, max_order: int):
+        return MonomialExpansion({order: exp for order, exp in self.expansion.items() if order <= max_order})
+
+def filter_appearing_variables(variables: list[Variable]) -> list[Variable]:
+    """
+    Filter variables to keep only appearing ones (excludes A1 variables)
+    """
+    avariables = []
+
+    for v in variables:
+        if not v.symmetry.is_A1():
+            avariables.append(v)
+
+    return avariables
+
+def try_to_factorize(monome: Monome, factors: list[Monome]) -> bool:
+    target = Counter(monome.variables)
+    degree = target.total()
+
+    for v in target:
+        if v.symmetry.is_A2() and target[v] >= 2:
+            return True
+
+    for factor in factors:
+        combo = Counter(factor.variables)
+        combo_degree = combo.total()
+
+        if degree < combo_degree:
+            continue
+
+        if combo <= target:
+            return True
+
+    return False
+
+def generate_monoms(variables: list[Variable], order: int, n: int, remove_factorizable: bool = True, remove_cc: bool = True) -> list[Monome]:
+    """
+    Generates monoms of given order and filters factorizable monoms if needed
+    """
+    return collect_monoms(combinations_with_replacement(variables, order), n, remove_factorizable, remove_cc)
+
+def collect_monoms(combos, n: int, remove_factorizable: bool = True, remove_cc: bool = True) -> list[Monome]:
+    """
+    Builds the monoms of the given combinations of variables (keeping one of each monome and its conjugate)
+    """
+    monoms = Counter()
+
+    for combo in combos:
+        m = Monome(list(combo))
+
+        if remove_factorizable and m.is_factorisable(n):
+            # add treatement for invariant factors ?
+            continue
+
+        if monoms[m] != 0:
+            m.complex_conjugate = False
+        else:
+            if monoms[m.conjugate()] != 0:
+                m.complex_conjugate = True
+            else:
+                if m.weight() < 0:
+                    m.complex_conjugate = True
+                else:
+                    m.complex_conjugate = False
+
+
+        if remove_cc and m.complex_conjugate == True:
+            m = m.conjugate()
+
+        if monoms[m] == 0:
+            monoms[m] = 1
+
+    return list(monoms.elements())
+
+# def find_fundamental_invariants(variables: list[Variable], n: int, min_order: int = 1, max_order: int = None, remove_cc: bool = True) -> tuple[list[ComplexInvariant], list[Monome]]:
+#     if max_order is None:
+#         max_order = n
+
+#     fundamentals = []
+
+#     for order in range(min_order, max_order + 1):
+#         monoms = generate_monoms(variables, order, n, remove_factorizable=False, remove_cc=remove_cc)
+
+#         for m in monoms:
+#             if not m.is_factorisable(n):
+#                 continue
+
+#             if not try_to_factorize(m, fundamentals):
+#                 fundamentals.append(m)
+
+#     return ([ComplexInvariant(finv, finv.is_real()) for finv in fundamentals], [Monome(finv.variables, complex_conjugate=False, real=False, imag=True) for finv in fundamentals if not finv.is_real()])
+
+
+def generate_invariants_and_monoms(variables: list[Variable], n: int, min_order: int = 1, max_order: int = None, remove_cc: bool = True, checkpoint: str = None, interval: float = 300.0, storage = None, columnar: bool = True) -> tuple[list[Monome], list[Monome], list[Monome]]:
+    """
+    Generate all invariants, and returns the additional monoms that can appear alongside the appearing monomials
+
+    Args :
+        - checkpoint[=None] : file where the progress is saved (at the end of each order, and every interval seconds
+          within an order with columnar=False), see resume_invariants_and_monoms
+        - interval[=300.0] : seconds between two checkpoints (columnar=False)
+        - storage[=None] : storage backend of the collections (in memory lists by default), see monome_store.SpillStorage
+        - columnar[=True] : classifies all the candidates of an order at once with array operations (same result),
+          see monome_table.generate_columnar, False classifies them one Monome at a time
+    """
+    if max_order is None:
+        max_order = n
+
+    if storage is not None:
+        assert checkpoint is None
+
+        return storage.generate(variables, n, min_order, max_order, remove_cc)
+
+    if checkpoint is not None:
+        return run_generation(GenerationState(variables, n, min_order, max_order, remove_cc, min_order), checkpoint, interval, columnar)
+
+    if columnar:
+        # numpy is only imported by the columnar generation
+        from .monome_table import generate_columnar
+
+        return generate_columnar(variables, n, min_order, max_order, remove_cc)
+
+    invs = []
+    rhos = []
+    amonoms = []
+
+    for order in range(min_order, max_order + 1):
+        monoms = generate_monoms(variables, order, n, remove_factorizable=False, remove_cc=remove_cc)
+
+        for m in monoms:
+            classify_monome(m, n, invs, rhos, amonoms)
+
+    return (invs, rhos, amonoms)
+
+def resume_invariants_and_monoms(checkpoint: str, interval: float = 300.0, columnar: bool = True) -> tuple[list[Monome], list[Monome], list[Monome]]:
+    """
+    Continues a generate_invariants_and_monoms run from its checkpoint (the result is the same as an uninterrupted run)
+    """
+    return run_generation(load_checkpoint(checkpoint), checkpoint, interval, columnar)
+
+def run_generation(state: GenerationState, checkpoint: str, interval: float, columnar: bool = True) -> tuple[list[Monome], list[Monome], list[Monome]]:
+    """
+    Runs the generation from a state, saving it to checkpoint regularly
+
+    with columnar, each order is classified at once (see monome_table.generate_columnar_order) and saved when it
+    is complete, an order started by the per monome path (position > 0) is finished by it
+    """
+    last = time.monotonic()
+
+    while not state.is_complete():
+        if columnar and state.position == 0:
+            from .monome_table import generate_columnar_order
+
+            # the invariants found so far (lower orders) are the factors of the candidates of this order
+            for collection, monoms in zip((state.invs, state.rhos, state.amonoms), generate_columnar_order(state.variables, state.n, state.order, state.remove_cc, state.invs)):
+                collection.extend(monoms)
+
+            state.order += 1
+            save_checkpoint(state, checkpoint)
+            last = time.monotonic()
+
+            continue
+
+        # the monoms of an order are generated again in the same order, the classified ones are skipped
+        monoms = generate_monoms(state.variables, state.order, state.n, remove_factorizable=False, remove_cc=state.remove_cc)
+
+        for m in monoms[state.position:]:
+            classify_monome(m, state.n, state.invs, state.rhos, state.amonoms)
+            state.position += 1
+
+            if time.monotonic() - last >= interval:
+                save_checkpoint(state, checkpoint)
+                last = time.monotonic()
+
+        state.order += 1
+        state.position = 0
+        save_checkpoint(state, checkpoint)
+        last = time.monotonic()
+
+    return (state.invs, state.rhos, state.amonoms)
+
+def classify_monome(m: Monome, n: int, invs: list[Monome], rhos: list[Monome], amonoms: list[Monome], factors: list[Monome] = None, divisible = try_to_factorize):
+    """
+    Adds a monome to the invariants (and rhos) or to the appearing monoms, unless it is divisible by one of
+    the factors (invs by default) or its weight is too large
+
+    the collections only need an append method, divisible(monome, factors) replaces try_to_factorize for
+    collections that aren't lists (see monome_store)
+    """
+    factors = invs if factors is None else factors
+
+    if divisible(m, factors) or divisible(m.conjugate(), factors) or m.weight() > n:
+        return
+
+    if m.is_Cn_invariant(n):
+        if m.is_sigman_invariant(n):
+            invs.append(Monome(m.variables, complex_conjugate=m.complex_conjugate, invariant_type=InvariantType.full_invariant())) # add monome as invariant
+        else:
+            if not m.is_pure_imag():
+                invs.append(Monome(m.variables, complex_conjugate=m.complex_conjugate, invariant_type=InvariantType.real_invariant())) # real part is always invariant
+
+            invs.append(Monome(m.variables, complex_conjugate=m.complex_conjugate, invariant_type=InvariantType.pseudo_invariant())) # square of imaginary part is invariant
+            rhos.append(Monome(m.variables, complex_conjugate=m.complex_conjugate, invariant_type=InvariantType(invariant=False, real=False, imag=True))) # imaginary part can now appear in monomial expansion
+    else:
+        amonoms.append(m)
+
+def extend_invariants_and_monoms(previous: tuple[list[Monome], list[Monome], list[Monome]], old_variables: list[Variable], variables: list[Variable], n: int, min_order: int = 1, max_order: int = None, remove_cc: bool = True) -> tuple[list[Monome], list[Monome], list[Monome]]:
+    """
+    Extends the result of generate_invariants_and_monoms(old_variables, n, ...) to a larger variables list,
+    only the monoms involving at least one new variable are generated, the result (contents and order) is the
+    same as generate_invariants_and_monoms(variables, n, ...)
+
+    the monoms of the old variables only keep their classification (their factors only involve old variables),
+    the new ones are classified at once against all the invariants of the lower orders, then both are merged
+    in generation order, see monome_table.extend_columnar
+
+    Args :
+        - previous : (invs, rhos, amonoms) generated with old_variables (and the same n, min_order, max_order and remove_cc)
+        - old_variables : previous variables list
+        - variables : new variables list (containing the old variables in the same relative order, see generate_variables_list)
+    """
+    from .monome_table import extend_columnar
+
+    if max_order is None:
+        max_order = n
+
+    index = {}
+
+    for i, v in enumerate(variables):
+        index[v] = i
+
+    positions = [index.get(v) for v in old_variables]
+
+    if None in positions or positions != sorted(positions):
+        raise ValueError("the old variables should appear in the new variables list in the same order")
+
+    return extend_columnar(previous, old_variables, variables, n, min_order, max_order, remove_cc)
+
+
+# def compute_invariants_and_monoms(variables: list[Variable], n: int, min_order: int = 1, max_order: int = None, remove_cc: bool = True) -> tuple[list[Monome], list[Monome]]:
+#     if max_order is None:
+#         max_order = n
+
+#     monoms = []
+#     invariants = []
+
+#     for order in range(1, max_order + 1):
+#         raw_monoms = generate_monoms(variables, order, n, remove_factorizable=False, remove_cc=remove_cc)
+
+#         for m in raw_monoms:
+#             if m.is_Cn_invariant(n): # weight sum is 0
+#                 #if not m.is_pure_imag():
+#                 invariants.append(Monome(m.variables, m.complex_conjugate, InvariantType.real_invariant()))
+
+#                 if not m.is_sigman_invariant(n): # anti symmetric under sigma_n
+#                     invariants.append(Monome(m.variables + m.variables, m.complex_conjugate, InvariantType.real_invariant()))
+#                     monoms.append(Monome(m.variables, m.complex_conjugate, InvariantType.pseudo_invariant()))
+#             else:
+#                 monoms.append(m)
+
+#     return (
+#         #[m for m in monoms if not try_to_factorize(m, invariants) and not try_to_factorize(m.conjugate(), invariants) and abs(m.weight()) <= max_order and (not remove_cc or m.weight() >= 0)],
+#         monoms,
+#         #[inv for inv in invariants if not try_to_factorize(inv, invariants) and not try_to_factorize(inv.conjugate(), invariants) and abs(m.weight()) <= max_order and (not remove_cc or m.weight() >= 0)]
+#         invariants
+#     )
+
+
+
+# def generate_appearing_monoms(variables: list[Variable], n: int, min_order: int = 0, max_order: int = None, remove_cc: bool = True) -> list[Monome]:
+#     if max_order is None:
+#         max_order = n
+
+#     #avariables = filter_appearing_variables(variables)
+#     finvs, finvs_monoms = find_fundamental_invariants(variables, n, min_order=min_order, max_order=max_order, remove_cc=remove_cc)
+#     finvs = list(map(lambda x:x.monome, finvs))
+#     monoms = []
+#     amonoms = []
+
+#     for order in range(min_order, max_order + 1):
+#         monoms.extend(generate_monoms(variables, order, n, remove_factorizable=True, remove_cc=remove_cc))
+
+#     for m in monoms:
+#         # need to check for max order since a variable doesn't necessarily have a weight of +/- 1
+#         if not try_to_factorize(m, finvs) and not try_to_factorize(m.conjugate(), finvs) and abs(m.weight()) <= max_order:
+#             if not remove_cc or m.weight() >= 0:
+#                 amonoms.append(m)
+
+#     return amonoms
+
@@ -0,0 +1,243 @@
+from dataclasses import dataclass
+import numpy as np
+from .variable import Variable
+from .monome import Monome
+from .monomial_expansion import MonomialExpansion, MonomialTerm
+from .operator_representation import Operator
+from .evaluation import monome_exponents
+
+@dataclass
+class SparseExpansion:
+    """
+    Expansion as Re(sum_t coeffs[t] * prod(slot^exponents[t])) over the slots of a variables list
+    (A2 / B2 slots are i * x, see evaluation), a term of a MonomialExpansion c * (Re / Im)(m^order) is Re(conj(c) m^order)
+
+    each term is stored once, as the one of its two forms Re(a M) = Re(conj(a) conj(M)) with the larger exponents
+    """
+    exponents: np.ndarray   # (nterms, nvariables)
+    coeffs: np.ndarray      # (nterms,) complex
+
+    def __len__(self) -> int:
+        return len(self.coeffs)
+
+    def degrees(self) -> np.ndarray:
+        return self.exponents.sum(axis=1)
+
+@dataclass
+class Conjugation:
+    """
+    Complex conjugation of the monomials of a variables list : conj(prod z^e) = (-1)^(A2 / B2 exponents) prod z^e[permutation]
+    """
+    permutation: np.ndarray # slot of the conjugate of each slot (Q+ <-> Q-)
+    imaginary: np.ndarray   # A2 / B2 slots
+
+    def conjugate(self, exponents: np.ndarray, coeffs: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        signs = 1 - 2 * (exponents[:, self.imaginary].sum(axis=1) % 2)
+
+        return (exponents[:, self.permutation], np.conj(coeffs) * signs)
+
+def conjugation(variables: list[Variable]) -> Conjugation:
+    permutation = []
+
+    for v in variables:
+        # A2 / B2 conjugates are -1 times the same slot
+        c = v.conjugate()
+        permutation.append(variables.index(c) if v.symmetry.is_E() else variables.index(v))
+
+    return Conjugation(np.array(permutation, dtype=np.int64), np.array([v.is_imag() for v in variables], dtype=bool))
+
+def canonical(exponents: np.ndarray, coeffs: np.ndarray, conj: Conjugation) -> SparseExpansion:
+    """
+    Canonical forms of the terms, with the terms of same exponents merged and the null terms removed
+    """
+    cexponents, ccoeffs = conj.conjugate(exponents, coeffs)
+    diff = cexponents - exponents
+    nonzero = diff != 0
+    first = np.argmax(nonzero, axis=1)
+    swap = nonzero.any(axis=1) & (diff[np.arange(len(diff)), first] > 0)
+    exponents = np.where(swap[:, None], cexponents, exponents)
+    coeffs = np.where(swap, ccoeffs, coeffs)
+
+    # self conjugated monomials are real (or pure imaginary), only the matching part of their coefficient counts
+    selfconj = ~nonzero.any(axis=1)
+    imaginary = exponents[:, conj.imaginary].sum(axis=1) % 2 == 1
+    coeffs = np.where(selfconj & ~imaginary, coeffs.real + 0j, coeffs)
+    coeffs = np.where(selfconj & imaginary, 1j * coeffs.imag, coeffs)
+
+    if len(coeffs) == 0:
+        return SparseExpansion(exponents, coeffs)
+
+    unique, inverse = np.unique(exponents, axis=0, return_inverse=True)
+    summed = np.zeros(len(unique), dtype=np.complex128)
+    np.add.at(summed, inverse.reshape(-1), coeffs)
+    kept = summed != 0
+
+    return SparseExpansion(unique[kept], summed[kept])
+
+def sparse_expansion(expansion: MonomialExpansion, variables: list[Variable], conj: Conjugation) -> SparseExpansion:
+    """
+    Terms of a MonomialExpansion over the slots of variables (same conventions as compile_operator)
+    """
+    exponents = []
+    coeffs = []
+
+    for order, exp in expansion.expansion.items():
+        for mterm, coeff in exp.items():
+            if isinstance(mterm, MonomialTerm):
+                if mterm.rho is not None:
+                    raise ValueError(f"term {mterm} is not a monomial")
+
+                mterm = mterm.monome
+
+            if mterm.invariant_type is not None:
+                raise ValueError(f"term {mterm} is not a monomial")
+
+            if coeff == 0:
+                continue
+
+            mexponents, msign = monome_exponents(mterm, variables)
+            exponents.append(order * mexponents)
+            coeffs.append(np.conj(complex(coeff) * msign ** order))
+
+    return canonical(np.array(exponents, dtype=np.int64).reshape(len(coeffs), len(variables)), np.array(coeffs, dtype=np.complex128), conj)
+
+def monomial_expansion(sparse: SparseExpansion, variables: list[Variable]) -> MonomialExpansion:
+    """
+    MonomialExpansion of the terms : prod z^e is written m^order with order the gcd of the exponents
+    """
+    expansion = {}
+
+    for exponents, coeff in zip(sparse.exponents, sparse.coeffs):
+        order = int(np.gcd.reduce(exponents))
+
+        if order == 0:
+            expansion.setdefault(0, {})[Monome([])] = complex(coeff.real)
+
+            continue
+
+        monome = Monome([v for v, e in zip(variables, exponents // order) for _ in range(e)])
+        expansion.setdefault(order, {})[monome] = complex(np.conj(coeff))
+
+    return MonomialExpansion(dict(sorted(expansion.items())))
+
+def multiply_sparse(x: SparseExpansion, y: SparseExpansion, conj: Conjugation, max_degree: int = None) -> SparseExpansion:
+    """
+    Product of two expansions : Re(a M) Re(b N) = (Re(a b M N) + Re(a conj(b) M conj(N))) / 2,
+    only the pairs of terms whose total degree is <= max_degree are formed
+    """
+    nvariables = x.exponents.shape[1]
+
+    if len(x) == 0 or len(y) == 0:
+        return SparseExpansion(np.zeros((0, nvariables), dtype=np.int64), np.zeros(0, dtype=np.complex128))
+
+    # pairs (i, j) with degree(i) + degree(j) <= max_degree, from the terms of y sorted by degree
+    order = np.argsort(y.degrees(), kind="stable")
+    ydegrees = y.degrees()[order]
+    counts = np.full(len(x), len(y)) if max_degree is None else np.searchsorted(ydegrees, max_degree - x.degrees(), side="right")
+    i = np.repeat(np.arange(len(x)), counts)
+    j = order[np.arange(len(i)) - np.repeat(np.cumsum(counts) - counts, counts)]
+    cexponents, ccoeffs = conj.conjugate(y.exponents, y.coeffs)
+
+    exponents = np.concatenate([x.exponents[i] + y.exponents[j], x.exponents[i] + cexponents[j]])
+    coeffs = np.concatenate([x.coeffs[i] * y.coeffs[j], x.coeffs[i] * ccoeffs[j]]) / 2
+
+    return canonical(exponents, coeffs, conj)
+
+def add_sparse(terms: list[SparseExpansion], conj: Conjugation, signs: list[int] = None) -> SparseExpansion:
+    signs = [1] * len(terms) if signs is None else signs
+
+    return canonical(np.concatenate([t.exponents for t in terms]), np.concatenate([s * t.coeffs for s, t in zip(signs, terms)]), conj)
+
+def sparse_operator(op: Operator, variables: list[Variable], conj: Conjugation) -> np.ndarray:
+    n, m = op.expansion.shape
+    res = np.empty((n, m), dtype=object)
+
+    for i in range(n):
+        for j in range(m):
+            res[i, j] = sparse_expansion(op.expansion[i, j], variables, conj)
+
+    return res
+
+def matrix_product(a: np.ndarray, b: np.ndarray, conj: Conjugation, max_degree: int = None) -> np.ndarray:
+    assert a.shape[1] == b.shape[0]
+
+    res = np.empty((a.shape[0], b.shape[1]), dtype=object)
+
+    for i in range(a.shape[0]):
+        for j in range(b.shape[1]):
+            res[i, j] = add_sparse([multiply_sparse(a[i, k], b[k, j], conj, max_degree) for k in range(a.shape[1])], conj)
+
+    return res
+
+def to_operator(sparse: np.ndarray, variables: list[Variable]) -> Operator:
+    n, m = sparse.shape
+    expansion = np.full((n, m), MonomialExpansion({}))
+
+    for i in range(n):
+        for j in range(m):
+            expansion[i, j] = monomial_expansion(sparse[i, j], variables)
+
+    return Operator(expansion)
+
+def multiply_operators(a: Operator, b: Operator, variables: list[Variable], max_degree: int = None) -> Operator:
+    """
+    Matrix product of two operators (the entries are products of expansions)
+
+    the expansions are sparse tables of exponents and complex coefficients, a product of entries is a vectorized
+    convolution of their terms (each pair of terms gives the terms of M N and M conj(N)) merged by exponents,
+    the pairs above max_degree are never formed
+
+    Args :
+        - a, b : operators (one of the operators returned by operator())
+        - variables : variables list the operators are built on
+        - max_degree[=None] : max total degree (in the variables) of the terms kept
+    """
+    conj = conjugation(variables)
+
+    return to_operator(matrix_product(sparse_operator(a, variables, conj), sparse_operator(b, variables, conj), conj, max_degree), variables)
+
+def operator_power(a: Operator, p: int, variables: list[Variable], max_degree: int = None) -> Operator:
+    """
+    p-th matrix power of a square operator by repeated squaring (truncated at max_degree at each product)
+    """
+    assert p >= 0
+    assert a.expansion.shape[0] == a.expansion.shape[1]
+
+    conj = conjugation(variables)
+    base = sparse_operator(a, variables, conj)
+    n = a.expansion.shape[0]
+    res = np.empty((n, n), dtype=object)
+
+    # identity
+    for i in range(n):
+        for j in range(n):
+            res[i, j] = SparseExpansion(np.zeros((int(i == j), len(variables)), dtype=np.int64), np.ones(int(i == j), dtype=np.complex128))
+
+    while p > 0:
+        if p % 2 == 1:
+            res = matrix_product(res, base, conj, max_degree)
+
+        p //= 2
+
+        if p > 0:
+            base = matrix_product(base, base, conj, max_degree)
+
+    return to_operator(res, variables)
+
+def commutator(a: Operator, b: Operator, variables: list[Variable], max_degree: int = None) -> Operator:
+    """
+    [a, b] = a b - b a of two square operators of the same shape
+    """
+    assert a.expansion.shape == b.expansion.shape and a.expansion.shape[0] == a.expansion.shape[1]
+
+    conj = conjugation(variables)
+    x = sparse_operator(a, variables, conj)
+    y = sparse_operator(b, variables, conj)
+    xy = matrix_product(x, y, conj, max_degree)
+    yx = matrix_product(y, x, conj, max_degree)
+    res = np.empty(xy.shape, dtype=object)
+
+    for index in np.ndindex(xy.shape):
+        res[index] = add_sparse([xy[index], yx[index]], conj, [1, -1])
+
+    return to_operator(res, variables)
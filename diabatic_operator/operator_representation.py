@@ -1,11 +1,23 @@
+import io
 from dataclasses import dataclass
 from collections import Counter
-from symmetry import Symmetry
-from variable import Variable, generate_variables_list
-from monome import Monome
-from monomial_expansion import MonomialExpansion, generate_invariants_and_monoms
+from .symmetry import Symmetry
+from .variable import Variable, generate_variables_list
+from .monome import Monome
+from .monomial_expansion import MonomialExpansion, generate_invariants_and_monoms
+from .selection_rules import SelectionRules, cached_selection_rules
+from .form_rules import COMPONENT_X, COMPONENT_Y, form_entries, has_component, kept_entries
 import numpy as np
-from utils import *
+from .utils import *
+
+def form_matrix(component: int, tilde: bool, sigma: int, sign: int) -> np.ndarray:
+    """
+    Matrix of a term of the operator forms (X, X~, Y or Y~), see form_rules.form_entries
+    """
+    return np.array(form_entries(component, tilde, sigma, sign))
+
+# form matrices indexed by [component, tilde, (sigma + 1) // 2, (sign + 1) // 2]
+FORM_MATRICES = np.array([[[[form_matrix(c, t, s, g) for g in (-1, 1)] for s in (-1, 1)] for t in (False, True)] for c in (COMPONENT_X, COMPONENT_Y)])
 
 @dataclass
 class Operator:
@@ -13,15 +25,25 @@ class Operator:
     expansion: np.ndarray[MonomialExpansion]
 
     def __str__(self) -> str:
-        # assuming 2x2 matrices (should be easily generalized)
-        s11 = str(self.expansion[0, 0])
-        s12 = str(self.expansion[0, 1])
-        s21 = str(self.expansion[1, 0])
-        s22 = str(self.expansion[1, 1])
+        # each entry is formatted once, the widths come from the formatted entries and the padding is written after them
+        n, m = self.expansion.shape
+        entries = [[str(self.expansion[i, j]) for j in range(m)] for i in range(n)]
+        maxw = max((len(s) for row in entries for s in row), default=0)
+        buffer = io.StringIO()
+
+        for i, row in enumerate(entries):
+            buffer.write("(" if i == 0 else ")\n(")
 
-        maxw = max(len(s11), len(s12), len(s21), len(s22))
+            for j, s in enumerate(row):
+                if j > 0:
+                    buffer.write(" | ")
 
-        return f"({s11}{" " * (maxw - len(s11))} | {s12}{" " * (maxw - len(s12))})\n({s21}{" " * (maxw - len(s21))} | {s22}{" " * (maxw - len(s22))})"
+                buffer.write(s)
+                buffer.write(" " * (maxw - len(s)))
+
+        buffer.write(")")
+
+        return buffer.getvalue()
 
     def __add__(self, other):
         assert isinstance(other, Operator)
@@ -56,28 +78,27 @@ class Operator:
                     self.expansion[i, j] = MonomialExpansion({})
 
     def add_X(self, monome: Monome, order: int, sigma: int, sign: int):
-        self.__add_matrix(monome, order, sign * np.array([
-            [1, sigma * 1j],
-            [sigma * 1j, (-1) ** sigma]
-        ]))
+        self.__add_matrix(monome, order, form_matrix(COMPONENT_X, False, sigma, sign))
 
     def add_Y(self, monome: Monome, order: int, sigma: int, sign: int):
-        self.__add_matrix(monome, order, sign * np.array([
-            [1j, -sigma],
-            [-sigma, ((-1) ** sigma) * 1j]
-        ]))
+        self.__add_matrix(monome, order, form_matrix(COMPONENT_Y, False, sigma, sign))
 
     def add_X_tilde(self, monome: Monome, order: int, sigma: int, sign: int):
-        self.__add_matrix(monome, order, sign * np.array([
-            [1, sigma * 1j],
-            [-sigma * 1j, 1]
-        ]))
+        self.__add_matrix(monome, order, form_matrix(COMPONENT_X, True, sigma, sign))
 
     def add_Y_tilde(self, monome: Monome, order: int, sigma: int, sign: int):
-        self.__add_matrix(monome, order, sign * np.array([
-            [1j, -sigma],
-            [sigma, 1j]
-        ]))
+        self.__add_matrix(monome, order, form_matrix(COMPONENT_Y, True, sigma, sign))
+
+    def add_rules(self, monome: Monome, rules: SelectionRules, rows: np.ndarray):
+        """
+        Adds the terms of some rows of a selection rules table at once (same result as the add_X / add_Y calls in the rows order)
+        """
+        matrices = FORM_MATRICES[rules.component[rows], rules.tilde[rows].astype(np.int64), (rules.sigma[rows] + 1) // 2, (rules.sign[rows] + 1) // 2]
+        n, m = self.expansion.shape
+
+        for i in range(n):
+            for j in range(m):
+                self.expansion[i, j] = self.expansion[i, j].add_terms(monome, rules.order[rows].tolist(), list(matrices[:, i, j]))
 
     def extract_order(self, order: int):
         n, m = self.expansion.shape
@@ -93,14 +114,7 @@ class Operator:
         if (s1.is_B() or s2.is_B()) and n % 2 != 0:
             raise ValueError("n should be even for a B symmetry")
 
-        mask = np.ones((2, 2))
-
-        if not s1.is_E():
-            mask[(s1.value() + 1) % 2, :] = 0
-        if not s2.is_E():
-            mask[:, (s2.value() + 1) % 2] = 0
-
-        self.__apply_mask(mask)
+        self.__apply_mask(np.array(kept_entries(s1, s2), dtype=np.int64))
 
     def up_to_order(self, max_order: int):
         n, m = self.expansion.shape
@@ -157,7 +171,10 @@ class Operator:
 
         return s
 
-def A_x(n: int, opsymmetry: Symmetry, s1: Symmetry, s2: Symmetry, max_order: int) -> Operator:
+def A_x(n: int, opsymmetry: Symmetry, s1: Symmetry, s2: Symmetry, max_order: int, rules: SelectionRules = None) -> Operator:
+    """
+    X component of the operator form, built from a selection rules table (the cached one of (n, max_order) if not given)
+    """
     assert opsymmetry.compute_gamma(n) >= 0
     assert s1.compute_gamma(n) >= 0
     assert s2.compute_gamma(n) >= 0
@@ -166,42 +183,22 @@ def A_x(n: int, opsymmetry: Symmetry, s1: Symmetry, s2: Symmetry, max_order: int
     monome = Monome(variables)
     Ax = Operator(np.full((2, 2), MonomialExpansion({})))
 
-    if opsymmetry.is_A2() or opsymmetry.is_B2():
+    if not has_component(opsymmetry, COMPONENT_X):
         return Ax
 
-    gamma = opsymmetry.compute_gamma(n)
-    alpha1 = s1.compute_gamma(n)
-    alpha2 = s2.compute_gamma(n)
-
-    j = 0
-
-    while True:
-        s = 0
-
-        for sg in [-1, 1]:
-            for sigma1 in [-1, 1]:
-                for sigma2 in [-1, 1]:
-                    k = n * j + sg * gamma + sigma1 * alpha1 + sigma2 * alpha2
-
-                    if k > max_order:
-                        s += 1
-                        continue
-                    elif k >= 0:
-                        if sigma1 * sigma2 > 0:
-                            Ax.add_X(monome, k, -sigma2, 1)
-                        else:
-                            Ax.add_X_tilde(monome, k, -sigma2, 1)
-
-        if s == 8:
-            break
-
-        j += 1
+    if rules is None or rules.max_order < max_order:
+        rules = cached_selection_rules(n, max_order)
 
+    rows = rules.select(n, opsymmetry.compute_gamma(n), s1.compute_gamma(n), s2.compute_gamma(n), COMPONENT_X, max_order)
+    Ax.add_rules(monome, rules, rows)
     Ax.apply_states_symmetries(n, s1, s2)
 
     return Ax
 
-def A_y(n: int, opsymmetry: Symmetry, s1: Symmetry, s2: Symmetry, max_order: int) -> Operator:
+def A_y(n: int, opsymmetry: Symmetry, s1: Symmetry, s2: Symmetry, max_order: int, rules: SelectionRules = None) -> Operator:
+    """
+    Y component of the operator form, built from a selection rules table (the cached one of (n, max_order) if not given)
+    """
     assert opsymmetry.compute_gamma(n) >= 0
     assert s1.compute_gamma(n) >= 0
     assert s2.compute_gamma(n) >= 0
@@ -210,45 +207,25 @@ def A_y(n: int, opsymmetry: Symmetry, s1: Symmetry, s2: Symmetry, max_order: int
     monome = Monome(variables)
     Ay = Operator(np.full((2, 2), MonomialExpansion({})))
 
-    if opsymmetry.is_A1() or opsymmetry.is_B1():
+    if not has_component(opsymmetry, COMPONENT_Y):
         return Ay
 
-    gamma = opsymmetry.compute_gamma(n)
-    alpha1 = s1.compute_gamma(n)
-    alpha2 = s2.compute_gamma(n)
-
-    j = 0
-
-    while True:
-        s = 0
-
-        for sg in [-1, 1]:
-            for sigma1 in [-1, 1]:
-                for sigma2 in [-1, 1]:
-                    k = n * j + gamma + sigma1 * alpha1 - sigma2 * alpha2
-
-                    if k > max_order:
-                        s += 1
-                        continue
-                    elif k >= 0:
-                        if sigma1 * sigma2 > 0:
-                            Ay.add_Y(monome, k, -sigma2, sg)
-                        else:
-                            Ay.add_Y_tilde(monome, k, -sigma2, sg)
-
-        if s == 8:
-            break
-
-        j += 1
+    if rules is None or rules.max_order < max_order:
+        rules = cached_selection_rules(n, max_order)
 
+    rows = rules.select(n, opsymmetry.compute_gamma(n), s1.compute_gamma(n), s2.compute_gamma(n), COMPONENT_Y, max_order)
+    Ay.add_rules(monome, rules, rows)
     Ay.apply_states_symmetries(n, s1, s2)
 
     return Ay
 
-def operator_form(n: int, opsymmetry: Symmetry, s1: Symmetry, s2: Symmetry, max_order: int) -> tuple[Operator, Operator]:
-    return (A_x(n, opsymmetry, s1, s2, max_order), A_y(n, opsymmetry, s1, s2, max_order))
+def operator_form(n: int, opsymmetry: Symmetry, s1: Symmetry, s2: Symmetry, max_order: int, rules: SelectionRules = None) -> tuple[Operator, Operator]:
+    if rules is None or rules.max_order < max_order:
+        rules = cached_selection_rules(n, max_order)
+
+    return (A_x(n, opsymmetry, s1, s2, max_order, rules), A_y(n, opsymmetry, s1, s2, max_order, rules))
 
-def operator(n: int, opsymmetry: Symmetry, s1: Symmetry, s2: Symmetry, nvarsym: list[int], max_order: int) -> np.ndarray[tuple[Operator, Operator]]:
+def operator(n: int, opsymmetry: Symmetry, s1: Symmetry, s2: Symmetry, nvarsym: list[int], max_order: int, rules: SelectionRules = None) -> np.ndarray[tuple[Operator, Operator]]:
     """
     Computes the expansion (to order p) of an operator given its symmetry, the symmetry of each state and the symmetry of each variable
 
@@ -259,24 +236,48 @@ def operator(n: int, opsymmetry: Symmetry, s1: Symmetry, s2: Symmetry, nvarsym:
         - s2 : symmetry of the second state
         - nvarsym : list of number of variables of each symmetry
         - max_order : max order of the expansion
+        - rules[=None] : precomputed selection rules table (see selection_rules) containing n, to share between calls
     """
     if (opsymmetry.is_B() or s1.is_B() or s2.is_B()) and n % 2 != 0:
         raise ValueError("n should be even for a B symmetry")
 
+    if rules is None or rules.max_order < max_order:
+        rules = cached_selection_rules(n, max_order)
+
     variables = generate_variables_list(nvarsym, n)
     finvs, rhos, monoms = generate_invariants_and_monoms(variables, n)
-    n, m = 2, 2
+
+    return assemble_operator(n, opsymmetry, s1, s2, monoms, max_order, rules)
+
+def assemble_operator(n: int, opsymmetry: Symmetry, s1: Symmetry, s2: Symmetry, monoms: list[Monome], max_order: int, rules: SelectionRules = None, forms: dict = None) -> np.ndarray[tuple[Operator, Operator]]:
+    """
+    Builds the operator from the appearing monoms (as returned by generate_invariants_and_monoms), see operator
+
+    Args :
+        - forms[=None] : cache of the operator forms (A_x, A_y) keyed by (opsymmetry, si, sj) names,
+          to share between calls with the same n and max_order
+    """
+    if rules is None or rules.max_order < max_order:
+        rules = cached_selection_rules(n, max_order)
+
+    forms = {} if forms is None else forms
+    nrows, ncols = 2, 2
     states = (s1, s2)
 
     if s1 == s2:
-        n, m = 1, 1
+        nrows, ncols = 1, 1
         states = (s1,)
 
-    opforms = np.empty((n, m), dtype=object)
+    opforms = np.empty((nrows, ncols), dtype=object)
+
+    for i in range(nrows):
+        for j in range(ncols):
+            key = (str(opsymmetry), str(states[i]), str(states[j]))
+
+            if forms.get(key) is None:
+                forms[key] = operator_form(n, opsymmetry, states[i], states[j], max_order, rules)
 
-    for i in range(n):
-        for j in range(m):
-            opforms[i, j] = operator_form(n, opsymmetry, states[i], states[j], max_order)
+            opforms[i, j] = forms[key]
 
     """opforms = np.array([
         # 11, 12
@@ -285,11 +286,11 @@ def operator(n: int, opsymmetry: Symmetry, s1: Symmetry, s2: Symmetry, nvarsym:
         [operator_form(n, opsymmetry, s2, s1, max_order), operator_form(n, opsymmetry, s2, s2, max_order)]
     ])"""
 
-    op = np.full((n, m, 2), Operator(np.full((2, 2), MonomialExpansion({}))))
+    op = np.full((nrows, ncols, 2), Operator(np.full((2, 2), MonomialExpansion({}))))
 
     for monome in monoms:
-        for i in range(n):
-            for j in range(m):
+        for i in range(nrows):
+            for j in range(ncols):
                 op[i, j][0] += opforms[i, j][0].reduce(monome)
                 op[i, j][1] += opforms[i, j][1].reduce(monome)
 
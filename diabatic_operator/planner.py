@@ -0,0 +1,383 @@
+import cmath
+import time
+from dataclasses import dataclass, field, replace
+from math import comb
+from .symmetry import Symmetry
+from .variable import Variable, generate_variables_list
+from .monome import Monome
+from .monomial_expansion import MonomialExpansion
+from .form_rules import COMPONENT_X, COMPONENT_Y, form_terms, form_entries, has_component, kept_entries
+
+@dataclass
+class Costs:
+    """
+    Rough unit costs of the default (columnar) generation and of the accumulation (see calibrate to measure them on the current machine),
+    the per monome path of generate_invariants_and_monoms(columnar=False) is about 30 to 60 times slower
+    """
+    seconds_per_degree: float = 2.5e-4  # fixed cost of a degree (its tables and the Monome objects of its results)
+    seconds_per_candidate: float = 9e-7 # one row of the candidate table
+    seconds_per_check: float = 2.3e-8   # one (candidate, factor) pair of the vectorized factor test
+    seconds_per_copy: float = 1e-6      # one term copied by the accumulation of operator
+    bytes_per_monome: int = 450         # Monome object, its variables list and its Counter entry
+    bytes_per_variable: int = 8
+    bytes_per_term: int = 250           # one (order, monome) -> coeff entry of an expansion
+
+@dataclass
+class Plan:
+    """
+    Expected sizes of an operator() run, computed without generating any monome
+
+    Attributes :
+        - candidates : number of candidate monomials of each degree (combinations with replacement of the variables)
+        - molien : dimension of the space of C_nv invariant polynomials of each degree (Molien series)
+        - invariants : expected number of invariants (full, real and pseudo)
+        - invariants_by_degree : expected number of invariants of each degree
+        - rhos : expected number of rhos
+        - monomials : expected number of appearing monomials
+        - weights : number of appearing monomials of each weight
+        - terms : expected number of terms of each entry, terms[i][j][component][a][b] for the block (i, j)
+        - memory : estimated peak memory (bytes)
+        - seconds : estimated run time (seconds)
+    """
+    n: int
+    nvarsym: list[int]
+    max_order: int
+    candidates: list[int] = field(default_factory=list)
+    molien: list[int] = field(default_factory=list)
+    invariants: int = 0
+    invariants_by_degree: list[int] = field(default_factory=list)
+    rhos: int = 0
+    monomials: int = 0
+    weights: dict[int, int] = field(default_factory=dict)
+    terms: list = field(default_factory=list)
+    memory: int = 0
+    seconds: float = 0.0
+
+    def block_terms(self, i: int, j: int, component: int) -> int:
+        return sum(sum(row) for row in self.terms[i][j][component])
+
+    def total_terms(self) -> int:
+        return sum(self.block_terms(i, j, c) for i in range(len(self.terms)) for j in range(len(self.terms[i])) for c in range(2))
+
+    def __str__(self) -> str:
+        lines = [
+            f"C_{self.n}v, nvarsym = {self.nvarsym}, max order = {self.max_order}",
+            f"candidate monomials per degree : {self.candidates[1:]}",
+            f"invariant polynomials per degree : {self.molien[1:]}",
+            f"invariants : {self.invariants} (per degree : {self.invariants_by_degree[1:]})",
+            f"rhos : {self.rhos}",
+            f"appearing monomials : {self.monomials} (per weight : {dict(sorted(self.weights.items()))})",
+        ]
+
+        for i in range(len(self.terms)):
+            for j in range(len(self.terms[i])):
+                lines.append(f"terms of block ({i + 1}, {j + 1}) : X {self.block_terms(i, j, 0)}, Y {self.block_terms(i, j, 1)}")
+
+        lines.append(f"estimated memory : {self.memory / 2**20:.1f} MiB")
+        lines.append(f"estimated time : {self.seconds:.3g} s")
+
+        return "\n".join(lines)
+
+def multichoose(size: int, k: int) -> int:
+    return comb(size + k - 1, k)
+
+def molien_series(variables: list[Variable], n: int, max_degree: int) -> list[int]:
+    """
+    Dimensions of the spaces of C_nv invariant polynomials of degree 0 to max_degree in the variables,
+    averaging 1 / det(1 - t g) over the 2n elements of the group
+    """
+    def series(eigenvalues: list[complex]) -> list[complex]:
+        coeffs = [1.0 + 0j] + [0j] * max_degree
+
+        # multiplication by 1 / (1 - l t) = sum_k (l t)^k
+        for l in eigenvalues:
+            for d in range(1, max_degree + 1):
+                coeffs[d] += l * coeffs[d - 1]
+
+        return coeffs
+
+    total = [0j] * (max_degree + 1)
+    elements = []
+
+    for k in range(n):
+        eigenvalues = []
+
+        for v in variables:
+            if v.symmetry.is_A():
+                eigenvalues.append(1)
+            elif v.symmetry.is_B():
+                eigenvalues.append((-1) ** k)
+            else:
+                # Q+ and Q- are the eigenvectors of the rotations
+                eigenvalues.append(cmath.exp((-1 if v.complex_conjugate else 1) * 2j * cmath.pi * v.symmetry.gamma * k / n))
+
+        elements.append(eigenvalues)
+
+    # reflections : sigma_v (and sigma_d if n is even, B1 and B2 being exchanged)
+    for k in range(n):
+        eigenvalues = []
+
+        for v in variables:
+            if v.symmetry.is_A1():
+                eigenvalues.append(1)
+            elif v.symmetry.is_A2():
+                eigenvalues.append(-1)
+            elif v.symmetry.is_B():
+                eigenvalues.append((1 if v.symmetry.is_B1() else -1) * (-1) ** k)
+            else:
+                # the reflection exchanges Q+ and Q-, eigenvalues +1 and -1 for the pair
+                eigenvalues.append(-1 if v.complex_conjugate else 1)
+
+        elements.append(eigenvalues)
+
+    for eigenvalues in elements:
+        for d, c in enumerate(series(eigenvalues)):
+            total[d] += c
+
+    return [round((c / (2 * n)).real) for c in total]
+
+def profile_classes(variables: list[Variable], n: int) -> list[tuple]:
+    """
+    Groups the B and E variables by weight class (irrep, signed weight), each class being (irrep, weight, size, partner)
+    with partner the index of the conjugated class for E variables
+    """
+    sizes = {}
+
+    for v in variables:
+        if v.symmetry.is_A():
+            continue
+
+        key = (v.symmetry.irrep, v.weight())
+        sizes[key] = sizes.get(key, 0) + 1
+
+    keys = list(sizes.keys())
+    classes = []
+
+    for irrep, weight in keys:
+        partner = keys.index((irrep, -weight)) if irrep == "E" else None
+        classes.append((irrep, weight, sizes[(irrep, weight)], partner))
+
+    return classes
+
+def count_profiles(classes: list[tuple], n: int, max_degree: int) -> tuple[list[list[int]], dict[int, float]]:
+    """
+    Enumerates the weight profiles (exponents per class) of the monomials which are not divisible by an invariant,
+    a profile is kept as long as no sub multiset of its weights sums to 0 mod n (zero-sum free) and is an
+    invariant (minimal zero-sum multiset) when its weights sum to 0 mod n
+
+    Returns :
+        - invariants : per degree number of (full, real or pseudo, pseudo only) classes of invariant monomials
+        - weights : number of appearing monomials of each weight
+    """
+    invariants = [[0.0, 0.0, 0.0] for _ in range(max_degree + 1)]
+    weights = {}
+    full = (1 << n) - 1
+
+    def rotate(mask: int, r: int) -> int:
+        return ((mask << r) | (mask >> (n - r))) & full
+
+    def visit(exponents: list[int]):
+        degree = sum(exponents)
+        weight = 0
+        ccweight = 0
+        nmono = 1
+        nself = 1
+        b2 = None
+
+        for (irrep, w, size, partner), a in zip(classes, exponents):
+            weight += a * w
+            # B1 variables are real, B2 ones become B2 conjugated variables of weight -n/2
+            ccweight += a * w if irrep == "B1" else -a * w
+
+            if a == 0:
+                continue
+
+            if irrep == "B2":
+                # monomials with an odd / even number of distinct B2 variables
+                odd = sum(comb(size, k) * comb(a - 1, k - 1) for k in range(1, min(size, a) + 1, 2))
+                b2 = (odd, multichoose(size, a) - odd)
+            else:
+                nmono *= multichoose(size, a)
+
+        selfconj = b2 is None and all(irrep != "E" or a == exponents[partner] for (irrep, _, _, partner), a in zip(classes, exponents))
+
+        if b2 is not None:
+            # no conjugated copy among the candidates
+            share = 1.0
+            weight = abs(weight)
+        elif selfconj:
+            # the exponents of one class of each E pair fix the ones of the other
+            for c, ((irrep, _, size, partner), a) in enumerate(zip(classes, exponents)):
+                if irrep == "B1" or (irrep == "E" and c < partner):
+                    nself *= multichoose(size, a)
+
+            share = 0.5
+        else:
+            # generate_monoms keeps the first generated of the monome and its conjugate (the one with more Q+ at the
+            # first unbalanced pair) unless its weight is negative, exact with one variable per E class
+            nself = 0
+            share = 0.5
+            plus = next((a > exponents[partner] for (irrep, w, _, partner), a in zip(classes, exponents) if irrep == "E" and w > 0 and a != exponents[partner]), True)
+            first, second = (weight, ccweight) if plus else (ccweight, weight)
+            weight = first if first >= 0 else second
+
+        return (degree, weight, nmono, nself, share, b2)
+
+    def explore(start: int, exponents: list[int], sums: int, total: int, degree: int):
+        for c in range(start, len(classes)):
+            r = classes[c][1] % n
+            exponents[c] += 1
+            newtotal = (total + r) % n
+
+            if newtotal == 0:
+                # minimal zero-sum multiset : invariant
+                d, w, nmono, nself, share, b2 = visit(exponents)
+
+                if w <= n:
+                    if b2 is not None:
+                        odd, even = b2
+                        invariants[d][2] += nmono * odd
+                        invariants[d][1] += nmono * even
+                    else:
+                        invariants[d][0] += nself
+                        invariants[d][1] += share * (nmono - nself)
+            elif sums & (1 << ((n - r) % n)) == 0:
+                # zero-sum free : appearing monomial (if its weight isn't too large)
+                d, w, nmono, nself, share, b2 = visit(exponents)
+
+                if w <= n:
+                    count = nmono * (sum(b2) if b2 is not None else 1)
+                    weights[w] = weights.get(w, 0) + (count if b2 is not None else share * (nmono + nself))
+
+                if degree + 1 < max_degree:
+                    explore(c, exponents, sums | rotate(sums, r) | (1 << r), newtotal, degree + 1)
+
+            exponents[c] -= 1
+
+    explore(0, [0] * len(classes), 0, 0, 0)
+
+    return (invariants, {w: round(c) for w, c in weights.items() if round(c) > 0})
+
+def form_orders(n: int, opsymmetry: Symmetry, s1: Symmetry, s2: Symmetry, max_order: int) -> list:
+    """
+    Orders of each entry of the operator forms, orders[component][a][b] are the orders of
+    operator_form(n, opsymmetry, s1, s2, max_order)[component].expansion[a, b]
+
+    the terms are those of form_rules.form_terms (the rows of selection_rules) added with MonomialExpansion.add_terms,
+    without the selection rules table and the Operator arrays, so that the planner doesn't import numpy
+    """
+    gamma, alpha1, alpha2 = (s.compute_gamma(n) for s in (opsymmetry, s1, s2))
+    assert gamma >= 0 and alpha1 >= 0 and alpha2 >= 0
+
+    monome = Monome([Variable("Q", Symmetry("E", gamma=1))])
+    kept = kept_entries(s1, s2)
+    res = []
+
+    for component in (COMPONENT_X, COMPONENT_Y):
+        terms = list(form_terms(n, gamma, alpha1, alpha2, component, max_order)) if has_component(opsymmetry, component) else []
+        orders = [k for k, _, _, _ in terms]
+        matrices = [form_entries(component, tilde, sigma, sign) for _, sigma, tilde, sign in terms]
+
+        res.append([[list(MonomialExpansion({}).add_terms(monome, orders, [m[a][b] for m in matrices]).expansion) if kept[a][b] else [] for b in range(2)] for a in range(2)])
+
+    return res
+
+def expected_terms(n: int, opsymmetry: Symmetry, s1: Symmetry, s2: Symmetry, max_order: int, weights: dict[int, int]) -> list:
+    """
+    Number of terms of each entry of the operator, from the orders allowed by the selection rules
+    and the weights of the appearing monomials (an order k of the form is kept for a monome of weight w dividing k)
+    """
+    states = (s1,) if s1 == s2 else (s1, s2)
+    terms = []
+
+    for si in states:
+        row = []
+
+        for sj in states:
+            counts = []
+
+            for entries in form_orders(n, opsymmetry, si, sj, max_order):
+                counts.append([[0, 0], [0, 0]])
+
+                for a in range(2):
+                    for b in range(2):
+                        for k in entries[a][b]:
+                            counts[-1][a][b] += 1 if k == 0 else sum(c for w, c in weights.items() if k % w == 0)
+
+            row.append(counts)
+
+        terms.append(row)
+
+    return terms
+
+def generation_seconds(candidates: list[int], invariants_by_degree: list[int], costs: Costs) -> float:
+    """
+    Estimated run time of the columnar generation, every candidate of a degree is tested against the invariants of the lower degrees
+    """
+    seconds = 0.0
+    ninvs = 0
+
+    for d in range(1, len(candidates)):
+        seconds += costs.seconds_per_degree + candidates[d] * (costs.seconds_per_candidate + ninvs * costs.seconds_per_check)
+        ninvs += invariants_by_degree[d]
+
+    return seconds
+
+def plan(n: int, opsymmetry: Symmetry, s1: Symmetry, s2: Symmetry, nvarsym: list[int], max_order: int, costs: Costs = None) -> Plan:
+    """
+    Predicts the sizes, memory and run time of operator(n, opsymmetry, s1, s2, nvarsym, max_order) before running it
+
+    the counts of invariants, rhos and appearing monomials come from an enumeration of the weight profiles
+    (not of the monomials), the number of monomials sharing a profile being counted combinatorially,
+    memory and time are estimates from the unit costs
+    """
+    if (opsymmetry.is_B() or s1.is_B() or s2.is_B()) and n % 2 != 0:
+        raise ValueError("n should be even for a B symmetry")
+
+    costs = Costs() if costs is None else costs
+    variables = generate_variables_list(nvarsym, n)
+    max_degree = n
+    res = Plan(n, list(nvarsym), max_order)
+
+    res.candidates = [multichoose(len(variables), d) for d in range(max_degree + 1)]
+    res.molien = molien_series(variables, n, max_degree)
+
+    invariants, res.weights = count_profiles(profile_classes(variables, n), n, max_degree)
+    na1 = sum(1 for v in variables if v.symmetry.is_A1())
+    na2 = sum(1 for v in variables if v.symmetry.is_A2())
+
+    res.invariants_by_degree = [round(full + 2 * both + pseudo) for full, both, pseudo in invariants]
+    res.invariants_by_degree[1] += na1 + na2
+    res.invariants = sum(res.invariants_by_degree)
+    res.rhos = na2 + round(sum(both + pseudo for _, both, pseudo in invariants))
+    res.monomials = sum(res.weights.values())
+    res.terms = expected_terms(n, opsymmetry, s1, s2, max_order, res.weights)
+
+    # accumulation : each appearing monome copies the terms already accumulated
+    res.seconds = generation_seconds(res.candidates, res.invariants_by_degree, costs) + costs.seconds_per_copy * res.monomials * res.total_terms() / 2
+
+    peak = max(res.candidates[d] * (costs.bytes_per_monome + costs.bytes_per_variable * d) for d in range(1, max_degree + 1)) if max_degree > 0 else 0
+    stored = (res.invariants + res.rhos + res.monomials) * (costs.bytes_per_monome + costs.bytes_per_variable * max_degree)
+    res.memory = peak + stored + costs.bytes_per_term * res.total_terms()
+
+    return res
+
+def calibrate(n: int = 8, nvarsym: tuple[int, ...] = (1, 0, 0, 0, 2, 1, 1), costs: Costs = None) -> Costs:
+    """
+    Scales the time costs so that the generation estimate matches a small run of the default (columnar) generation on the current machine
+    """
+    from .monomial_expansion import generate_invariants_and_monoms
+
+    costs = Costs() if costs is None else costs
+    res = plan(n, Symmetry("A1"), Symmetry("A1"), Symmetry("A1"), nvarsym, n, costs)
+    predicted = generation_seconds(res.candidates, res.invariants_by_degree, costs)
+
+    variables = generate_variables_list(nvarsym, n)
+    # the first run also imports numpy and the columnar generation, it isn't timed
+    generate_invariants_and_monoms(variables, n)
+
+    start = time.perf_counter()
+    generate_invariants_and_monoms(variables, n)
+    scale = (time.perf_counter() - start) / predicted
+
+    return replace(costs, seconds_per_degree=costs.seconds_per_degree * scale, seconds_per_candidate=costs.seconds_per_candidate * scale, seconds_per_check=costs.seconds_per_check * scale, seconds_per_copy=costs.seconds_per_copy * scale)
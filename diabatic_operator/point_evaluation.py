@@ -0,0 +1,211 @@
+import re
+import numpy as np
+from .evaluation import OperatorTable, Evaluator, slot_derivatives, SLOT_REAL, SLOT_IMAG, SLOT_PLUS
+
+class PointEvaluator:
+    """
+    Low latency evaluation of an operator at a single geometry (for on the fly dynamics)
+
+    the operator is turned into straight line python code working on python floats and complex numbers,
+    the results are written into preallocated buffers, so that a call allocates no array :
+        - matrix : (n, m) diabatic matrix
+        - gradient : (ncoordinates, n, m) derivatives of the diabatic matrix
+        - energies : (2,) adiabatic energies (2x2 operators only)
+        - coupling : (ncoordinates,) derivative coupling <psi_1|grad psi_2> (2x2 operators only)
+
+    these arrays are views of one shared buffer, overwritten by every call (copy them to keep the values of a geometry),
+    a call takes a few microseconds for small models and grows with the generated code (C_6v, A1 operator between
+    E1 states up to order 6 : about 3 us with one E1 variable, 14 us with two E variables, 30 us with an A1 and three E ones)
+    """
+
+    def __init__(self, op: OperatorTable | Evaluator, epsilon: float = 1e-8):
+        evaluator = op if isinstance(op, Evaluator) else op.evaluator()
+
+        self.shape = evaluator.shape
+        self.ncoordinates = evaluator.ncoordinates
+        self.epsilon = epsilon
+
+        n, m = self.shape
+        nc = self.ncoordinates
+        self.adiabatic = self.shape == (2, 2)
+        size = n * m * (1 + nc) + ((2 + nc) if self.adiabatic else 0)
+
+        self.buffer = np.zeros(size)
+        self.matrix = self.buffer[:n * m].reshape(n, m)
+        self.gradient = self.buffer[n * m:n * m * (1 + nc)].reshape(nc, n, m)
+
+        if self.adiabatic:
+            self.energies = self.buffer[n * m * (1 + nc):n * m * (1 + nc) + 2]
+            self.coupling = self.buffer[n * m * (1 + nc) + 2:]
+        else:
+            self.energies = None
+            self.coupling = None
+
+        self.__view = memoryview(self.buffer)
+        self.source = generate_point_source(evaluator, self.adiabatic)
+        namespace = {}
+        exec(compile(self.source, "<point_evaluator>", "exec"), namespace)
+        self.__function = namespace["point"]
+
+    def __call__(self, q: tuple[float, ...]) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Evaluates the operator at the geometry q (flat tuple of the real coordinates)
+
+        returns the matrix, gradient, energies and coupling attributes themselves : views of the shared buffer which
+        the next call overwrites, not copies
+        """
+        self.__function(q, self.__view, self.epsilon)
+
+        return (self.matrix, self.gradient, self.energies, self.coupling)
+
+def linear_combination(terms: list[tuple[float, str]]) -> str:
+    """
+    Source of sum(coeff * expr) skipping null coefficients
+    """
+    s = " + ".join(f"{float(c)!r}*{e}" if c != 1 else e for c, e in terms if c != 0).replace("+ -", "- ")
+
+    return s if len(s) > 0 else "0.0"
+
+def generate_point_source(evaluator: Evaluator, adiabatic: bool) -> str:
+    """
+    Generates the source of point(q, out, epsilon) evaluating the matrix (and its derivatives) of an evaluator
+    """
+    table = evaluator.table
+    kinds = table.kinds
+    columns = table.columns
+    nslots = len(kinds)
+    nc = evaluator.ncoordinates
+    nblocks = evaluator.shape[0] * evaluator.shape[1]
+    lines = ["def point(q, out, epsilon):"]
+
+    if nc > 0:
+        lines.append("    " + ", ".join(f"q{c}" for c in range(nc)) + (", = q" if nc == 1 else " = q"))
+
+    # slot values and their powers
+    for s in range(nslots):
+        if evaluator.max_power[s] == 0:
+            continue
+
+        c = columns[s]
+
+        if kinds[s] == SLOT_REAL:
+            lines.append(f"    z{s}_1 = q{c}")
+        elif kinds[s] == SLOT_IMAG:
+            lines.append(f"    z{s}_1 = 1j*q{c}")
+        elif kinds[s] == SLOT_PLUS:
+            lines.append(f"    z{s}_1 = complex(q{c}, q{c + 1})")
+        else:
+            lines.append(f"    z{s}_1 = complex(q{c}, -q{c + 1})")
+
+        for p in range(2, evaluator.max_power[s] + 1):
+            lines.append(f"    z{s}_{p} = z{s}_{p - 1}*z{s}_1")
+
+    def product(factors: list[str]) -> str:
+        return "*".join(factors) if len(factors) > 0 else "1.0"
+
+    # derivatives of the slots with respect to the coordinates (as multiplication by 1, i or -i)
+    coordinate_derivatives = [[] for _ in range(nc)]
+
+    for s, derivatives in enumerate(slot_derivatives(kinds, columns)):
+        for c, factor in derivatives:
+            coordinate_derivatives[c].append((s, factor))
+
+    entries = [[] for _ in range(nblocks)]
+    derivatives = [[{} for _ in range(nblocks)] for _ in range(nc)]
+
+    for k, e in enumerate(evaluator.exponents):
+        lines.append(f"    m{k} = " + product([f"z{s}_{e[s]}" for s in range(nslots) if e[s] > 0]))
+        weights = [(b, evaluator.wreal[k, b], evaluator.wimag[k, b]) for b in range(nblocks) if evaluator.wreal[k, b] != 0 or evaluator.wimag[k, b] != 0]
+
+        for b, wr, wi in weights:
+            entries[b].extend([(wr, f"m{k}.real"), (wi, f"m{k}.imag")])
+
+        if len(weights) == 0:
+            continue
+
+        # partial derivatives of the monomial with respect to each of its slots, shared by the coordinates
+        for s in range(nslots):
+            if e[s] == 0:
+                continue
+
+            others = [f"z{t}_{e[t]}" for t in range(nslots) if t != s and e[t] > 0]
+
+            if e[s] > 1:
+                others.append(f"z{s}_{e[s] - 1}")
+
+            lines.append(f"    p{k}_{s} = " + (f"{e[s]}*" if e[s] > 1 else "") + product(others))
+
+        # Re/Im of factor * p, with factor in (1, i, -i), are +/- Re/Im of p
+        for c in range(nc):
+            for s, factor in coordinate_derivatives[c]:
+                if e[s] == 0:
+                    continue
+
+                if factor == 1:
+                    real, imag = ((1, f"p{k}_{s}.real"), (1, f"p{k}_{s}.imag"))
+                else:
+                    real, imag = ((-factor.imag, f"p{k}_{s}.imag"), (factor.imag, f"p{k}_{s}.real"))
+
+                for b, wr, wi in weights:
+                    terms = derivatives[c][b]
+                    terms[real[1]] = terms.get(real[1], 0) + wr * real[0]
+                    terms[imag[1]] = terms.get(imag[1], 0) + wi * imag[0]
+
+    # identical entries (symmetric matrices) are only computed once
+    computed = {}
+
+    def assign(name: str, rhs: str, index: int):
+        if computed.get(rhs) is None:
+            computed[rhs] = name
+            lines.append(f"    {name} = {rhs}")
+        else:
+            lines.append(f"    {name} = {computed[rhs]}")
+
+        lines.append(f"    out[{index}] = {name}")
+
+    for b in range(nblocks):
+        assign(f"w{b}", linear_combination(entries[b]), b)
+
+    for c in range(nc):
+        for b in range(nblocks):
+            assign(f"g{c}_{b}", linear_combination([(coeff, expr) for expr, coeff in derivatives[c][b].items()]), nblocks * (1 + c) + b)
+
+    if adiabatic:
+        offset = nblocks * (1 + nc)
+        # mixing angle theta with tan(2 theta) = 2 W12 / (W11 - W22), <psi_1|grad psi_2> = grad theta
+        lines.append("    dw = w0 - w3")
+        lines.append("    w12 = 0.5*(w1 + w2)")
+        lines.append("    r = (0.25*dw*dw + w12*w12)**0.5")
+        lines.append("    mean = 0.5*(w0 + w3)")
+        lines.append(f"    out[{offset}] = mean - r")
+        lines.append(f"    out[{offset + 1}] = mean + r")
+        lines.append("    den = dw*dw + 4.0*w12*w12 + epsilon*epsilon")
+
+        for c in range(nc):
+            lines.append(f"    out[{offset + 2 + c}] = (dw*0.5*(g{c}_1 + g{c}_2) - w12*(g{c}_0 - g{c}_3))/den")
+
+    return "\n".join(hoist_parts(lines)) + "\n"
+
+def hoist_parts(lines: list[str]) -> list[str]:
+    """
+    Stores the real/imaginary parts of the complex values used more than once in locals
+    """
+    part = re.compile(r"\b([mp]\d+(?:_\d+)?)\.(real|imag)\b")
+    counts = {}
+
+    for line in lines:
+        for match in part.finditer(line):
+            counts[match.group(0)] = counts.get(match.group(0), 0) + 1
+
+    hoisted = {key for key, count in counts.items() if count > 1}
+    res = []
+
+    for line in lines:
+        res.append(part.sub(lambda match: f"{match.group(1)}_{match.group(2)}" if match.group(0) in hoisted else match.group(0), line))
+        name = line.strip().split(" = ")[0]
+
+        for attr in ("real", "imag"):
+            if f"{name}.{attr}" in hoisted:
+                res.append(f"    {name}_{attr} = {name}.{attr}")
+
+    return res
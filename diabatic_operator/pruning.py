@@ -0,0 +1,140 @@
+import time
+from dataclasses import dataclass
+import numpy as np
+from .variable import Variable
+from .monomial_expansion import MonomialExpansion, MonomialTerm
+from .operator_representation import Operator
+from .evaluation import OperatorTable, Evaluator, compile_operator, monome_exponents
+from .model_selection import design_matrix
+
+@dataclass
+class PruningReport:
+    """
+    Compacted operator (fitted parameters folded into its coefficients) and the cost / accuracy of the pruning
+    """
+    operator: Operator
+    table: OperatorTable
+    evaluator: Evaluator
+    kept: np.ndarray            # groups of the original table kept
+    contributions: np.ndarray   # (ngroups,) rms contribution of each group on the validation set
+    nterms: tuple[int, int]     # terms of the table before / after
+    nmonomials: tuple[int, int] # distinct monomials before / after
+    npowers: tuple[int, int]    # power table entries before / after
+    seconds: tuple[float, float] # evaluation time of the validation set before / after
+    error: float                # rms difference with the full operator on the validation set
+    max_error: float            # max difference with the full operator on the validation set
+
+    def speedup(self) -> float:
+        return self.seconds[0] / self.seconds[1] if self.seconds[1] > 0 else float("inf")
+
+    def __str__(self) -> str:
+        return (f"groups : {len(self.contributions)} -> {len(self.kept)}, terms : {self.nterms[0]} -> {self.nterms[1]}, "
+                f"monomials : {self.nmonomials[0]} -> {self.nmonomials[1]}, powers : {self.npowers[0]} -> {self.npowers[1]}, "
+                f"speedup : {self.speedup():.2f}, error : {self.error:.3g} (max {self.max_error:.3g})")
+
+def scale_operator(op: Operator, variables: list[Variable], parameters: np.ndarray, kept: np.ndarray) -> Operator:
+    """
+    Operator whose terms are the terms of the kept groups (of compile_operator(op, variables)) multiplied by their parameter
+    """
+    n, m = op.expansion.shape
+    keep = np.zeros(len(parameters), dtype=bool)
+    keep[kept] = True
+    expansion = np.full((n, m), MonomialExpansion({}))
+    group_index = {}
+
+    # same loops (and groups) as compile_operator
+    for i in range(n):
+        for j in range(m):
+            res = {}
+
+            for order, exp in op.expansion[i, j].expansion.items():
+                for mterm, coeff in exp.items():
+                    monome = mterm.monome if isinstance(mterm, MonomialTerm) else mterm
+
+                    if coeff == 0:
+                        continue
+
+                    mexponents, _ = monome_exponents(monome, variables)
+                    key = (order, tuple(mexponents))
+
+                    if group_index.get(key) is None:
+                        group_index[key] = len(group_index)
+
+                    g = group_index[key]
+
+                    if keep[g] and parameters[g] != 0:
+                        res.setdefault(order, {})[mterm] = coeff * parameters[g]
+
+            expansion[i, j] = MonomialExpansion(res)
+
+    return Operator(expansion)
+
+def evaluation_seconds(evaluator: Evaluator, coords: np.ndarray, repeat: int = 3) -> float:
+    best = float("inf")
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        evaluator.evaluate(coords)
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+def prune_operator(op: Operator, variables: list[Variable], parameters: np.ndarray, coords: np.ndarray, atol: float = 0.0, rtol: float = 0.0, budget: float = None) -> PruningReport:
+    """
+    Drops the groups of terms of a fitted operator whose contribution on a validation set is negligible,
+    and rebuilds a compacted operator and its evaluator (only the surviving monomials and powers are computed)
+
+    the contribution of a group is the rms over the validation set of its parameter times its design column,
+    a group is dropped if its contribution is <= atol or <= rtol * the largest contribution, then, if budget is given,
+    the smallest remaining contributions are dropped as long as the rms error on the validation set stays <= budget
+
+    Args :
+        - op : operator (one of the operators returned by operator())
+        - variables : variables list the operator is built on
+        - parameters : fitted parameters (one per group of compile_operator(op, variables), see select_model)
+        - coords : (N, ncoordinates) validation geometries
+        - atol[=0.0], rtol[=0.0] : absolute and relative thresholds on the contributions
+        - budget[=None] : allowed rms error (with respect to the full operator) on the validation set
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    table = compile_operator(op, variables)
+    parameters = np.asarray(parameters, dtype=np.float64)
+    assert parameters.shape == (table.ngroups(),)
+
+    design = design_matrix(table, coords) * parameters
+    contributions = np.sqrt(np.mean(design ** 2, axis=(0, 1))) if len(coords) > 0 else np.abs(parameters)
+    largest = contributions.max(initial=0.0)
+    keep = (contributions > atol) & (contributions > rtol * largest)
+
+    # errors of the dropped groups
+    residuals = design[:, :, ~keep].sum(axis=2)
+
+    if budget is not None:
+        for g in sorted(np.nonzero(keep)[0], key=lambda g: contributions[g]):
+            candidate = residuals + design[:, :, g]
+
+            if np.sqrt(np.mean(candidate ** 2)) > budget:
+                break
+
+            residuals = candidate
+            keep[g] = False
+
+    kept = np.nonzero(keep)[0]
+    pruned = scale_operator(op, variables, parameters, kept)
+    ptable = compile_operator(pruned, variables)
+    full = table.evaluator(parameters)
+    evaluator = ptable.evaluator()
+
+    return PruningReport(
+        pruned,
+        ptable,
+        evaluator,
+        kept,
+        contributions,
+        (table.nterms(), ptable.nterms()),
+        (len(full.exponents), len(evaluator.exponents)),
+        (int(full.max_power.sum()), int(evaluator.max_power.sum())),
+        (evaluation_seconds(full, coords), evaluation_seconds(evaluator, coords)),
+        float(np.sqrt(np.mean(residuals ** 2))) if residuals.size > 0 else 0.0,
+        float(np.abs(residuals).max(initial=0.0))
+    )
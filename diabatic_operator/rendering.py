@@ -0,0 +1,167 @@
+from collections import Counter
+from typing import TextIO
+import numpy as np
+from .variable import Variable
+from .monome import Monome
+from .monomial_expansion import MonomialExpansion, MonomialTerm
+from .operator_representation import Operator
+from .utils import sign, num2sup
+
+FORMAT_TEXT = "text"
+FORMAT_LATEX = "latex"
+
+def latex_variable(v: Variable) -> str:
+    """
+    LaTeX form of a variable : Q1₊₂ -> Q_{1}^{+(2)}, ρb1 -> \\rho_{b1}
+    """
+    name = v.name.replace("ρ", "\\rho ") if v.name.startswith("ρ") else v.name
+    base = name.rstrip("0123456789b")
+    index = v.name[len(v.name.rstrip("0123456789b")):]
+    s = f"{base.strip()}_{{{index}}}"
+
+    if v.symmetry.is_E():
+        s += "^{" + ("-" if v.complex_conjugate else "+") + (f"({v.symmetry.gamma})" if v.symmetry.gamma > 1 else "") + "}"
+
+    return s
+
+def latex_monome(m: Monome) -> str:
+    cv = +Counter(m.variables)
+
+    if len(cv) == 0:
+        return "1"
+
+    s = " ".join((f"{{{latex_variable(v)}}}^{{{cv[v]}}}" if cv[v] > 1 else latex_variable(v)) for v in cv)
+
+    if m.invariant_type is not None:
+        if m.invariant_type.is_real_invariant():
+            return f"r({s})"
+        elif m.invariant_type.is_pseudo_invariant():
+            return f"\\rho^{{2}}({s})"
+        elif m.invariant_type.imag:
+            return f"i\\rho({s})"
+
+    return s
+
+def term_pieces(mterm: MonomialTerm | Monome, order: int, coeff: complex, format: str):
+    """
+    Pieces of the Re / Im terms of coeff * mterm^order (the magnitude is only written if it isn't 1)
+
+    a term of order 0 is coeff.real Re(1) + coeff.imag Im(1), only its real part is written (Im(1) = 0)
+    """
+    if order == 0:
+        value = coeff.real
+
+        if value != 0:
+            yield sign(value)
+            yield "1" if abs(value) == 1 else f"{abs(value):g}"
+
+        return
+
+    if format == FORMAT_LATEX:
+        rho = mterm.rho if isinstance(mterm, MonomialTerm) else None
+        monome = latex_monome(mterm.monome if isinstance(mterm, MonomialTerm) else mterm)
+        body = monome if rho is None else f"{latex_monome(rho)} {monome}"
+        # the power is inside Re / Im : Re((m)^k), not (Re m)^k
+        body = f"\\left(({body})^{{{order}}}\\right)" if order > 1 else f"({body})"
+        parts = ((coeff.real, "\\operatorname{Re}"), (coeff.imag, "\\operatorname{Im}"))
+    else:
+        body = f"(({mterm}){num2sup(order)})" if order > 1 else f"({mterm})"
+        parts = ((coeff.real, "Re"), (coeff.imag, "Im"))
+
+    for value, part in parts:
+        if value != 0:
+            yield sign(value)
+
+            if abs(value) != 1:
+                yield f"{abs(value):g}" + ("\\," if format == FORMAT_LATEX else "")
+
+            yield part
+            yield body
+
+def render_expansion(expansion: MonomialExpansion, file: TextIO, format: str = FORMAT_TEXT, by_order: bool = False, max_terms: int = None, separator: str = "\n  ") -> int:
+    """
+    Writes the terms of an expansion to file one by one, returns the number of terms written
+
+    Args :
+        - format[="text"] : "text" (the form of str, with the magnitude of the coefficients and the sign of the constant) or "latex"
+        - by_order[=False] : writes separator and an "order k :" header before the terms of each order
+        - max_terms[=None] : number of terms written before the rest is summarized as "... (k more terms)"
+        - separator[="\\n  "] : written before each order section
+    """
+    if len(expansion.expansion) == 0:
+        file.write("0")
+
+        return 0
+
+    written = 0
+    skipped = 0
+
+    for order, exp in expansion.expansion.items():
+        # order 0 is a single real constant (only its first term is significant, see term_pieces)
+        terms = list(exp.items())[:1] if order == 0 else exp.items()
+        header = by_order
+
+        for mterm, coeff in terms:
+            if coeff == 0:
+                continue
+
+            if max_terms is not None and written >= max_terms:
+                skipped += 1
+
+                continue
+
+            if header:
+                file.write(separator)
+                file.write(f"\\text{{order {order} : }}" if format == FORMAT_LATEX else f"order {order} : ")
+                header = False
+
+            for piece in term_pieces(mterm, order, complex(coeff), format):
+                file.write(piece)
+
+            written += 1
+
+    if skipped > 0:
+        file.write(f" \\dots\\text{{ ({skipped} more terms)}}" if format == FORMAT_LATEX else f" ... ({skipped} more terms)")
+
+    return written
+
+def render_operator(op: Operator | np.ndarray, file: TextIO, format: str = FORMAT_TEXT, by_order: bool = False, max_terms: int = None) -> int:
+    """
+    Streams the entries of an operator (or of the array of operators returned by operator()) to file,
+    one entry per line (per align row in LaTeX), the time is linear in the size of the output
+
+    Args :
+        - format[="text"] : "text" or "latex" (an align* environment)
+        - by_order[=False] : one section per order in each entry
+        - max_terms[=None] : max number of terms written per entry
+
+    Returns the number of terms written
+    """
+    ops = np.empty((), dtype=object) if isinstance(op, Operator) else np.asarray(op, dtype=object)
+
+    if isinstance(op, Operator):
+        ops[()] = op
+
+    latex = format == FORMAT_LATEX
+    separator = " \\\\\n  &\\quad " if latex else "\n  "
+    written = 0
+
+    if latex:
+        file.write("\\begin{align*}\n")
+
+    for index in np.ndindex(ops.shape):
+        o = ops[index]
+        n, m = o.expansion.shape
+
+        for i in range(n):
+            for j in range(m):
+                # 1-based labels : block, component (1 for X, 2 for Y) and entry
+                name = ",".join(str(k + 1) for k in index + (i, j))
+                file.write(f"W_{{{name}}} &= " if latex else f"W[{name}] = ")
+                written += render_expansion(o.expansion[i, j], file, format, by_order, max_terms, separator)
+                file.write(" \\\\\n" if latex else "\n")
+
+    if latex:
+        file.write("\\end{align*}\n")
+
+    return written
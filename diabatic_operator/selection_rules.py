@@ -0,0 +1,104 @@
+from dataclasses import dataclass, field
+from functools import lru_cache
+import numpy as np
+from .form_rules import COMPONENT_X, COMPONENT_Y, term_order, term_form
+
+@dataclass
+class SelectionRules:
+    """
+    Table of the allowed terms of the operator forms A_x / A_y, one row per term of the loops
+    over (j, sg, sigma1, sigma2) of A_x / A_y, for many (n, gamma, alpha1, alpha2) at once
+
+    each row is the order k of the term (see form_rules.term_order), the sigma = -sigma2 argument
+    of the add_X / add_Y functions, whether the tilde form is used (sigma1 sigma2 < 0) and the sign
+    (see form_rules.term_form), the same rows as form_rules.form_terms
+    """
+    max_order: int
+    n: np.ndarray
+    gamma: np.ndarray
+    alpha1: np.ndarray
+    alpha2: np.ndarray
+    component: np.ndarray
+    order: np.ndarray
+    sigma: np.ndarray
+    tilde: np.ndarray
+    sign: np.ndarray
+    slices: dict = field(default_factory=dict)
+
+    def nrows(self) -> int:
+        return len(self.order)
+
+    def select(self, n: int, gamma: int, alpha1: int, alpha2: int, component: int, max_order: int = None) -> np.ndarray:
+        """
+        Rows of a given operator form (in the order of the loops of A_x / A_y) up to max_order
+        """
+        max_order = self.max_order if max_order is None else max_order
+        assert max_order <= self.max_order
+
+        if self.slices.get((n, gamma, alpha1, alpha2, component)) is None:
+            raise ValueError(f"no selection rules for n = {n}, gamma = {gamma}, alpha = ({alpha1}, {alpha2}) in the table")
+
+        start, stop = self.slices[(n, gamma, alpha1, alpha2, component)]
+        rows = np.arange(start, stop)
+
+        return rows[self.order[rows] <= max_order]
+
+def selection_rules(ns: list[int], max_order: int) -> SelectionRules:
+    """
+    Builds the selection rules table of every (n, gamma, alpha1, alpha2) with n in ns and
+    gamma, alpha1, alpha2 in [0, n // 2] (the gammas of all the irreps of C_nv) up to max_order
+
+    the loops of A_x / A_y stop at the first j for which all the orders exceed max_order,
+    so they visit exactly the rows of order 0 <= k <= max_order with j <= (max_order + gamma + alpha1 + alpha2) / n
+    """
+    params = np.array([(n, g, a1, a2) for n in ns for g in range(n // 2 + 1) for a1 in range(n // 2 + 1) for a2 in range(n // 2 + 1)], dtype=np.int64).reshape(-1, 4)
+    n, gamma, alpha1, alpha2 = (params[:, i, None, None, None, None, None] for i in range(4))
+    jmax = int(np.max((max_order + params[:, 1:].sum(axis=1)) // params[:, 0])) if len(params) > 0 else 0
+
+    # axes : params, component, j, sg, sigma1, sigma2 (the loops order)
+    j = np.arange(jmax + 1)[None, None, :, None, None, None]
+    sg = np.array([-1, 1])[None, None, None, :, None, None]
+    sigma1 = np.array([-1, 1])[None, None, None, None, :, None]
+    sigma2 = np.array([-1, 1])[None, None, None, None, None, :]
+    component = np.array([COMPONENT_X, COMPONENT_Y])[None, :, None, None, None, None]
+
+    korder = term_order(component, n, j, sg, gamma, sigma1, alpha1, sigma2, alpha2)
+    shape = np.broadcast_shapes(korder.shape, (len(params), 2, jmax + 1, 2, 2, 2))
+    korder = np.broadcast_to(korder, shape)
+    allowed = (korder >= 0) & (korder <= max_order)
+    idx = np.nonzero(allowed)
+    p = idx[0]
+    sigma, tilde, sign = term_form(idx[1], sg.reshape(-1)[idx[3]], sigma1.reshape(-1)[idx[4]], sigma2.reshape(-1)[idx[5]])
+
+    rules = SelectionRules(
+        max_order,
+        params[p, 0], params[p, 1], params[p, 2], params[p, 3],
+        idx[1],
+        korder[idx],
+        sigma,
+        tilde,
+        sign
+    )
+
+    # rows are sorted by (params, component), slices of each operator form
+    keys = p * 2 + idx[1]
+    bounds = np.searchsorted(keys, np.arange(2 * len(params) + 1))
+
+    for i, (pn, pg, pa1, pa2) in enumerate(params.tolist()):
+        for c in (COMPONENT_X, COMPONENT_Y):
+            rules.slices[(pn, pg, pa1, pa2, c)] = (int(bounds[2 * i + c]), int(bounds[2 * i + c + 1]))
+
+    return rules
+
+@lru_cache(maxsize=None)
+def cached_selection_rules(n: int, max_order: int) -> SelectionRules:
+    """
+    Selection rules table of a single n, built once per (n, max_order) for the calls that aren't given a table,
+    shared between them so its arrays are read only
+    """
+    rules = selection_rules([n], max_order)
+
+    for array in (rules.n, rules.gamma, rules.alpha1, rules.alpha2, rules.component, rules.order, rules.sigma, rules.tilde, rules.sign):
+        array.flags.writeable = False
+
+    return rules
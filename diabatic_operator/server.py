@@ -0,0 +1,237 @@
+import asyncio
+import io
+import json
+import socket
+import struct
+import threading
+import numpy as np
+from .symmetry import parse_symmetry
+from .variable import generate_variables_list
+from .monomial_expansion import generate_invariants_and_monoms
+from .operator_representation import assemble_operator
+from .selection_rules import selection_rules
+from .evaluation import compile_operator, coordinate_names
+
+# a frame is : header length (4 bytes), json header, payload length (8 bytes), npy payload
+HEADER = struct.Struct("!I")
+PAYLOAD = struct.Struct("!Q")
+
+def encode_array(array: np.ndarray) -> bytes:
+    if array is None:
+        return b""
+
+    buffer = io.BytesIO()
+    np.save(buffer, np.ascontiguousarray(array), allow_pickle=False)
+
+    return buffer.getvalue()
+
+def decode_array(payload: bytes) -> np.ndarray:
+    if len(payload) == 0:
+        return None
+
+    return np.load(io.BytesIO(payload), allow_pickle=False)
+
+def encode_frame(header: dict, array: np.ndarray = None) -> bytes:
+    h = json.dumps(header).encode()
+    p = encode_array(array)
+
+    return HEADER.pack(len(h)) + h + PAYLOAD.pack(len(p)) + p
+
+async def read_frame(reader: asyncio.StreamReader) -> tuple[dict, np.ndarray]:
+    hlen, = HEADER.unpack(await reader.readexactly(HEADER.size))
+    header = json.loads(await reader.readexactly(hlen))
+    plen, = PAYLOAD.unpack(await reader.readexactly(PAYLOAD.size))
+
+    return (header, decode_array(await reader.readexactly(plen)))
+
+class OperatorService:
+    """
+    Keeps the built operators and their evaluators in memory and serves them to concurrent clients
+
+    requests :
+        - {"op": "build", "n", "opsymmetry", "s1", "s2", "nvarsym", "max_order"} -> {"id", "shape", "coordinates"}
+        - {"op": "evaluate", "id", "block": [i, j], "component": 0 (X) or 1 (Y)} + (N, ncoordinates) payload -> (N, 2, 2) payload
+        - {"op": "list"} -> {"ids"}
+    """
+
+    def __init__(self):
+        self.operators = {}
+        self.building = {}
+        # caches shared by the builds (run on executor threads) : variables and monoms per (n, nvarsym),
+        # selection rules and operator forms per (n, max_order)
+        self.variables = {}
+        self.monoms = {}
+        self.rules = {}
+        self.forms = {}
+        self.lock = threading.Lock()
+
+    def key(self, request: dict) -> str:
+        return json.dumps([request["n"], request["opsymmetry"], request["s1"], request["s2"], list(request["nvarsym"]), request["max_order"]])
+
+    def cached(self, cache: dict, key: tuple, compute):
+        """
+        Value of key in one of the caches, computed outside the lock (two threads may compute it, the first one stored is kept)
+        """
+        with self.lock:
+            value = cache.get(key)
+
+        if value is None:
+            value = compute()
+
+            with self.lock:
+                value = cache.setdefault(key, value)
+
+        return value
+
+    def build_sync(self, request: dict) -> dict:
+        n = request["n"]
+        nvarsym = list(request["nvarsym"])
+        max_order = request["max_order"]
+        opsymmetry, s1, s2 = (parse_symmetry(request[name], n) for name in ("opsymmetry", "s1", "s2"))
+
+        if (opsymmetry.is_B() or s1.is_B() or s2.is_B()) and n % 2 != 0:
+            raise ValueError("n should be even for a B symmetry")
+
+        variables = self.cached(self.variables, (n, tuple(nvarsym)), lambda: generate_variables_list(nvarsym, n))
+        # the appearing monoms don't depend on max_order (operator generates them up to order n)
+        invs, rhos, monoms = self.cached(self.monoms, (n, tuple(nvarsym)), lambda: generate_invariants_and_monoms(variables, n))
+        rules = self.cached(self.rules, (n, max_order), lambda: selection_rules([n], max_order))
+        # assemble_operator fills the forms dict of (n, max_order) in place, a form computed twice is the same
+        forms = self.cached(self.forms, (n, max_order), dict)
+        op = assemble_operator(n, opsymmetry, s1, s2, monoms, max_order, rules, forms)
+        evaluators = np.empty(op.shape, dtype=object)
+
+        for idx in np.ndindex(op.shape):
+            evaluators[idx] = compile_operator(op[idx], variables).evaluator()
+
+        return {"operator": op, "evaluators": evaluators, "coordinates": coordinate_names(variables)}
+
+    async def build(self, request: dict) -> str:
+        key = self.key(request)
+
+        if self.operators.get(key) is not None:
+            return key
+
+        # concurrent builds of the same operator wait for the first one
+        if self.building.get(key) is None:
+            self.building[key] = asyncio.get_running_loop().run_in_executor(None, self.build_sync, request)
+
+        try:
+            self.operators[key] = await self.building[key]
+        finally:
+            self.building.pop(key, None)
+
+        return key
+
+    async def evaluate(self, header: dict, coords: np.ndarray) -> np.ndarray:
+        built = self.operators.get(header["id"])
+
+        if built is None:
+            raise KeyError(f"unknown operator {header['id']}")
+
+        i, j = header.get("block", [0, 0])
+        evaluator = built["evaluators"][i, j, header.get("component", 0)]
+
+        return await asyncio.get_running_loop().run_in_executor(None, evaluator.evaluate, coords)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    header, payload = await read_frame(reader)
+                except asyncio.IncompleteReadError:
+                    break
+
+                try:
+                    if header["op"] == "build":
+                        key = await self.build(header)
+                        built = self.operators[key]
+                        response, array = {"id": key, "shape": list(built["operator"].shape), "coordinates": built["coordinates"]}, None
+                    elif header["op"] == "evaluate":
+                        response, array = {"id": header["id"]}, await self.evaluate(header, payload)
+                    elif header["op"] == "list":
+                        response, array = {"ids": list(self.operators.keys())}, None
+                    else:
+                        raise ValueError(f"unknown request {header['op']}")
+                except Exception as e:
+                    response, array = {"error": f"{type(e).__name__}: {e}"}, None
+
+                writer.write(encode_frame(response, array))
+                await writer.drain()
+        finally:
+            writer.close()
+
+async def serve(path: str = None, host: str = "127.0.0.1", port: int = 8765):
+    """
+    Runs the operator service on a Unix socket (if path is given) or on a localhost TCP port
+    """
+    service = OperatorService()
+
+    if path is not None:
+        server = await asyncio.start_unix_server(service.handle, path=path)
+    else:
+        server = await asyncio.start_server(service.handle, host=host, port=port)
+
+    async with server:
+        await server.serve_forever()
+
+class Client:
+    """
+    Blocking client of the operator service
+    """
+
+    def __init__(self, path: str = None, host: str = "127.0.0.1", port: int = 8765):
+        if path is not None:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(path)
+        else:
+            self.socket = socket.create_connection((host, port))
+
+    def close(self):
+        self.socket.close()
+
+    def __recv(self, size: int) -> bytes:
+        data = bytearray()
+
+        while len(data) < size:
+            chunk = self.socket.recv(size - len(data))
+
+            if len(chunk) == 0:
+                raise ConnectionError("connection closed by the server")
+
+            data += chunk
+
+        return bytes(data)
+
+    def request(self, header: dict, array: np.ndarray = None) -> tuple[dict, np.ndarray]:
+        self.socket.sendall(encode_frame(header, array))
+        hlen, = HEADER.unpack(self.__recv(HEADER.size))
+        response = json.loads(self.__recv(hlen))
+        plen, = PAYLOAD.unpack(self.__recv(PAYLOAD.size))
+        payload = decode_array(self.__recv(plen))
+
+        if response.get("error") is not None:
+            raise RuntimeError(response["error"])
+
+        return (response, payload)
+
+    def build(self, n: int, opsymmetry: str, s1: str, s2: str, nvarsym: list[int], max_order: int) -> dict:
+        response, _ = self.request({"op": "build", "n": n, "opsymmetry": opsymmetry, "s1": s1, "s2": s2, "nvarsym": list(nvarsym), "max_order": max_order})
+
+        return response
+
+    def evaluate(self, id: str, coords: np.ndarray, block: tuple[int, int] = (0, 0), component: int = 0) -> np.ndarray:
+        _, res = self.request({"op": "evaluate", "id": id, "block": list(block), "component": component}, np.asarray(coords, dtype=np.float64))
+
+        return res
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="operator evaluation service")
+    parser.add_argument("--unix", default=None, help="path of the unix socket")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    asyncio.run(serve(args.unix, args.host, args.port))
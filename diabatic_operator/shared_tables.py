@@ -0,0 +1,115 @@
+import os
+import multiprocessing
+from dataclasses import dataclass
+from multiprocessing import shared_memory, resource_tracker
+import numpy as np
+from .evaluation import OperatorTable, Evaluator
+
+# alignment of the arrays in a segment
+ALIGNMENT = 64
+
+# arrays of the table, then of the evaluator
+TABLE_FIELDS = ("kinds", "columns", "exponents", "orders", "blocks", "coeffs", "groups")
+EVALUATOR_FIELDS = ("exponents", "wreal", "wimag")
+
+@dataclass(frozen=True)
+class SharedTableHandle:
+    """
+    Picklable description of a shared operator table : segment name, process that created it, table information
+    and (field, dtype, shape, offset) of each array
+    """
+    name: str
+    owner: int
+    ncoordinates: int
+    shape: tuple[int, int]
+    layout: tuple[tuple[str, str, tuple[int, ...], int], ...]
+    size: int
+
+class SharedTable:
+    """
+    Operator table (and the distinct monomials and weights of its evaluator) copied once into a shared memory segment,
+    the handle is sent to the workers which attach to the segment (see attach_table), the owner unlinks it when done
+    """
+
+    def __init__(self, op: OperatorTable | Evaluator, parameters: np.ndarray = None):
+        evaluator = op if isinstance(op, Evaluator) else op.evaluator(parameters)
+        table = evaluator.table
+        arrays = [(f"table.{field}", getattr(table, field)) for field in TABLE_FIELDS] + [(f"evaluator.{field}", getattr(evaluator, field)) for field in EVALUATOR_FIELDS]
+        layout = []
+        offset = 0
+
+        for name, array in arrays:
+            array = np.ascontiguousarray(array)
+            layout.append((name, array.dtype.str, array.shape, offset))
+            offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+
+        self.segment = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+
+        for (name, dtype, shape, start), (_, array) in zip(layout, arrays):
+            np.ndarray(shape, dtype=dtype, buffer=self.segment.buf, offset=start)[...] = array
+
+        self.handle = SharedTableHandle(self.segment.name, os.getpid(), int(table.ncoordinates), tuple(table.shape), tuple(layout), offset)
+
+    def close(self):
+        self.segment.close()
+        self.segment.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class AttachedTable:
+    """
+    Read only views of a shared table in a worker process (nothing is copied or unpickled), keep it alive while the table
+    or the evaluator are used
+    """
+
+    def __init__(self, handle: SharedTableHandle):
+        self.segment = shared_memory.SharedMemory(name=handle.name)
+        parent = multiprocessing.parent_process()
+
+        # the segment belongs to the owner, it mustn't be unlinked when this process exits
+        # (the workers started by the owner share its resource tracker, other processes have their own)
+        if os.getpid() != handle.owner and (parent is None or parent.pid != handle.owner):
+            resource_tracker.unregister(self.segment._name, "shared_memory")
+
+        views = {}
+
+        for name, dtype, shape, offset in handle.layout:
+            view = np.ndarray(shape, dtype=dtype, buffer=self.segment.buf, offset=offset)
+            view.flags.writeable = False
+            views[name] = view
+
+        self.table = OperatorTable(
+            views["table.kinds"],
+            views["table.columns"],
+            handle.ncoordinates,
+            handle.shape,
+            *(views[f"table.{field}"] for field in TABLE_FIELDS[2:])
+        )
+        self.evaluator = Evaluator.from_weights(self.table, *(views[f"evaluator.{field}"] for field in EVALUATOR_FIELDS))
+
+    def close(self):
+        self.table = None
+        self.evaluator = None
+        self.segment.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def share_table(op: OperatorTable | Evaluator, parameters: np.ndarray = None) -> SharedTable:
+    """
+    Exports a compiled operator (with parameters, see Evaluator) to a shared memory segment
+    """
+    return SharedTable(op, parameters)
+
+def attach_table(handle: SharedTableHandle) -> AttachedTable:
+    """
+    Attaches to a shared table, its table and evaluator are views of the segment
+    """
+    return AttachedTable(handle)
@@ -0,0 +1,239 @@
+import io
+import json
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import combinations_with_replacement
+import numpy as np
+from .symmetry import parse_symmetry
+from .variable import generate_variables_list
+from .monomial_expansion import generate_invariants_and_monoms
+from .operator_representation import assemble_operator
+from .selection_rules import SelectionRules, selection_rules
+from .evaluation import OperatorTable, compile_operator, coordinate_layout, coordinate_names
+from .planner import plan
+
+# selection rules of the worker processes, built once by init_worker
+worker_rules = None
+
+def irreps(n: int) -> list[str]:
+    """
+    Names of the irreps of C_nv
+    """
+    names = ["A1", "A2"]
+
+    if n % 2 == 0:
+        names.extend(["B1", "B2"])
+
+    names.extend(f"E{gamma}" for gamma in range(1, (n + 1) // 2))
+
+    return names
+
+def valid_irreps(names: list[str], n: int) -> list[str]:
+    """
+    Names among names (all the irreps if None) that are irreps of C_nv
+    """
+    res = []
+
+    for name in irreps(n) if names is None else names:
+        try:
+            parse_symmetry(name, n)
+            res.append(name)
+        except ValueError:
+            continue
+
+    return res
+
+def cell_key(n: int, opsymmetry: str, s1: str, s2: str, nvarsym: list[int], max_order: int) -> str:
+    return json.dumps([n, opsymmetry, s1, s2, list(nvarsym), max_order])
+
+def sweep_cells(ns: list[int], nvarsyms: list[list[int]], opsymmetries: list[str] = None, states: list[str] = None, max_order: int = None) -> dict[tuple, list[tuple[str, str, str]]]:
+    """
+    Cells of a sweep grouped by (n, nvarsym, max_order), a cell being (opsymmetry, s1, s2) with s1 <= s2
+    in the order of states (symmetries that aren't irreps of C_nv are skipped for that n)
+
+    Args :
+        - ns : point groups C_nv
+        - nvarsyms : variables of each run (see generate_variables_list)
+        - opsymmetries[=None] : operator irreps (all the irreps of C_nv by default)
+        - states[=None] : state irreps, every pair is used (all the irreps of C_nv by default)
+        - max_order[=None] : max order of the expansions (n by default)
+    """
+    groups = {}
+
+    for n in ns:
+        cells = [(o, s1, s2) for o in valid_irreps(opsymmetries, n) for s1, s2 in combinations_with_replacement(valid_irreps(states, n), 2)]
+
+        for nvarsym in nvarsyms:
+            if len(nvarsym) > 2 and sum(nvarsym[2:4]) > 0 and n % 2 != 0:
+                continue
+
+            groups[(n, tuple(nvarsym), n if max_order is None else max_order)] = cells
+
+    return groups
+
+def init_worker(ns: list[int], max_order: int):
+    global worker_rules
+    worker_rules = selection_rules(ns, max_order)
+
+def sweep_group(n: int, nvarsym: list[int], max_order: int, cells: list[tuple[str, str, str]], rules: SelectionRules = None) -> dict:
+    """
+    Computes all the cells of a group, sharing the variables, the invariants and the operator forms
+
+    Returns a dict with the group information and, for each cell, the compiled tables of its blocks
+    """
+    rules = worker_rules if rules is None else rules
+    variables = generate_variables_list(nvarsym, n)
+    invs, rhos, monoms = generate_invariants_and_monoms(variables, n)
+    forms = {}
+    res = {"n": n, "nvarsym": list(nvarsym), "max_order": max_order, "invariants": len(invs), "rhos": len(rhos), "monomials": len(monoms), "coordinates": coordinate_names(variables), "cells": []}
+
+    for o, s1, s2 in cells:
+        op = assemble_operator(n, parse_symmetry(o, n), parse_symmetry(s1, n), parse_symmetry(s2, n), monoms, max_order, rules, forms)
+        tables = {}
+
+        for i, j, c in np.ndindex(op.shape):
+            tables[(i, j, c)] = compile_operator(op[i, j, c], variables)
+
+        res["cells"].append(((o, s1, s2), list(op.shape), tables))
+
+    return res
+
+def write_array(archive: zipfile.ZipFile, name: str, array: np.ndarray):
+    with archive.open(name, "w", force_zip64=True) as f:
+        np.lib.format.write_array(f, np.ascontiguousarray(array), allow_pickle=False)
+
+def store_group(archive: zipfile.ZipFile, index: dict, gid: int, result: dict):
+    """
+    Writes the tables of a group computed by sweep_group to the archive and adds its cells to the index
+    """
+    n, nvarsym, mo = result["n"], result["nvarsym"], result["max_order"]
+    kinds, columns, ncoordinates = coordinate_layout(generate_variables_list(nvarsym, n))
+    write_array(archive, f"g{gid}/kinds.npy", kinds)
+    write_array(archive, f"g{gid}/columns.npy", columns)
+    index["groups"][str(gid)] = {key: result[key] for key in ("n", "nvarsym", "max_order", "invariants", "rhos", "monomials", "coordinates")} | {"ncoordinates": int(ncoordinates)}
+
+    for (o, s1, s2), shape, tables in result["cells"]:
+        cid = len(index["cells"])
+        # shape is the one of the array of operators, block_shape the one of the matrix of each table
+        block_shape = list(next(iter(tables.values())).shape) if len(tables) > 0 else [2, 2]
+        index["cells"][cell_key(n, o, s1, s2, nvarsym, mo)] = {"id": cid, "group": gid, "shape": shape, "block_shape": block_shape}
+
+        for (i, j, c), table in tables.items():
+            prefix = f"c{cid}/{i}_{j}_{c}"
+
+            for field in ("exponents", "orders", "blocks", "coeffs", "groups"):
+                write_array(archive, f"{prefix}/{field}.npy", getattr(table, field))
+
+def run_sweep(filename: str, ns: list[int], nvarsyms: list[list[int]], opsymmetries: list[str] = None, states: list[str] = None, max_order: int = None, workers: int = None) -> dict:
+    """
+    Runs operator() on every cell of a sweep and writes the compiled tables to a single archive
+
+    the cells sharing (n, nvarsym) are computed together (variables, invariants and operator forms are shared),
+    the groups are run on a process pool (largest estimated run time first) and each worker builds the selection
+    rules of all the n once, the results are written as they complete
+
+    the archive is a zip of .npy arrays (it can also be opened with np.load) with an index.json member,
+    see SweepArchive for random access lookups
+
+    Args :
+        - filename : path of the archive
+        - workers[=None] : number of worker processes (os.cpu_count() by default, 0 to run in this process)
+
+    Returns the index
+    """
+    groups = sweep_cells(ns, nvarsyms, opsymmetries, states, max_order)
+    max_order_all = max((key[2] for key in groups), default=0)
+    workers = os.cpu_count() if workers is None else workers
+
+    # largest first, from the planned run time of the first cell
+    def cost(key: tuple) -> float:
+        n, nvarsym, mo = key
+        cells = groups[key]
+
+        if len(cells) == 0:
+            return 0.0
+
+        o, s1, s2 = cells[0]
+
+        return plan(n, parse_symmetry(o, n), parse_symmetry(s1, n), parse_symmetry(s2, n), list(nvarsym), mo).seconds
+
+    order = sorted(groups, key=cost, reverse=True)
+    index = {"groups": {}, "cells": {}}
+
+    with zipfile.ZipFile(filename, "w", compression=zipfile.ZIP_STORED) as archive:
+        if workers == 0:
+            rules = selection_rules(ns, max_order_all)
+
+            for gid, key in enumerate(order):
+                n, nvarsym, mo = key
+                store_group(archive, index, gid, sweep_group(n, list(nvarsym), mo, groups[key], rules))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(list(ns), max_order_all)) as pool:
+                futures = {pool.submit(sweep_group, key[0], list(key[1]), key[2], groups[key]): gid for gid, key in enumerate(order)}
+
+                for future in as_completed(futures):
+                    store_group(archive, index, futures[future], future.result())
+
+        archive.writestr("index.json", json.dumps(index))
+
+    return index
+
+class SweepArchive:
+    """
+    Random access to the results of run_sweep (only the members of the requested cell are read)
+    """
+
+    def __init__(self, filename: str):
+        self.archive = zipfile.ZipFile(filename, "r")
+        self.index = json.loads(self.archive.read("index.json"))
+        self.__layouts = {}
+
+    def close(self):
+        self.archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def keys(self) -> list[str]:
+        return list(self.index["cells"].keys())
+
+    def __read(self, name: str) -> np.ndarray:
+        with self.archive.open(name) as f:
+            return np.lib.format.read_array(io.BytesIO(f.read()), allow_pickle=False)
+
+    def cell(self, n: int, opsymmetry: str, s1: str, s2: str, nvarsym: list[int], max_order: int = None) -> dict:
+        key = cell_key(n, opsymmetry, s1, s2, nvarsym, n if max_order is None else max_order)
+
+        if self.index["cells"].get(key) is None:
+            raise KeyError(f"no cell {key} in the archive")
+
+        return self.index["cells"][key]
+
+    def group(self, n: int, nvarsym: list[int], max_order: int = None) -> dict:
+        mo = n if max_order is None else max_order
+
+        for info in self.index["groups"].values():
+            if info["n"] == n and info["nvarsym"] == list(nvarsym) and info["max_order"] == mo:
+                return info
+
+        raise KeyError(f"no group {(n, list(nvarsym), mo)} in the archive")
+
+    def table(self, n: int, opsymmetry: str, s1: str, s2: str, nvarsym: list[int], max_order: int = None, block: tuple[int, int] = (0, 0), component: int = 0) -> OperatorTable:
+        """
+        Compiled table of the component (0 for X, 1 for Y) of a block of a cell
+        """
+        cell = self.cell(n, opsymmetry, s1, s2, nvarsym, max_order)
+        gid = cell["group"]
+
+        if self.__layouts.get(gid) is None:
+            self.__layouts[gid] = (self.__read(f"g{gid}/kinds.npy"), self.__read(f"g{gid}/columns.npy"), self.index["groups"][str(gid)]["ncoordinates"])
+
+        kinds, columns, ncoordinates = self.__layouts[gid]
+        prefix = f"c{cell['id']}/{block[0]}_{block[1]}_{component}"
+        fields = [self.__read(f"{prefix}/{field}.npy") for field in ("exponents", "orders", "blocks", "coeffs", "groups")]
+
+        return OperatorTable(kinds, columns, ncoordinates, tuple(cell["block_shape"]), *fields)
@@ -52,3 +52,28 @@ class Symmetry:
             return n // 2
         else:
             return self.gamma
+
+def parse_symmetry(name: str, n: int) -> Symmetry:
+    """
+    Parses a symmetry name (A1, A2, B1, B2, E1, E_1, ...) for the C_nv group
+    """
+    name = name.strip()
+
+    if name in ("A1", "A2"):
+        return Symmetry(name)
+
+    if name in ("B1", "B2"):
+        if n % 2 != 0:
+            raise ValueError("n should be even for a B symmetry")
+
+        return Symmetry(name, gamma=n // 2)
+
+    if name.startswith("E") and name[1:].lstrip("_").isdigit():
+        gamma = int(name[1:].lstrip("_"))
+
+        if gamma < 1 or 2 * gamma >= n:
+            raise ValueError(f"E_{gamma} is not an irrep of C_{n}v")
+
+        return Symmetry("E", gamma=gamma)
+
+    raise ValueError(f"unknown symmetry {name}")
@@ -1,6 +1,6 @@
 from dataclasses import dataclass
-from symmetry import Symmetry
-from utils import *
+from .symmetry import Symmetry
+from .utils import *
 
 @dataclass(frozen=True)
 class Variable:
@@ -0,0 +1,271 @@
+import numpy as np
+from .symmetry import Symmetry
+from .variable import Variable
+from .operator_representation import Operator
+from .evaluation import OperatorTable, Evaluator, compile_operator, SLOT_REAL, SLOT_IMAG, SLOT_PLUS
+
+class Mode:
+    """
+    Harmonic oscillator basis of one mode (1D for A/B variables, 2D in |n, l> form for E variables)
+
+    the E modes use the circular quanta n+ and n- (n = n+ + n-, l = n+ - n-) for which
+    Q+ = a- + a+^dagger and Q- = a+ + a-^dagger (dimensionless coordinates)
+    """
+
+    def __init__(self, slots: list[int], kind: int, weight: int, nmax: int, frequency: float = 1.0):
+        self.slots = slots
+        self.kind = kind
+        self.weight = weight
+        self.nmax = nmax
+        self.frequency = frequency
+        self.powers = {}
+
+        if self.is_E():
+            self.states = [(n, l) for n in range(nmax + 1) for l in range(-n, n + 1, 2)]
+        else:
+            self.states = [(n, 0) for n in range(nmax + 1)]
+
+        self.dim = len(self.states)
+
+    def is_E(self) -> bool:
+        return self.kind == SLOT_PLUS
+
+    def quanta(self) -> np.ndarray:
+        return np.array([n for n, _ in self.states])
+
+    def angular_momenta(self) -> np.ndarray:
+        return np.array([l for _, l in self.states])
+
+    def __ladder(self, size: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Slot operators (x or Q+ and Q-) in a basis of size quanta, the first self.dim states being the basis of the mode
+        """
+        if not self.is_E():
+            a = np.diag(np.sqrt(np.arange(1, size + 1)), 1).astype(np.complex128)
+            x = (a + a.T) / np.sqrt(2)
+
+            return (x if self.kind == SLOT_REAL else 1j * x, None)
+
+        states = [(n, l) for n in range(size + 1) for l in range(-n, n + 1, 2)]
+        index = {s: i for i, s in enumerate(states)}
+        qplus = np.zeros((len(states), len(states)), dtype=np.complex128)
+
+        for i, (n, l) in enumerate(states):
+            nplus, nminus = (n + l) // 2, (n - l) // 2
+            # a+^dagger |n+, n-> = sqrt(n+ + 1) |n+ + 1, n->
+            if index.get((n + 1, l + 1)) is not None:
+                qplus[index[(n + 1, l + 1)], i] += np.sqrt(nplus + 1)
+            # a- |n+, n-> = sqrt(n-) |n+, n- - 1>
+            if nminus > 0:
+                qplus[index[(n - 1, l + 1)], i] += np.sqrt(nminus)
+
+        return (qplus, qplus.conj().T)
+
+    def operator(self, exponents: tuple[int, ...]) -> np.ndarray:
+        """
+        Matrix of the product of the slot powers of the mode, computed in an enlarged basis then truncated
+        """
+        if self.powers.get(exponents) is None:
+            size = self.nmax + sum(exponents)
+            first, second = self.__ladder(size)
+            res = np.linalg.matrix_power(first, exponents[0])
+
+            if second is not None and len(exponents) > 1:
+                res = res @ np.linalg.matrix_power(second, exponents[1])
+
+            self.powers[exponents] = np.ascontiguousarray(res[:self.dim, :self.dim])
+
+        return self.powers[exponents]
+
+def build_modes(table: OperatorTable, variables: list[Variable], n: int, nmax: int, frequencies: list[float] = None) -> list[Mode]:
+    """
+    One mode per real variable and per E variable pair, in the order of the coordinates
+    """
+    modes = []
+    seen = {}
+
+    for s, (kind, column) in enumerate(zip(table.kinds, table.columns)):
+        if seen.get(column) is not None:
+            seen[column].slots.append(s)
+
+            continue
+
+        v = variables[s]
+        weight = v.symmetry.compute_gamma(n) if n is not None else 0
+        frequency = frequencies[len(modes)] if frequencies is not None else 1.0
+        mode = Mode([s], SLOT_PLUS if kind != SLOT_REAL and kind != SLOT_IMAG else kind, weight, nmax, frequency)
+        seen[column] = mode
+        modes.append(mode)
+
+    # Q+ slot first, then Q-
+    for mode in modes:
+        if mode.is_E():
+            mode.slots.sort(key=lambda s: table.kinds[s])
+
+    return modes
+
+class VibronicHamiltonian:
+    """
+    Matrix-free vibronic Hamiltonian sum_modes w (N + d/2) + V(Q) in a basis of electronic states
+    times harmonic oscillators (2D in |n, l> form for each E mode)
+
+    for an E state (or when the symmetry of the state is given), the electronic components are rotated to
+    the complex |+/-> basis and the basis can be restricted to one block of the C_n symmetry, labelled by
+    sum_modes gamma * l + electronic weight (mod n), which is conserved by an operator of A1 symmetry
+    (for an E x e model below order n, this is the usual j = l -/+ 1/2 quantum number)
+
+    a single Lanczos vector only finds one copy of degenerate levels, the blocks separate these copies
+    """
+
+    def __init__(self, op: Operator | OperatorTable, variables: list[Variable], nmax: int, frequencies: list[float] = None, parameters: np.ndarray = None, n: int = None, state: Symmetry = None, block: int = None):
+        table = op if isinstance(op, OperatorTable) else compile_operator(op, variables)
+        assert table.shape[0] == table.shape[1]
+
+        if block is not None:
+            assert n is not None and state is not None
+
+        self.evaluator = Evaluator(table, parameters)
+        self.modes = build_modes(table, variables, n, nmax, frequencies)
+        self.n = n
+
+        # electronic basis : complex |+/-> = (|x> +/- i|y>) / sqrt(2) of weights -/+ gamma for E states,
+        # non null component for the other states
+        if state is None:
+            self.transform = np.eye(table.shape[0], dtype=np.complex128)
+            weights = np.zeros(table.shape[0], dtype=np.int64)
+        elif state.is_E():
+            self.transform = np.array([[1, 1], [1j, -1j]]) / np.sqrt(2)
+            weights = np.array([-state.gamma, state.gamma])
+        else:
+            self.transform = np.eye(table.shape[0], dtype=np.complex128)[:, [state.value() % 2]]
+            weights = np.array([state.compute_gamma(n) if n is not None else 0])
+
+        self.nstates = self.transform.shape[1]
+        self.shape = (self.nstates,) + tuple(mode.dim for mode in self.modes)
+
+        # harmonic part
+        diagonal = np.zeros(self.shape[1:])
+
+        for k, mode in enumerate(self.modes):
+            energies = mode.frequency * (mode.quanta() + (1.0 if mode.is_E() else 0.5))
+            diagonal += np.expand_dims(energies, tuple(i for i in range(len(self.modes)) if i != k))
+
+        self.diagonal = np.broadcast_to(diagonal, self.shape).copy()
+
+        # symmetry block
+        if block is not None:
+            labels = np.broadcast_to(np.expand_dims(weights, tuple(range(1, len(self.shape)))), self.shape).copy()
+
+            for k, mode in enumerate(self.modes):
+                if mode.is_E():
+                    l = mode.weight * mode.angular_momenta()
+                else:
+                    l = mode.weight * mode.quanta()
+
+                labels += np.expand_dims(l, tuple(i for i in range(len(self.shape)) if i != k + 1))
+
+            self.mask = (labels % n) == (block % n)
+        else:
+            self.mask = np.ones(self.shape, dtype=bool)
+
+        self.dim = int(self.mask.sum())
+
+        # electronic couplings of each distinct monomial, in the chosen electronic basis
+        nel = table.shape[0]
+        self.terms = []
+
+        for k, e in enumerate(self.evaluator.exponents):
+            c = (self.evaluator.wreal[k] + 1j * self.evaluator.wimag[k]).reshape(nel, nel)
+
+            if not np.any(c):
+                continue
+
+            # Re(conj(c) M) = (conj(c) M + c M^dagger) / 2
+            direct = self.transform.conj().T @ (0.5 * c.conj()) @ self.transform
+            adjoint = self.transform.conj().T @ (0.5 * c) @ self.transform
+            factors = []
+
+            for axis, mode in enumerate(self.modes):
+                exponents = tuple(int(e[s]) for s in mode.slots)
+
+                if sum(exponents) > 0:
+                    factors.append((axis + 1, mode.operator(exponents)))
+
+            self.terms.append((direct, adjoint, factors))
+
+    def apply_full(self, x: np.ndarray) -> np.ndarray:
+        """
+        Applies the Hamiltonian to a full (nstates, dims...) array
+        """
+        y = self.diagonal * x
+
+        for direct, adjoint, factors in self.terms:
+            a = x
+            b = x
+
+            for axis, matrix in factors:
+                a = np.moveaxis(np.tensordot(matrix, a, axes=([1], [axis])), 0, axis)
+                b = np.moveaxis(np.tensordot(matrix.conj().T, b, axes=([1], [axis])), 0, axis)
+
+            y += np.tensordot(direct, a, axes=([1], [0]))
+            y += np.tensordot(adjoint, b, axes=([1], [0]))
+
+        return y
+
+    def matvec(self, v: np.ndarray) -> np.ndarray:
+        """
+        Applies the Hamiltonian to a vector of the (symmetry block of the) basis
+        """
+        x = np.zeros(self.shape, dtype=np.complex128)
+        x[self.mask] = v
+
+        return self.apply_full(x)[self.mask]
+
+    def linear_operator(self):
+        """
+        scipy LinearOperator of the Hamiltonian (requires scipy), for scipy.sparse.linalg.eigsh
+        """
+        from scipy.sparse.linalg import LinearOperator
+
+        return LinearOperator((self.dim, self.dim), matvec=self.matvec, dtype=np.complex128)
+
+    def lowest_levels(self, nlevels: int, maxiter: int = 300, tol: float = 1e-10, seed: int = 0) -> np.ndarray:
+        """
+        Lowest vibronic levels from a Lanczos iteration (with full reorthogonalisation)
+        """
+        return lanczos(self.matvec, self.dim, nlevels, maxiter=maxiter, tol=tol, seed=seed)
+
+def lanczos(matvec, dim: int, nlevels: int, maxiter: int = 300, tol: float = 1e-10, seed: int = 0) -> np.ndarray:
+    """
+    Lowest eigenvalues of a hermitian operator given by its matvec, Lanczos with full reorthogonalisation
+    """
+    maxiter = min(maxiter, dim)
+    rng = np.random.default_rng(seed)
+    v = rng.normal(size=dim) + 1j * rng.normal(size=dim)
+    v /= np.linalg.norm(v)
+
+    basis = np.zeros((maxiter, dim), dtype=np.complex128)
+    alphas = []
+    betas = []
+    previous = None
+
+    for k in range(maxiter):
+        basis[k] = v
+        w = matvec(v)
+        alphas.append(np.vdot(v, w).real)
+        # full reorthogonalisation (twice is enough)
+        w -= basis[:k + 1].T @ (basis[:k + 1].conj() @ w)
+        w -= basis[:k + 1].T @ (basis[:k + 1].conj() @ w)
+        beta = np.linalg.norm(w)
+
+        tridiagonal = np.diag(alphas) + np.diag(betas, 1) + np.diag(betas, -1)
+        current = np.linalg.eigvalsh(tridiagonal)[:nlevels]
+
+        if beta < tol or (previous is not None and len(current) == nlevels and np.max(np.abs(current - previous)) < tol):
+            return current
+
+        previous = current if len(current) == nlevels else None
+        betas.append(beta)
+        v = w / beta
+
+    return np.linalg.eigvalsh(np.diag(alphas) + np.diag(betas[:len(alphas) - 1], 1) + np.diag(betas[:len(alphas) - 1], -1))[:nlevels]
@@ -1,9 +1,9 @@
 import numpy as np
-from symmetry import Symmetry
-from variable import generate_variables_list, Variable
-from monome import Monome
-from monomial_expansion import generate_appearing_monoms, find_fundamental_invariants
-from utils import *
+from diabatic_operator.symmetry import Symmetry
+from diabatic_operator.variable import generate_variables_list, Variable
+from diabatic_operator.monome import Monome
+from diabatic_operator.monomial_expansion import generate_appearing_monoms, find_fundamental_invariants
+from diabatic_operator.utils import *
 
 class ComponentType:
     X = "X"